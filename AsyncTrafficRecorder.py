@@ -0,0 +1,172 @@
+import asyncio
+import functools
+import os
+
+import aiohttp
+
+from RequestPolicy import DEFAULT_POLICIES, EndpointPolicy
+from TrafficRecorder import DEFAULT_POOL_SIZE, ENCRYPT_FORM_FIELD, TRAFFIC_CHUNK_SIZE, open_destination
+
+
+# Public AsyncTrafficRecorder calls return the same (status, {"message": ...})
+# tuples as TrafficRecorder when a request times out or cannot connect
+def async_recorder_call(func):
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        try:
+            return await func(self, *args, **kwargs)
+        except asyncio.TimeoutError as e:
+            return (504, {"message": f"Timed out talking to {self.url}: {e}"})
+        except aiohttp.ClientConnectionError as e:
+            return (502, {"message": f"Could not connect to {self.url}: {e}"})
+        except aiohttp.ClientError as e:
+            return (500, {"message": str(e)})
+    return wrapper
+
+
+# asyncio counterpart of TrafficRecorder. Every method returns the same
+# (status_code, body) tuple as the blocking client and uses the same
+# per-endpoint connect/read timeouts (policies as for TrafficRecorder).
+# One instance owns one aiohttp connector, so hundreds of calls gathered on
+# the same event loop share at most poolSize connections to the recorder.
+# Use it as an async context manager or call close() when done.
+class AsyncTrafficRecorder:
+
+    def __init__(self, url=None, poolSize=DEFAULT_POOL_SIZE, policies=None):
+        self.url = url
+        self.poolSize = poolSize
+        self.policies = dict(DEFAULT_POLICIES)
+        if policies:
+            self.policies.update(policies)
+        self.session = None
+
+    async def __aenter__(self):
+        self._getSession()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def setUrl(self, url):
+        self.url = url
+
+    def _getSession(self):
+        if self.session is None or self.session.closed:
+            # ssl=False matches verify=False on the blocking client
+            connector = aiohttp.TCPConnector(limit=self.poolSize, ssl=False, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    # Read timeouts apply per socket read, so long downloads are not cut off
+    def _timeout(self, endpoint):
+        policy = self.policies.get(endpoint) or EndpointPolicy()
+        return aiohttp.ClientTimeout(sock_connect=policy.connectTimeout, sock_read=policy.readTimeout)
+
+    def _get(self, endpoint, api_path, **kwargs):
+        return self._getSession().get(self.url + api_path, timeout=self._timeout(endpoint), **kwargs)
+
+    def _post(self, endpoint, api_path, **kwargs):
+        return self._getSession().post(self.url + api_path, timeout=self._timeout(endpoint), **kwargs)
+
+    async def _json(self, response):
+        try:
+            return await response.json(content_type=None)
+        except Exception:
+            return {"message": await response.text()}
+
+    async def _getJson(self, endpoint, api_path, params=None):
+        async with self._get(endpoint, api_path, params=params) as response:
+            return (response.status, await self._json(response))
+
+    async def _getBinary(self, endpoint, api_path):
+        async with self._get(endpoint, api_path) as response:
+            #Since 200 responses return binary content, not json
+            if response.status >= 200 and response.status < 300:
+                return (response.status, await response.read())
+            return (response.status, await self._json(response))
+
+    @async_recorder_call
+    async def info(self):
+        return await self._getJson("Info", "/automation/Info")
+
+    @async_recorder_call
+    async def start_proxy(self, recordingPort, upperBound=None, encrypted=False, jsonObject=None):
+        if upperBound == 0:
+            upperBound = None
+        # aiohttp only accepts str/int query values
+        query_params = {"encrypted": "true" if encrypted else "false"}
+        api_path = f"/automation/StartProxy/{recordingPort}"
+        if upperBound:
+            api_path += f",{upperBound}"
+        if not jsonObject:
+            return await self._getJson("StartProxy", api_path, query_params)
+        async with self._post("StartProxy", api_path, params=query_params, json=jsonObject) as response:
+            return (response.status, await self._json(response))
+
+    @async_recorder_call
+    async def stop_proxy(self, recordingPort):
+        return await self._getJson("StopProxy", f"/automation/StopProxy/{recordingPort}")
+
+    @async_recorder_call
+    async def stop_all_proxies(self):
+        return await self._getJson("StopAllProxies", "/automation/StopAllProxies")
+
+    @async_recorder_call
+    async def certificate(self):
+        return await self._getBinary("Certificate", "/automation/Certificate")
+
+    # Same contract as TrafficRecorder.traffic: with a destination the body
+    # is streamed to disk and the byte count is returned. Chunks are
+    # written from a worker thread so the event loop never blocks on disk.
+    @async_recorder_call
+    async def traffic(self, recordingPort, destination=None, progressCallback=None, chunkSize=TRAFFIC_CHUNK_SIZE):
+        api_path = f"/automation/Traffic/{recordingPort}"
+        if destination is None:
+            return await self._getBinary("Traffic", api_path)
+        async with self._get("Traffic", api_path) as response:
+            if response.status < 200 or response.status >= 300:
+                return (response.status, await self._json(response))
+            total = response.content_length
+            written = 0
+            with open_destination(destination) as f:
+                async for chunk in response.content.iter_chunked(chunkSize):
+                    await asyncio.to_thread(f.write, chunk)
+                    written += len(chunk)
+                    if progressCallback:
+                        progressCallback(written, total)
+            return (response.status, written)
+
+    @async_recorder_call
+    async def encrypt(self, dastConfig):
+        # dastConfig is a path, bytes, or an open binary file
+        api_path = "/automation/EncryptDastConfig"
+        form = aiohttp.FormData()
+        if isinstance(dastConfig, (str, os.PathLike)):
+            with open(dastConfig, "rb") as f:
+                form.add_field(ENCRYPT_FORM_FIELD, f, filename=os.path.basename(dastConfig))
+                async with self._post("EncryptDastConfig", api_path, data=form) as response:
+                    return (response.status, await self._json(response))
+        form.add_field(ENCRYPT_FORM_FIELD, dastConfig, filename="traffic.dast.config")
+        async with self._post("EncryptDastConfig", api_path, data=form) as response:
+            return (response.status, await self._json(response))
+
+    @async_recorder_call
+    async def encrypt_download(self, uuid):
+        return await self._getBinary("DownloadEncryptedDastConfig", f"/automation/DownloadEncryptedDastConfig/{uuid}")
+
+
+# Run coroutines with at most `limit` in flight, returning results in order.
+# Exceptions are returned in place of results rather than raised.
+async def gather_bounded(coros, limit=DEFAULT_POOL_SIZE):
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coros), return_exceptions=True)
@@ -0,0 +1,82 @@
+import collections
+import datetime
+import threading
+from enum import Enum
+
+#Log Levels
+class LogLevel(Enum):
+    INFO = 0
+    ERROR = 10
+    DEBUG = 20
+    
+    @staticmethod
+    def get(value):
+        for level in LogLevel:
+            if(value == level.value):
+                return level
+        return LogLevel.INFO
+
+
+# Default number of messages kept for the log pane
+DEFAULT_LOG_CAPACITY = 5000
+# Messages longer than this are cut down before they are stored
+DEFAULT_MAX_MESSAGE_LENGTH = 2000
+
+
+class LogEntry:
+
+    __slots__ = ("timestamp", "msg", "level")
+
+    def __init__(self, timestamp, msg, level):
+        self.timestamp = timestamp
+        self.msg = msg
+        self.level = level
+
+
+# Fixed-capacity, thread-safe log store. add() may be called from any
+# thread; the view pulls new entries with drain() on a timer and renders
+# them in one batch. Once full, the oldest entries are dropped.
+class LogBuffer:
+
+    def __init__(self, capacity=DEFAULT_LOG_CAPACITY, maxMessageLength=DEFAULT_MAX_MESSAGE_LENGTH):
+        self.capacity = capacity
+        self.maxMessageLength = maxMessageLength
+        self.entries = collections.deque(maxlen=capacity)
+        self.pending = collections.deque(maxlen=capacity)
+        self.lock = threading.Lock()
+
+    def summarize(self, msg):
+        if isinstance(msg, (bytes, bytearray)):
+            return f"<{len(msg)} bytes>"
+        msg = str(msg)
+        if len(msg) > self.maxMessageLength:
+            return f"{msg[:self.maxMessageLength]}... ({len(msg) - self.maxMessageLength} more characters)"
+        return msg
+
+    def add(self, msg, level=LogLevel.INFO):
+        if msg is None or msg == "":
+            return None
+        entry = LogEntry(datetime.datetime.now(), self.summarize(msg), level)
+        with self.lock:
+            self.entries.append(entry)
+            self.pending.append(entry)
+        return entry
+
+    # Entries added since the last drain
+    def drain(self):
+        with self.lock:
+            pending = list(self.pending)
+            self.pending.clear()
+        return pending
+
+    def snapshot(self, levels=None):
+        with self.lock:
+            entries = list(self.entries)
+        if levels is None:
+            return entries
+        return [entry for entry in entries if entry.level in levels]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.pending.clear()
@@ -2,49 +2,51 @@
 import sys
 import json
 import os
-import datetime
+import shutil
+import time
+import warnings
 from enum import Enum
+from functools import cached_property
+
+# Imported first so --profile also covers the imports below
+from Profiling import PROFILER, hotpath, exit_after_startup
 
 # PySide6 Imports
-from PySide6.QtWidgets import QApplication, QMainWindow, QStyle, QMessageBox, QTableWidgetItem, QPushButton, QHBoxLayout, QWidget, QToolButton, QLabel, QHeaderView, QFileDialog
+from PySide6.QtWidgets import QApplication, QMainWindow, QStyle, QMessageBox, QPushButton, QHBoxLayout, QWidget, QToolButton, QLabel, QHeaderView, QFileDialog
 from PySide6.QtCore import Qt, QSettings, QFile, QTextStream, QStandardPaths, QPoint, QTimer, QUrl, QSize, Signal, QObject, QRunnable, QThreadPool
-from PySide6.QtGui import QPixmap, QIcon, QDesktopServices, QIntValidator, QMovie
+from PySide6.QtGui import QPixmap, QIcon, QDesktopServices, QIntValidator, QMovie, QTextCursor, QTextCharFormat, QColor
 
-import Resources_rc
-from TrafficRecorder import TrafficRecorder
+import ResourceLoader
+from LogBuffer import LogBuffer, LogLevel
+from Metrics import REGISTRY
+from RecordingArchive import RecordingArchive, KIND_RECORDING, DEFAULT_ARCHIVE_MAX_BYTES, DEFAULT_ARCHIVE_MAX_AGE
+from RecorderFleet import RecorderFleet, parse_server_urls, merge_results, server_dirname
+from RunnerDispatcher import RunnerDispatcher
+from StatusPoller import StatusPoller
+from ProxyRegistry import ProxyRegistry, default_registry_path
+from ProxyTableModel import ProxyTableModel, ProxyButtonDelegate
+from TrafficRecorder import TrafficRecorder, RecorderError, DEFAULT_POOL_SIZE, close_sessions, parse_active_ports
+from TrafficSnapshots import SnapshotStore
 from UI_Components import Ui_MainWindow
-
-#Log Levels
-class LogLevel(Enum):
-    INFO = 0
-    ERROR = 10
-    DEBUG = 20
-    
-    @staticmethod
-    def get(value):
-        for level in LogLevel:
-            if(value == level.value):
-                return level
-        return LogLevel.INFO
-
+PROFILER.mark("imports")
 
 class MainWindow(QMainWindow, Ui_MainWindow):
     
     def __init__(self):
         super(MainWindow, self).__init__()
+        #Register the resource bundle before the UI asks for its icons
+        ResourceLoader.load()
+        PROFILER.mark("resources")
         #Load UI Components
         self.setupUi(self)
+        PROFILER.mark("setupUi")
         
         #App Constants
         self.geometryToRestore = None
         self.repoUrl = QUrl("https://github.com/cwtravis/appscan-traffic-recorder-client")
 
         #Read Version File From Resources
-        version_file = QFile(":version.json")
-        version_file.open(QFile.ReadOnly)
-        text_stream = QTextStream(version_file)
-        version_file_text = text_stream.readAll()
-        self.version_dict = json.loads(version_file_text)
+        self.version_dict = ResourceLoader.version_info()
         self.app_name = self.version_dict["product_name"]
         self.version = self.version_dict["version"]
         self.description = self.version_dict["description"]
@@ -60,13 +62,18 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.ini_path = os.path.join(self.config_dir, f"{self.project_name}.ini").replace("\\", "/")
         self.settings = QSettings(self.ini_path, QSettings.IniFormat)
 
-        #Setup Proxy TableWidget
-        headers = ["","Status", "Port", "Encrypted", "Stop", "Traffic", "Remove"]
-        self.proxyTable.setColumnCount(len(["","Status", "Port", "Encrypted", "Stop", "Traffic", "Remove"]))
-        self.proxyTable.setHorizontalHeaderLabels(headers)
+        #Setup Proxy Table Model/View
+        self.proxyModel = ProxyTableModel(self)
+        self.proxyTable.setModel(self.proxyModel)
+        self.proxyButtonDelegate = ProxyButtonDelegate(self.proxyTable)
+        self.proxyButtonDelegate.clicked.connect(self.rowButtonClicked)
+        for column in ProxyTableModel.ACTIONS:
+            self.proxyTable.setItemDelegateForColumn(column, self.proxyButtonDelegate)
+        self.proxyTable.setMouseTracking(True)
         self.proxyTable.verticalHeader().hide()
         self.proxyTable.horizontalHeader().setSectionResizeMode(0,QHeaderView.ResizeToContents)
         self.proxyTable.horizontalHeader().setSectionResizeMode(2,QHeaderView.ResizeToContents)
+        self.proxyTable.horizontalHeader().setSectionResizeMode(3,QHeaderView.ResizeToContents)
         self.proxyTable.horizontalHeader().setStretchLastSection(True)
 
         #Setup Button Signals
@@ -84,6 +91,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.portRangeRadioButton.toggled.connect(self.portRadioButtons)
         self.randomPortRadioButton.toggled.connect(self.portRadioButtons)
         self.startProxyButton.clicked.connect(self.startProxyButtonClicked)
+        self.downloadAllButton.clicked.connect(self.downloadAllButtonClicked)
+        self.toolButton_2.clicked.connect(self.certificateButtonClicked)
+        self.encryptButton.clicked.connect(self.encryptButtonClicked)
+        self.exportMetricsButton.clicked.connect(self.exportMetricsButtonClicked)
         self.urlLineEdit.editingFinished.connect(self.validateServerURL)
 
         # Make sure the line edits only accept valid port numbers
@@ -93,23 +104,34 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         # TrafficRecord Obj
         self.trafficRecorder = None
+        # Recorder servers listed in the URL box
+        self.fleet = None
 
         ## ThreadPool
         self.threadpool = QThreadPool()
+        ## Coalesces identical in-flight requests
+        self.dispatcher = RunnerDispatcher(self.threadpool, self)
+
+        ## Background status pollers, one per server, started once the
+        ## server URLs validate
+        self.statusPollers = {}
+        self.pollerSignals = PollerSignals()
+        self.pollerSignals.changed.connect(self.proxyStatusChanged)
+        self.pollerSignals.error.connect(lambda msg: self.log(f"Status poll failed: {msg}", LogLevel.DEBUG))
+
+        ## Log Buffer. The log pane is only filled in once it is first
+        ## shown; until then messages wait in the bounded buffer.
+        self.logBuffer = LogBuffer()
+        self.logPaneReady = False
 
         #Setup Icons
-        ## Green check #00cc66
-        self.check_pixmap = QPixmap(":resources/img/icons/check-circle.svg").scaled(QSize(24,24))
-        ## Red x  #ff6666
-        self.x_pixmap = QPixmap(":resources/img/icons/x-circle.svg").scaled(QSize(24,24))
-        ## Red StopSign  #ff6666
-        self.stop_pixmap = QPixmap(":resources/img/icons/stop-circle.svg").scaled(QSize(20,20))
-        ## Spinning Circle Loading GIF
-        self.loading_gif = QMovie(":resources/img/icons/loading.gif")
-        self.loading_gif.setScaledSize(QSize(24,24))
-        ## Ripple GIF
-        self.ripple_gif = QMovie(":resources/img/icons/ripple.gif")
-        self.ripple_gif.setScaledSize(QSize(24,24))
+        ## Decoded on first use, see the icon properties below
+        self.proxyModel.setIcons(lambda: self.ripple_gif, lambda: self.stop_pixmap)
+
+        #Proxies from previous sessions, reconciled with the servers once
+        #the server URLs validate
+        self.registry = ProxyRegistry(default_registry_path())
+        self.restoreProxies()
 
         #Finally, Show the UI
         self.specifyPortRadioButton.setChecked(True)
@@ -118,181 +140,518 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.showErrors = self.settings.value(f"{self.project_name}/showErrors", "1") == "1"
         self.showDebug = self.settings.value(f"{self.project_name}/showDebug", "1") == "1"
         url = self.settings.value(f"{self.project_name}/serverUrl", "")
+        self.poolSize = int(self.settings.value(f"{self.project_name}/poolSize", DEFAULT_POOL_SIZE))
+        self.trafficSegments = int(self.settings.value(f"{self.project_name}/trafficSegments", 1))
+        self.fleet = RecorderFleet(poolSize=self.poolSize)
+        self.archiveMaxBytes = int(self.settings.value(f"{self.project_name}/archiveMaxBytes", DEFAULT_ARCHIVE_MAX_BYTES))
+        self.archiveMaxAge = int(self.settings.value(f"{self.project_name}/archiveMaxAge", DEFAULT_ARCHIVE_MAX_AGE))
         self.showErrorsCheckbox.setChecked(self.showErrors)
         self.showDebugCheckbox.setChecked(self.showDebug)
         if(geometry and window_state):
             self.restoreGeometry(geometry) 
             self.restoreState(window_state)
         self.setWindowFlags(Qt.FramelessWindowHint)
+        PROFILER.mark("settings")
         self.show()
+        PROFILER.mark("show")
         if len(url) > 0:
             self.urlLineEdit.setText(url)
-            self.validateServerURL()
+            # Validate once the window has painted
+            QTimer.singleShot(0, self.validateServerURL)
         self.log("AppScan Traffic Recorder Client started")
+
+    # Compressed copies of downloaded recordings and cached certificates,
+    # opened on first use
+    @cached_property
+    def archive(self):
+        return RecordingArchive(os.path.join(self.config_dir, self.project_name, "archive"), self.archiveMaxBytes, self.archiveMaxAge)
+
+    # Icons and animations are decoded on first use rather than at startup
+    ## Green check #00cc66
+    @cached_property
+    def check_pixmap(self):
+        return QPixmap(":resources/img/icons/check-circle.svg").scaled(QSize(24,24))
+
+    ## Red x  #ff6666
+    @cached_property
+    def x_pixmap(self):
+        return QPixmap(":resources/img/icons/x-circle.svg").scaled(QSize(24,24))
+
+    ## Red StopSign  #ff6666
+    @cached_property
+    def stop_pixmap(self):
+        return QPixmap(":resources/img/icons/stop-circle.svg").scaled(QSize(20,20))
+
+    ## Spinning Circle Loading GIF
+    @cached_property
+    def loading_gif(self):
+        movie = QMovie(":resources/img/icons/loading.gif")
+        movie.setScaledSize(QSize(24,24))
+        return movie
+
+    ## Ripple GIF
+    @cached_property
+    def ripple_gif(self):
+        movie = QMovie(":resources/img/icons/ripple.gif")
+        movie.setScaledSize(QSize(24,24))
+        return movie
+
+    # Build the log pane the first time it is shown: fill it from the
+    # buffer, then keep it current in batches
+    def prepareLogPane(self):
+        if self.logPaneReady:
+            return
+        self.logPaneReady = True
+        # One block per entry, so the block limit caps the number of entries
+        self.logBrowser.document().setUndoRedoEnabled(False)
+        self.logBrowser.document().setMaximumBlockCount(self.logBuffer.capacity)
+        self.logBuffer.drain()
+        self.appendLogEntries(self.logBuffer.snapshot())
+        self.logBrowser.moveCursor(QTextCursor.End)
+        self.logFlushTimer = QTimer(self)
+        self.logFlushTimer.setInterval(250)
+        self.logFlushTimer.timeout.connect(self.flushLog)
+        self.logFlushTimer.start()
+        ## Latency panel under the log, refreshed from the metrics registry
+        self.latencyTimer = QTimer(self)
+        self.latencyTimer.setInterval(1000)
+        self.latencyTimer.timeout.connect(self.renderLatency)
+        self.latencyTimer.start()
+        self.renderLatency()
     
+    # result is True when every server in the URL box answered Info
     def setServerValidateResult(self, result):
         self.loading_gif.stop()
         self.statusLabel.clear()
         self.urlLineEdit.setEnabled(True)
         self.urlStatusLabel.clear()
+        url = self.urlLineEdit.text()
         if result:
             self.urlStatusLabel.setPixmap(self.check_pixmap)
-            url = self.urlLineEdit.text()
             self.settings.setValue(f"{self.project_name}/serverUrl", url)
         else:
             self.urlStatusLabel.setPixmap(self.x_pixmap)
             self.settings.setValue(f"{self.project_name}/serverUrl", "")
+        for server, count in self.proxyModel.proxyCounts().items():
+            self.fleet.setProxyCount(server, count)
+        self.startStatusPollers(self.fleet.healthyServers())
+
+    def startStatusPollers(self, servers):
+        self.stopStatusPollers()
+        for server in servers:
+            recorder = TrafficRecorder(server, self.poolSize)
+            callback = lambda started, stopped, server=server: self.pollerSignals.changed.emit(server, started, stopped)
+            errorCallback = lambda msg, server=server: self.pollerSignals.error.emit(f"{server}: {msg}")
+            poller = StatusPoller(recorder.active_proxies, callback, errorCallback=errorCallback)
+            poller.reset(port for _, port in self.proxyModel.listeningPorts(server))
+            poller.start()
+            self.statusPollers[server] = poller
+
+    def stopStatusPollers(self):
+        for poller in self.statusPollers.values():
+            poller.stop(2)
+        self.statusPollers = {}
 
+    def pokeStatusPoller(self, server=None):
+        for url, poller in self.statusPollers.items():
+            if server is None or url == server:
+                poller.poke()
+
+    # Apply a status diff from a server's poller. Proxies the server
+    # reports that are not in the table yet are added to it.
+    def proxyStatusChanged(self, server, started, stopped):
+        statuses = {(server, port): ProxyTableModel.STOPPED for port in stopped}
+        statuses.update({(server, port): ProxyTableModel.LISTENING for port in started})
+        # Restarted outside this window: the old snapshots are of a
+        # recording that no longer exists
+        for port in started:
+            if self.proxyModel.status(server, port) == ProxyTableModel.STOPPED:
+                self.clearSnapshots(server, port)
+        self.proxyModel.setStatuses(statuses)
+        self.registry.set_statuses(statuses)
+        unknown = [port for port in started if self.proxyModel.record(server, port) is None]
+        if unknown:
+            self.addProxyTableLines([(server, port, False) for port in sorted(unknown)])
+        for port in stopped:
+            self.log(f"Proxy port {port} is no longer listening on {server}", LogLevel.DEBUG)
+
+    # The URL box takes one or more recorder URLs separated by commas
     def validateServerURL(self):
+        servers = parse_server_urls(self.urlLineEdit.text())
+        if not servers:
+            return
         self.urlLineEdit.setEnabled(False)
-        url = self.urlLineEdit.text()
+        self.fleet.setServers(servers)
         self.urlStatusLabel.setMovie(self.loading_gif)
         self.loading_gif.start()
-        worker = TrafficRecorderRunner(url)
-        worker.signals.log.connect(self.log)
-        worker.signals.result.connect(self.setServerValidateResult)
-        self.threadpool.start(worker)
+        worker = TrafficRecorderRunner(None, poolSize=self.poolSize)
+        worker.setFleet(self.fleet)
+        worker.setRegistry(self.registry)
+        # A newer validation always replaces one still in flight
+        self.dispatcher.submit((None, TrafficRecorderRunner.Action.VERIFY, None), worker, self.connectValidateRunner, supersede=True)
+
+    def connectValidateRunner(self, worker):
+        worker.signals.log.connect(self.log, Qt.UniqueConnection)
+        worker.signals.reconciled.connect(self.proxiesReconciled, Qt.UniqueConnection)
+        worker.signals.result.connect(self.setServerValidateResult, Qt.UniqueConnection)
+
+    # Rebuild the table from the registry with the last known statuses
+    def restoreProxies(self):
+        proxies = self.registry.proxies()
+        if not proxies:
+            return
+        self.addProxyTableLines([(proxy["server"], proxy["port"], proxy["encrypted"]) for proxy in proxies], record=False)
+        self.proxyModel.setStatuses({(proxy["server"], proxy["port"]): proxy["status"] for proxy in proxies})
+        self.log(f"Restored {len(proxies)} proxies from the last session", LogLevel.DEBUG)
+
+    # Apply the registry's reconciliation with the servers' Info results
+    def proxiesReconciled(self, changes):
+        statuses = {key: ProxyTableModel.LISTENING for key in changes["listening"]}
+        statuses.update({key: ProxyTableModel.STOPPED for key in changes["stopped"]})
+        self.proxyModel.setStatuses(statuses)
+        if changes["discovered"]:
+            self.addProxyTableLines([(server, port, False) for server, port in changes["discovered"]], record=False)
+        still = len(self.proxyModel.listeningPorts())
+        if still:
+            self.log(f"{still} proxies are still listening on the recorder servers")
+        for server, port in changes["stopped"]:
+            self.log(f"Proxy port {port} on {server} stopped while the client was closed", LogLevel.DEBUG)
 
     def startProxyButtonClicked(self):
         encrypted = self.encryptCheckBox.isChecked()
         topPort = self.topPortLineEdit.text()
         bottomPort = self.bottomPortLineEdit.text()
-        url = self.urlLineEdit.text()
+        count = self.proxyCountSpinBox.value()
 
         if self.specifyPortRadioButton.isChecked():
-            print(f"Specified Port {topPort} Encrypted {encrypted}")
-            worker = TrafficRecorderRunner(url, TrafficRecorderRunner.Action.START)
-            worker.signals.log.connect(self.log)
-            worker.signals.httpResponse.connect(self.proxyStartCallback)
-            self.threadpool.start(worker)
+            self.log(f"Specified Port {topPort} Encrypted {encrypted}", LogLevel.DEBUG)
+            worker = TrafficRecorderRunner(None, TrafficRecorderRunner.Action.START, poolSize=self.poolSize)
+            worker.setFleet(self.fleet)
+            worker.setTopPort(topPort)
+            worker.setEncrypt(encrypted)
+            self.dispatcher.submit((None, TrafficRecorderRunner.Action.START, topPort), worker, self.connectStartRunner)
+            return
         elif self.portRangeRadioButton.isChecked():
-            print(f"Port Range {topPort}-{bottomPort} Encrypted {encrypted}")
+            self.log(f"Port Range {topPort}-{bottomPort} Count {count} Encrypted {encrypted}", LogLevel.DEBUG)
+            randomPorts = False
         elif self.randomPortRadioButton.isChecked():
-            print(f"Random Port {topPort}-{bottomPort} Encrypted {encrypted}")
+            self.log(f"Random Port {topPort}-{bottomPort} Count {count} Encrypted {encrypted}", LogLevel.DEBUG)
+            randomPorts = True
         else:
             return
+        if not topPort or not bottomPort:
+            self.statusMsg("Enter a lower and upper bound for the port range", 7000)
+            return
+        worker = TrafficRecorderRunner(None, TrafficRecorderRunner.Action.START_BATCH, poolSize=self.poolSize)
+        worker.setFleet(self.fleet)
+        worker.setTopPort(topPort)
+        worker.setBopPort(bottomPort)
+        worker.setEncrypt(encrypted)
+        worker.setCount(count)
+        worker.setRandomPorts(randomPorts)
+        self.startProxyButton.setEnabled(False)
+        self.statusMsg(f"Starting {count} proxies...")
+        self.dispatcher.submit((None, TrafficRecorderRunner.Action.START_BATCH, (topPort, bottomPort, count, randomPorts)), worker, self.connectBatchStartRunner)
+
+    def connectStartRunner(self, worker):
+        worker.signals.log.connect(self.log, Qt.UniqueConnection)
+        worker.signals.httpResponse.connect(self.proxyStartCallback, Qt.UniqueConnection)
+
+    def connectBatchStartRunner(self, worker):
+        worker.signals.log.connect(self.log, Qt.UniqueConnection)
+        worker.signals.batchResult.connect(self.proxyBatchStartCallback, Qt.UniqueConnection)
 
     def proxyStartCallback(self, resultTuple):
         if resultTuple[0] >= 200 and resultTuple[0] < 300:
             port = resultTuple[1]["port"]
             encrypted = resultTuple[1]["encryptTraffic"]
             msg = resultTuple[1]["message"]
+            server = resultTuple[2]
             self.statusMsg(msg, 7000)
-            self.addProxyTableLine(port, encrypted)
+            self.addProxyTableLines([(server, port, encrypted)])
+            self.pokeStatusPoller(server)
+        else:
+            self.log(f"Problem starting proxy - status code {resultTuple[0]}", LogLevel.ERROR)
+            self.log(str(resultTuple[1]), LogLevel.ERROR)
 
-    def stopProxyButtonClicked(self, port):
-        self.log(f"Stop Button Clicked for Proxy Port {port}")
-        url = self.urlLineEdit.text()
-        worker = TrafficRecorderRunner(url, TrafficRecorderRunner.Action.STOP)
+    def proxyBatchStartCallback(self, result):
+        self.startProxyButton.setEnabled(True)
+        self.addProxyTableLines([(started["server"], started["port"], started["encryptTraffic"]) for started in result.get("started", [])])
+        for failed in result.get("failed", []):
+            self.log(f"Problem starting proxy on {failed['server']} - status code {failed['status']}: {failed.get('message')}", LogLevel.ERROR)
+        self.statusMsg(f"Started {len(result.get('started', []))} of {result['requested']} proxies", 7000)
+        self.pokeStatusPoller()
+
+    def stopProxyButtonClicked(self, server, port):
+        self.log(f"Stop Button Clicked for Proxy Port {port} on {server}")
+        worker = TrafficRecorderRunner(server, TrafficRecorderRunner.Action.STOP, poolSize=self.poolSize)
+        worker.setFleet(self.fleet)
         worker.setTopPort(port)
-        worker.signals.log.connect(self.log)
-        worker.signals.httpResponse.connect(self.proxyStopCallback)
-        self.threadpool.start(worker)
+        # Repeated clicks attach to the stop already in flight
+        self.dispatcher.submit((server, TrafficRecorderRunner.Action.STOP, port), worker, self.connectStopRunner)
+
+    def connectStopRunner(self, worker):
+        worker.signals.log.connect(self.log, Qt.UniqueConnection)
+        worker.signals.httpResponse.connect(self.proxyStopCallback, Qt.UniqueConnection)
 
     def proxyStopCallback(self, resultTuple):
         msg = resultTuple[1]["message"]
         if resultTuple[0] >= 200 and resultTuple[0] < 300:
             port = resultTuple[1]["port"]
-            for x in range(0, self.proxyTable.rowCount()):
-                if self.proxyTable.item(x, 2).text() == port:
-                    self.proxyTable.cellWidget(x, 0).clear()
-                    self.proxyTable.cellWidget(x, 0).setPixmap(self.stop_pixmap)
-                    self.proxyTable.cellWidget(x, 1).setText("Stopped")
-                    break
+            server = resultTuple[2]
+            self.setProxyRowsStopped([(server, port)])
+            self.pokeStatusPoller(server)
         else:
             self.log(f"Problem stopping listener - status code {resultTuple[0]}")
             self.log(resultTuple[1])
         self.statusMsg(msg, 7000)
 
-    def trafficButtonClicked(self, port):
-        self.log(f"Traffic Button Clicked for Proxy Port {port}")
-        url = self.urlLineEdit.text()
-        worker = TrafficRecorderRunner(url, TrafficRecorderRunner.Action.TRAFFIC)
+    # keys are (server, port) pairs
+    def setProxyRowsStopped(self, keys):
+        self.proxyModel.setStatuses({key: ProxyTableModel.STOPPED for key in keys})
+        self.registry.record_stopped(keys)
+
+    # Snapshots of a listening proxy, so repeated downloads only keep
+    # what was recorded since the previous one
+    def snapshotDir(self, server, port):
+        return os.path.join(self.config_dir, self.project_name, "snapshots", server_dirname(server), str(port))
+
+    def clearSnapshots(self, server, port):
+        shutil.rmtree(self.snapshotDir(server, port), ignore_errors=True)
+
+    def trafficButtonClicked(self, server, port, snapshot=False):
+        self.log(f"Traffic Button Clicked for Proxy Port {port} on {server}")
+        key = (server, TrafficRecorderRunner.Action.TRAFFIC, port)
+        if self.dispatcher.isInFlight(key):
+            self.statusMsg(f"Traffic from port {port} is already downloading", 7000)
+            return
+        #Ask where to save first so the worker can stream straight to disk
+        res = QFileDialog.getSaveFileName(self, "Save the traffic file.", QStandardPaths.writableLocation(QStandardPaths.DocumentsLocation), "Traffic Recordings (*.dast.config)")
+        if not res[0]:
+            return
+        worker = TrafficRecorderRunner(server, TrafficRecorderRunner.Action.TRAFFIC, poolSize=self.poolSize)
         worker.setTopPort(port)
-        worker.signals.log.connect(self.log)
-        worker.signals.httpResponse.connect(self.proxyTrafficCallback)
-        self.threadpool.start(worker)
+        worker.setDestination(res[0])
+        worker.setArchive(self.archive)
+        worker.setRegistry(self.registry)
+        worker.setSegments(self.trafficSegments)
+        if snapshot:
+            worker.setSnapshotDir(self.snapshotDir(server, port))
+        self.dispatcher.submit(key, worker, self.connectTrafficRunner)
+
+    def connectTrafficRunner(self, worker):
+        worker.signals.log.connect(self.log, Qt.UniqueConnection)
+        worker.signals.progress.connect(self.proxyTrafficProgress, Qt.UniqueConnection)
+        worker.signals.httpResponse.connect(self.proxyTrafficCallback, Qt.UniqueConnection)
+
+    def proxyTrafficProgress(self, port, written, total):
+        if total > 0:
+            self.statusMsg(f"Downloading traffic from port {port}: {written // 1024} of {total // 1024} KB")
+        else:
+            self.statusMsg(f"Downloading traffic from port {port}: {written // 1024} KB")
 
     def proxyTrafficCallback(self, resultTuple):
-        trafficBytes = resultTuple[1]
-        numBytes = len(trafficBytes)
         if resultTuple[0] >= 200 and resultTuple[0] < 300:
+            numBytes = resultTuple[1]
+            path = resultTuple[2]
             if numBytes > 0:
-                res = QFileDialog.getSaveFileName(self, "Save the traffic file.", QStandardPaths.writableLocation(QStandardPaths.DocumentsLocation), "Traffic Recordings (*.dast.config)")
-                with open(res[0], "wb") as file:
-                    file.write(trafficBytes)
-                self.statusMsg(f"File Saved: {res[0]}", 7000)
+                self.statusMsg(f"File Saved: {path}", 7000)
+            else:
+                os.remove(path)
+                self.statusMsg("The proxy has not recorded any traffic", 7000)
         else:
             self.log(f"Problem downloading traffic - status code {resultTuple[0]}")
             self.log(resultTuple[1])
             self.statusMsg(f"Problem downloading traffic - status code {resultTuple[0]}", 7000)
         
 
-    def rowButtonClicked(self):
-        sender = self.sender()
-        row = sender.getRow()
-        action = sender.getAction()
-        port = sender.getPortNumber()
+    def downloadAllButtonClicked(self):
+        ports = self.proxyModel.ports()
+        listening = self.proxyModel.listeningPorts()
+        if not ports:
+            self.statusMsg("There are no proxies to download traffic from", 7000)
+            return
+        if listening:
+            resp = QMessageBox.question(self, "Traffic Recorder", 
+                f"{len(listening)} proxies are still listening. They will be stopped before their traffic is downloaded. Continue?", 
+                QMessageBox.StandardButton.Yes, 
+                QMessageBox.StandardButton.No)
+            if resp != QMessageBox.StandardButton.Yes:
+                return
+        directory = QFileDialog.getExistingDirectory(self, "Choose a folder for the traffic files.", QStandardPaths.writableLocation(QStandardPaths.DocumentsLocation))
+        if not directory:
+            return
+        self.log(f"Downloading traffic from {len(ports)} proxies to {directory}")
+        worker = TrafficRecorderRunner(None, TrafficRecorderRunner.Action.HARVEST, poolSize=self.poolSize)
+        worker.setFleet(self.fleet)
+        worker.setPorts(ports, listening)
+        worker.setDestination(directory)
+        worker.setArchive(self.archive)
+        worker.setRegistry(self.registry)
+        self.downloadAllButton.setEnabled(False)
+        self.dispatcher.submit((None, TrafficRecorderRunner.Action.HARVEST, None), worker, self.connectHarvestRunner)
+
+    def connectHarvestRunner(self, worker):
+        worker.signals.log.connect(self.log, Qt.UniqueConnection)
+        worker.signals.progress.connect(self.proxyTrafficProgress, Qt.UniqueConnection)
+        worker.signals.batchResult.connect(self.proxyHarvestCallback, Qt.UniqueConnection)
+
+    def proxyHarvestCallback(self, result):
+        self.downloadAllButton.setEnabled(True)
+        saved = result.get("saved", [])
+        empty = result.get("empty", [])
+        failed = result.get("failed", [])
+        self.setProxyRowsStopped([(entry["server"], entry["port"]) for entry in saved + empty + failed if entry.get("stopped")])
+        for entry in failed:
+            self.log(f"Problem downloading traffic from port {entry.get('port')} on {entry['server']} - status code {entry['status']}: {entry.get('message')}", LogLevel.ERROR)
+        self.statusMsg(f"Saved {len(saved)} of {result['requested']} recordings ({len(empty)} empty, {len(failed)} failed)", 7000)
+
+    def encryptButtonClicked(self):
+        servers = self.fleet.servers() if self.fleet else []
+        if not servers:
+            self.statusMsg("Enter a valid server URL first", 7000)
+            return
+        documents = QStandardPaths.writableLocation(QStandardPaths.DocumentsLocation)
+        directory = QFileDialog.getExistingDirectory(self, "Choose the folder of recordings to encrypt.", documents)
+        if not directory:
+            return
+        output = QFileDialog.getExistingDirectory(self, "Choose a folder for the encrypted recordings.", os.path.dirname(directory))
+        if not output:
+            return
+        if os.path.abspath(output) == os.path.abspath(directory):
+            self.statusMsg("Choose a different folder for the encrypted recordings", 7000)
+            return
+        self.log(f"Encrypting the recordings in {directory} to {output}")
+        worker = TrafficRecorderRunner(servers[0], TrafficRecorderRunner.Action.ENCRYPT, poolSize=self.poolSize)
+        worker.setSource(directory)
+        worker.setDestination(output)
+        self.encryptButton.setEnabled(False)
+        self.dispatcher.submit((servers[0], TrafficRecorderRunner.Action.ENCRYPT, directory), worker, self.connectEncryptRunner)
+
+    def connectEncryptRunner(self, worker):
+        worker.signals.log.connect(self.log, Qt.UniqueConnection)
+        worker.signals.progress.connect(self.encryptProgress, Qt.UniqueConnection)
+        worker.signals.batchResult.connect(self.encryptCallback, Qt.UniqueConnection)
+
+    def encryptProgress(self, source, done, total):
+        self.statusMsg(f"Encrypted {done} of {total} recordings ({os.path.basename(source)})")
+
+    def encryptCallback(self, result):
+        self.encryptButton.setEnabled(True)
+        encrypted = result.get("encrypted", [])
+        failed = result.get("failed", [])
+        for entry in failed:
+            self.log(f"Problem encrypting {entry.get('source', entry.get('server'))} - status code {entry['status']}: {entry.get('message')}", LogLevel.ERROR)
+        self.statusMsg(f"Encrypted {len(encrypted)} of {result['requested']} recordings ({len(failed)} failed)", 7000)
+
+    # One line per server and endpoint: calls, p50/p95 of the whole call,
+    # time to first byte and connection setup, plus thread pool queue wait
+    @hotpath("renderLatency")
+    def renderLatency(self):
+        # Only while the log pane is showing
+        if not self.latencyLabel.isVisible():
+            return
+        rows = {}
+        for labels, summary in REGISTRY.series("recorder_request_seconds"):
+            rows.setdefault((labels["server"], labels["endpoint"]), {})[labels["phase"]] = summary
+        lines = []
+        for (server, endpoint), phases in sorted(rows.items()):
+            total = phases.get("total") or phases.get("transfer")
+            if not total:
+                continue
+            setup = sum((phases.get(p) or {}).get("mean") or 0 for p in ("connect", "tls"))
+            lines.append(f"{server} {endpoint:<28} {total['count']:>6} calls  p50 {self.ms(total['p50'])}  p95 {self.ms(total['p95'])}"
+                         f"  ttfb p95 {self.ms((phases.get('ttfb') or {}).get('p95'))}  setup {self.ms(setup)}")
+        for labels, summary in sorted(REGISTRY.series("runner_queue_seconds"), key=lambda item: item[0]["action"]):
+            lines.append(f"queue {labels['action']:<12} {summary['count']:>6} runs  wait p50 {self.ms(summary['p50'])}  p95 {self.ms(summary['p95'])}")
+        lines.append(f"threads {self.threadpool.activeThreadCount()}/{self.threadpool.maxThreadCount()} busy")
+        self.latencyLabel.setText("\n".join(lines))
+
+    @staticmethod
+    def ms(seconds):
+        return f"{seconds * 1000:7.1f} ms" if seconds is not None else "      - ms"
+
+    def exportMetricsButtonClicked(self):
+        res = QFileDialog.getSaveFileName(self, "Export metrics.", QStandardPaths.writableLocation(QStandardPaths.DocumentsLocation), "Prometheus Text (*.prom);;JSON (*.json)")
+        if not res[0]:
+            return
+        REGISTRY.export(res[0])
+        self.statusMsg(f"Metrics Saved: {res[0]}", 7000)
+
+    def certificateButtonClicked(self):
+        servers = self.fleet.servers() if self.fleet else []
+        if not servers:
+            self.statusMsg("Enter a valid server URL first", 7000)
+            return
+        key = (servers[0], TrafficRecorderRunner.Action.CERT, None)
+        if self.dispatcher.isInFlight(key):
+            return
+        res = QFileDialog.getSaveFileName(self, "Save the root certificate.", QStandardPaths.writableLocation(QStandardPaths.DocumentsLocation), "Certificates (*.pem *.crt *.cer)")
+        if not res[0]:
+            return
+        worker = TrafficRecorderRunner(servers[0], TrafficRecorderRunner.Action.CERT, poolSize=self.poolSize)
+        worker.setDestination(res[0])
+        worker.setArchive(self.archive)
+        self.dispatcher.submit(key, worker, self.connectCertificateRunner)
+
+    def connectCertificateRunner(self, worker):
+        worker.signals.log.connect(self.log, Qt.UniqueConnection)
+        worker.signals.httpResponse.connect(self.certificateCallback, Qt.UniqueConnection)
+
+    def certificateCallback(self, resultTuple):
+        if resultTuple[0] >= 200 and resultTuple[0] < 300:
+            self.statusMsg(f"Certificate Saved: {resultTuple[2]}", 7000)
+        else:
+            self.log(f"Problem downloading the certificate - status code {resultTuple[0]}", LogLevel.ERROR)
+            self.log(resultTuple[1])
+            self.statusMsg(f"Problem downloading the certificate - status code {resultTuple[0]}", 7000)
+
+    def rowButtonClicked(self, server, port, action):
         if action == "stop":
-            self.stopProxyButtonClicked(port)
+            self.stopProxyButtonClicked(server, port)
         elif action == "traffic":
-            for x in range(0, self.proxyTable.rowCount()):
-                if self.proxyTable.item(x, 2).text() == port:
-                    #Attempt to stop the proxy if its still Listening
-                    if self.proxyTable.cellWidget(x, 1).text() == "Listening":
-                        resp = QMessageBox.question(self, "Traffic Recorder", 
-                            f"The proxy at port {port} is still listening. Would you like to to stop it?", 
-                            QMessageBox.StandardButton.Yes, 
-                            QMessageBox.StandardButton.No)
-                        if resp == QMessageBox.StandardButton.Yes:
-                            self.stopProxyButtonClicked(port)
-                    self.trafficButtonClicked(port)
-                    
+            #Attempt to stop the proxy if its still Listening
+            if self.proxyModel.status(server, port) == ProxyTableModel.LISTENING:
+                resp = QMessageBox.question(self, "Traffic Recorder", 
+                    f"The proxy at port {port} is still listening. Would you like to to stop it?\n\nIf it keeps listening, only the traffic recorded since the last download is fetched.", 
+                    QMessageBox.StandardButton.Yes, 
+                    QMessageBox.StandardButton.No)
+                if resp == QMessageBox.StandardButton.Yes:
+                    self.stopProxyButtonClicked(server, port)
+                else:
+                    self.trafficButtonClicked(server, port, snapshot=True)
+                    return
+            self.trafficButtonClicked(server, port)
         elif action == "remove":
-            for x in range(0, self.proxyTable.rowCount()):
-                if self.proxyTable.item(x, 2).text() == port:
-                    #Attempt to stop the proxy if its still Listening
-                    if self.proxyTable.cellWidget(x, 1).text() == "Listening":
-                        resp = QMessageBox.question(self, "Traffic Recorder", 
-                            f"The proxy at port {port} is still listening. Would you like to to stop it?", 
-                            QMessageBox.StandardButton.Yes, 
-                            QMessageBox.StandardButton.No)
-                        if resp == QMessageBox.StandardButton.Yes:
-                            self.stopProxyButtonClicked(port)
-                    self.proxyTable.removeRow(x)
-
-    def addProxyTableLine(self, port, encrypted):
-        newRowIndex = self.proxyTable.rowCount()
-        stopBtn = ProxyTableButton(port, "stop", newRowIndex)
-        stopBtn.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextOnly)
-        stopBtn.setText("Stop")
-        stopBtn.clicked.connect(self.rowButtonClicked)
-        trafficBtn = ProxyTableButton(port, "traffic", newRowIndex)
-        trafficBtn.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextOnly)
-        trafficBtn.setText("Download")
-        trafficBtn.clicked.connect(self.rowButtonClicked)
-        removeBtn = ProxyTableButton(port, "remove", newRowIndex)
-        removeBtn.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextOnly)
-        removeBtn.setText("Remove")
-        removeBtn.clicked.connect(self.rowButtonClicked)
-        gifLabel = QLabel()
-        gifLabel.setMovie(self.ripple_gif)
-        self.ripple_gif.start()
-        statusTextLabel = QLabel("Listening")
-        self.proxyTable.insertRow(newRowIndex)
-        self.proxyTable.setCellWidget(newRowIndex, 0, gifLabel)
-        self.proxyTable.setCellWidget(newRowIndex, 1, statusTextLabel)
-        self.proxyTable.setItem(newRowIndex, 2, QTableWidgetItem(port))
-        self.proxyTable.setItem(newRowIndex, 3, QTableWidgetItem(str(encrypted)))
-        self.proxyTable.setCellWidget(newRowIndex, 4, stopBtn)
-        self.proxyTable.setCellWidget(newRowIndex, 5, trafficBtn)
-        self.proxyTable.setCellWidget(newRowIndex, 6, removeBtn)
+            #Attempt to stop the proxy if its still Listening
+            if self.proxyModel.status(server, port) == ProxyTableModel.LISTENING:
+                resp = QMessageBox.question(self, "Traffic Recorder", 
+                    f"The proxy at port {port} is still listening. Would you like to to stop it?", 
+                    QMessageBox.StandardButton.Yes, 
+                    QMessageBox.StandardButton.No)
+                if resp == QMessageBox.StandardButton.Yes:
+                    self.stopProxyButtonClicked(server, port)
+            self.proxyModel.removePorts([(server, port)])
+            self.registry.remove([(server, port)])
+            self.clearSnapshots(server, port)
+
+    # proxies are (server, port, encrypted); record keeps them in the
+    # registry. A proxy (re)started on a port starts a new recording, so
+    # snapshots left from an earlier one on that port are dropped.
+    def addProxyTableLines(self, proxies, record=True):
+        self.proxyModel.addProxies(proxies)
+        if record:
+            for server, port, encrypted in proxies:
+                self.clearSnapshots(server, port)
+            self.registry.record_started(proxies)
 
     def portRadioButtons(self):
         if self.specifyPortRadioButton.isChecked():
             self.topPortLabel.setText("Port Number:")
             self.bottomPortLabel.setVisible(False)
             self.bottomPortLineEdit.setVisible(False)
+            self.proxyCountLabel.setVisible(False)
+            self.proxyCountSpinBox.setVisible(False)
         elif self.portRangeRadioButton.isChecked():
             self.topPortLabel.setText("Lower Bound:")
             self.bottomPortLabel.setText("Upper Bound:")
@@ -300,6 +659,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.bottomPortLineEdit.setVisible(True)
             self.topPortLabel.setVisible(True)
             self.bottomPortLabel.setVisible(True)
+            self.proxyCountLabel.setVisible(True)
+            self.proxyCountSpinBox.setVisible(True)
         elif self.randomPortRadioButton.isChecked():
             self.topPortLabel.setText("Lower Bound:")
             self.bottomPortLabel.setText("Upper Bound:")
@@ -307,6 +668,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.bottomPortLineEdit.setVisible(True)
             self.topPortLabel.setVisible(True)
             self.bottomPortLabel.setVisible(True)
+            self.proxyCountLabel.setVisible(True)
+            self.proxyCountSpinBox.setVisible(True)
 
     def showAbout(self):
         repo = self.repoUrl.toString()
@@ -323,6 +686,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def showLogPane(self):
         self.stackedWidget.setCurrentWidget(self.logWidget)
+        self.prepareLogPane()
 
     def showErrorsClicked(self):
         self.showErrors = self.showErrorsCheckbox.isChecked()
@@ -332,6 +696,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             showError = "0"
         self.settings.setValue(f"{self.project_name}/showErrors", showError)
         self.settings.sync()
+        if self.logPaneReady:
+            self.renderLog()
 
     def showDebugClicked(self):
         self.showDebug = self.showDebugCheckbox.isChecked()
@@ -341,6 +707,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             showDebugStr = "0"
         self.settings.setValue(f"{self.project_name}/showDebug", showDebugStr)
         self.settings.sync()
+        if self.logPaneReady:
+            self.renderLog()
 
     def statusMsg(self, msg, timeout=0):
         self.statusLabel.setText(msg)
@@ -348,23 +716,78 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             timer = QTimer.singleShot(timeout, lambda: self.statusLabel.setText(""))
 
     def log(self, msg, level=LogLevel.INFO):
-        print(msg)
-        if not msg:
-            return
+        self.logBuffer.add(msg, level)
+
+    def visibleLogLevels(self):
+        levels = {LogLevel.INFO}
+        if self.showErrors:
+            levels.add(LogLevel.ERROR)
+        if self.showDebug:
+            levels.add(LogLevel.DEBUG)
+        return levels
+
+    def logEntryFormat(self, level):
+        fmt = QTextCharFormat()
         if level == LogLevel.ERROR:
-            if not self.showErrors:
-                return
-            style = "color: #cc0000;"
+            fmt.setForeground(QColor("#cc0000"))
         elif level == LogLevel.DEBUG:
-            if not self.showDebug:
-                return
-            style = "color: #006600;"
+            fmt.setForeground(QColor("#006600"))
         else:
-            style = "color: #000000;"
-        now = datetime.datetime.now()
-        timestamp = now.strftime("%H:%M:%S")
-        msg = f'<span style="{style}">{timestamp} - {msg}</span>'
-        self.logBrowser.append(msg)
+            fmt.setForeground(QColor("#000000"))
+        return fmt
+
+    # Line breaks inside a message stay in its block as line separators
+    def formatLogEntry(self, entry):
+        timestamp = entry.timestamp.strftime("%H:%M:%S")
+        return f"{timestamp} - {entry.msg}".replace("\r\n", "\n").replace("\n", "\u2028")
+
+    # Insert each entry as its own block in a single edit, keeping the
+    # view pinned to the bottom if it was there. Every level is kept in the
+    # pane; the block's user state holds its level and entries outside the
+    # filter are hidden rather than left out.
+    def appendLogEntries(self, entries):
+        if not entries:
+            return
+        scrollBar = self.logBrowser.verticalScrollBar()
+        atBottom = scrollBar.value() >= scrollBar.maximum()
+        levels = self.visibleLogLevels()
+        document = self.logBrowser.document()
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.End)
+        cursor.beginEditBlock()
+        formats = {}
+        for entry in entries:
+            if not document.isEmpty():
+                cursor.insertBlock()
+            fmt = formats.get(entry.level)
+            if fmt is None:
+                fmt = formats[entry.level] = self.logEntryFormat(entry.level)
+            cursor.insertText(self.formatLogEntry(entry), fmt)
+            block = cursor.block()
+            block.setUserState(entry.level.value)
+            block.setVisible(entry.level in levels)
+        cursor.endEditBlock()
+        if atBottom:
+            scrollBar.setValue(scrollBar.maximum())
+
+    # Append the messages logged since the last flush in one update
+    @hotpath("flushLog")
+    def flushLog(self):
+        self.appendLogEntries(self.logBuffer.drain())
+
+    # Show or hide the existing blocks after the level filter changes; the
+    # text itself is never rebuilt
+    @hotpath("renderLog")
+    def renderLog(self):
+        levels = {level.value for level in self.visibleLogLevels()}
+        document = self.logBrowser.document()
+        block = document.firstBlock()
+        while block.isValid():
+            block.setVisible(block.userState() in levels)
+            block = block.next()
+        document.markContentsDirty(0, document.characterCount())
+        self.logBrowser.viewport().update()
+        self.logBrowser.moveCursor(QTextCursor.End)
 
     def mousePressEvent(self, event):
         globalPos = event.globalPosition().toPoint()
@@ -412,10 +835,28 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.settings.setValue(f"{self.project_name}/windowState", self.saveState())
         self.settings.setValue(f"{self.project_name}/showErrors", showError)
         self.settings.setValue(f"{self.project_name}/showDebug", showDebug)
+        self.settings.setValue(f"{self.project_name}/poolSize", self.poolSize)
+        self.settings.setValue(f"{self.project_name}/trafficSegments", self.trafficSegments)
+        self.settings.setValue(f"{self.project_name}/archiveMaxBytes", self.archiveMaxBytes)
+        self.settings.setValue(f"{self.project_name}/archiveMaxAge", self.archiveMaxAge)
         self.settings.sync()
+        self.stopStatusPollers()
+        self.dispatcher.cancelAll()
+        self.threadpool.waitForDone(2000)
+        close_sessions()
+        if "archive" in self.__dict__:
+            self.archive.close()
+        self.registry.close()
+        PROFILER.finish()
         evt.accept()
 
 
+# Carries StatusPoller diffs from its thread to the GUI thread
+class PollerSignals(QObject):
+    changed = Signal(str, object, object)
+    error = Signal(str)
+
+
 class TrafficRecorderRunner(QRunnable):
 
     #Actions
@@ -425,22 +866,55 @@ class TrafficRecorderRunner(QRunnable):
         TRAFFIC = 20
         CERT = 30
         VERIFY = 40
+        START_BATCH = 50
+        HARVEST = 60
+        ENCRYPT = 70
 
     class Signals(QObject):
         log = Signal(str, LogLevel)
         result = Signal(bool)
+        reconciled = Signal(dict)
         httpResponse = Signal(tuple)
+        progress = Signal(str, int, int)
+        batchResult = Signal(dict)
+        finished = Signal(object)
 
-    def __init__(self, url, action=Action.VERIFY):
+    def __init__(self, url, action=Action.VERIFY, poolSize=DEFAULT_POOL_SIZE):
         super(TrafficRecorderRunner, self).__init__()
         self.action = action
         self.url = url
-        self.trafficRecorder = TrafficRecorder(url)
+        # Runners are cheap to create; the underlying connection pool is
+        # shared by every runner pointed at the same server
+        self.trafficRecorder = TrafficRecorder(url, poolSize)
         self.signals = self.Signals()
         self.topPort = 0
         self.botPort = None
         self.encrypt = False
         self.stopProxy = False
+        self.destination = None
+        self.snapshotDir = None
+        self.segments = 1
+        self.source = None
+        self.archive = None
+        self.registry = None
+        self.count = 1
+        self.randomPorts = False
+        self.ports = []
+        self.stopPorts = []
+        self.fleet = None
+        self.cancelled = False
+        # Set again by RunnerDispatcher when the runner is queued
+        self.queuedAt = time.perf_counter()
+
+    # START, START_BATCH, HARVEST and VERIFY go through a fleet. Without
+    # one, a single-server fleet for url is used.
+    def setFleet(self, fleet):
+        self.fleet = fleet
+
+    def getFleet(self):
+        if self.fleet is None:
+            self.fleet = RecorderFleet([self.url], self.trafficRecorder.poolSize)
+        return self.fleet
 
     def setTopPort(self, topPort):
         self.topPort = topPort
@@ -454,61 +928,202 @@ class TrafficRecorderRunner(QRunnable):
     def setStopProxy(self, stop):
         self.stopProxy = stop
 
+    def setCount(self, count):
+        self.count = count
+
+    def setRandomPorts(self, randomPorts):
+        self.randomPorts = randomPorts
+
+    # ports and stopPorts are (server, port) pairs
+    def setPorts(self, ports, stopPorts=()):
+        self.ports = list(ports)
+        self.stopPorts = list(stopPorts)
+
+    def setDestination(self, destination):
+        self.destination = destination
+
+    # Directory of recordings for ENCRYPT
+    def setSource(self, source):
+        self.source = source
+
+    # TRAFFIC and HARVEST keep a compressed copy of what they save in the
+    # archive; CERT is served from it while the server is unchanged
+    def setArchive(self, archive):
+        self.archive = archive
+
+    # The registry's start and stop times become the entry's time window
+    def archiveRecording(self, server, port, path):
+        if self.archive is None:
+            return
+        try:
+            started, stopped = self.registry.window(server, port) if self.registry is not None else (None, None)
+            entry = self.archive.add(path, KIND_RECORDING, server=server, port=port, started=started, ended=stopped)
+            self.log(f"Archived {path} as {entry['hash'][:12]} ({entry['stored']} of {entry['size']} bytes)", LogLevel.DEBUG)
+        except Exception as e:
+            self.log(f"Could not archive {path}: {e}", LogLevel.ERROR)
+
+    # VERIFY reconciles the registry with the servers' Info results;
+    # TRAFFIC and HARVEST record when proxies were last harvested
+    def setRegistry(self, registry):
+        self.registry = registry
+
+    # TRAFFIC downloads this many ranges of the recording in parallel
+    def setSegments(self, segments):
+        self.segments = max(1, segments)
+
+    # TRAFFIC then takes an incremental snapshot into this directory and
+    # merges the snapshots into the destination
+    def setSnapshotDir(self, snapshotDir):
+        self.snapshotDir = snapshotDir
+
+    def emitProgress(self, written, total):
+        self.signals.progress.emit(str(self.topPort), written, total or 0)
+
+    # Always answer with a signal, even if the action raised, so the GUI
+    # never waits on a worker that died
     def run(self):
+        started = time.perf_counter()
+        REGISTRY.observe("runner_queue_seconds", started - self.queuedAt, action=self.action.name)
+        outcome = "ok"
+        try:
+            self.runAction()
+        except Exception as e:
+            outcome = "error"
+            self.log(f"{self.action.name} failed: {e}", LogLevel.ERROR)
+            self.emitFailure(str(e))
+        finally:
+            REGISTRY.observe("runner_run_seconds", time.perf_counter() - started, action=self.action.name)
+            REGISTRY.inc("runner_actions_total", action=self.action.name, outcome="cancelled" if self.cancelled else outcome)
+            self.signals.finished.emit(self)
+
+    # Drop the results of a runner that was superseded while running
+    def cancel(self):
+        self.cancelled = True
+        with warnings.catch_warnings():
+            # PySide warns when a signal had nothing connected
+            warnings.simplefilter("ignore", RuntimeWarning)
+            for signal in (self.signals.result, self.signals.reconciled, self.signals.httpResponse, self.signals.progress, self.signals.batchResult):
+                try:
+                    signal.disconnect()
+                except (RuntimeError, TypeError):
+                    pass
+
+    def emitFailure(self, msg):
         if self.action == self.Action.VERIFY:
-            res = self.trafficRecorder.info()
-            self.log(f"Validating Server URL {self.url}", LogLevel.DEBUG)
-            self.log(f"Response HTTP Code:{res[0]}\n{res[1]}", LogLevel.DEBUG)
-            self.signals.result.emit(res[0] == 200)
+            self.signals.result.emit(False)
+        elif self.action in (self.Action.START_BATCH, self.Action.HARVEST, self.Action.ENCRYPT):
+            self.signals.batchResult.emit({"requested": 0, "failed": [{"server": self.url, "status": 500, "message": msg}]})
+        elif self.action == self.Action.TRAFFIC:
+            self.signals.httpResponse.emit((500, {"message": msg}, self.destination))
+        else:
+            self.signals.httpResponse.emit((500, {"message": msg}, self.url))
+
+    def runAction(self):
+        if self.action == self.Action.VERIFY:
+            fleet = self.getFleet()
+            self.log(f"Validating Server URLs {', '.join(fleet.servers())}", LogLevel.DEBUG)
+            results = fleet.health_check()
+            for url, res in results.items():
+                if isinstance(res, tuple):
+                    self.log(f"{url} Health Check Failed:\n{res[1]}", LogLevel.DEBUG)
+                else:
+                    self.log(f"{url} Response HTTP Code:{res['status']} in {res['latency'] * 1000:.0f} ms\n{res['info']}", LogLevel.DEBUG)
+            if self.registry is not None:
+                # One transaction for every server, from the Info calls above
+                active = {url: parse_active_ports(res["info"]) if isinstance(res, dict) and res["healthy"] else None for url, res in results.items()}
+                self.signals.reconciled.emit(self.registry.reconcile(active))
+            self.signals.result.emit(bool(results) and all(isinstance(res, dict) and res["healthy"] for res in results.values()))
             return
         elif self.action == self.Action.START:
-            res = self.trafficRecorder.start_proxy(self.topPort, self.botPort, self.encrypt)
-            self.log(f"Starting Proxy {self.url}", LogLevel.DEBUG)
+            url, res = self.getFleet().start_proxy(self.topPort, self.botPort, self.encrypt)
+            self.log(f"Starting Proxy {url}", LogLevel.DEBUG)
             self.log(f"Response HTTP Code:{res[0]}\n{res[1]}", LogLevel.DEBUG)
-            self.signals.httpResponse.emit(res)
+            self.signals.httpResponse.emit(res + (url,))
             return
         elif self.action == self.Action.STOP:
-            res = self.trafficRecorder.stop_proxy(self.topPort)
-            self.log(f"Stopping Proxy Port {self.topPort}", LogLevel.DEBUG)
+            if self.fleet is not None and self.url in self.fleet.recorders:
+                res = self.fleet.stop_proxy(self.url, self.topPort)
+            else:
+                res = self.trafficRecorder.stop_proxy(self.topPort)
+            self.log(f"Stopping Proxy Port {self.topPort} on {self.url}", LogLevel.DEBUG)
             self.log(f"Response HTTP Code:{res[0]}\n{res[1]}", LogLevel.DEBUG)
-            self.signals.httpResponse.emit(res)
+            self.signals.httpResponse.emit(res + (self.url,))
             return
         elif self.action == self.Action.TRAFFIC:
-            res = self.trafficRecorder.traffic(self.topPort)
-            self.log(f"Downloading Traffic from port {self.topPort}", LogLevel.DEBUG)
-            self.log(f"Response HTTP Code:{res[0]}\n{res[1]}", LogLevel.DEBUG)
-            self.signals.httpResponse.emit(res)
+            self.log(f"Downloading Traffic from port {self.topPort} to {self.destination}", LogLevel.DEBUG)
+            if self.snapshotDir:
+                res = self.snapshotTraffic()
+            else:
+                res = self.trafficRecorder.traffic(self.topPort, self.destination, self.emitProgress, segments=self.segments)
+            if res[0] >= 200 and res[0] < 300:
+                self.log(f"Response HTTP Code:{res[0]}\n{res[1]} bytes written", LogLevel.DEBUG)
+                if res[1] > 0:
+                    self.archiveRecording(self.url, self.topPort, self.destination)
+                if self.registry is not None:
+                    self.registry.record_harvested([(self.url, self.topPort)])
+            else:
+                self.log(f"Response HTTP Code:{res[0]}\n{res[1]}", LogLevel.DEBUG)
+            self.signals.httpResponse.emit(res + (self.destination,))
+            return
+        elif self.action == self.Action.START_BATCH:
+            self.log(f"Starting {self.count} Proxies in {self.topPort}-{self.botPort}", LogLevel.DEBUG)
+            res = merge_results(self.getFleet().start_proxies(self.topPort, self.botPort, self.count, self.encrypt, self.randomPorts))
+            self.log(f"Started {len(res.get('started', []))} of {res['requested']} Proxies", LogLevel.DEBUG)
+            self.signals.batchResult.emit(res)
+            return
+        elif self.action == self.Action.HARVEST:
+            self.log(f"Harvesting Traffic from {len(self.ports)} Proxies to {self.destination}", LogLevel.DEBUG)
+            progress = lambda url, port, written, total: self.signals.progress.emit(port, written, total or 0)
+            portsByServer = {}
+            stopPortsByServer = {}
+            for server, port in self.ports:
+                portsByServer.setdefault(server, []).append(port)
+            for server, port in self.stopPorts:
+                stopPortsByServer.setdefault(server, []).append(port)
+            res = merge_results(self.getFleet().harvest_all(self.destination, portsByServer, stopPortsByServer, progress))
+            self.log(f"Saved {len(res.get('saved', []))} of {res['requested']} Recordings", LogLevel.DEBUG)
+            for entry in res.get("saved", []):
+                self.archiveRecording(entry["server"], entry["port"], entry["path"])
+            if self.registry is not None:
+                self.registry.record_harvested([(entry["server"], entry["port"]) for entry in res.get("saved", []) + res.get("empty", [])])
+            self.signals.batchResult.emit(res)
+            return
+        elif self.action == self.Action.ENCRYPT:
+            self.log(f"Encrypting Recordings in {self.source} to {self.destination}", LogLevel.DEBUG)
+            progress = lambda source, status, done, total: self.signals.progress.emit(source, done, total)
+            res = self.trafficRecorder.encrypt_directory(self.source, self.destination, progressCallback=progress)
+            self.log(f"Encrypted {len(res['encrypted'])} of {res['requested']} Recordings", LogLevel.DEBUG)
+            self.signals.batchResult.emit(res)
             return
         elif self.action == self.Action.CERT:
+            self.log(f"Downloading the Root Certificate of {self.url}", LogLevel.DEBUG)
+            if self.archive is not None:
+                res = self.archive.certificate(self.url, self.trafficRecorder.certificate)
+            else:
+                res = self.trafficRecorder.certificate()
+            if res[0] >= 200 and res[0] < 300:
+                with open(self.destination, "wb") as f:
+                    f.write(res[1])
+            self.log(f"Response HTTP Code:{res[0]}", LogLevel.DEBUG)
+            self.signals.httpResponse.emit(res + (self.destination,))
             return
 
+    def snapshotTraffic(self):
+        store = SnapshotStore(self.snapshotDir, self.trafficRecorder, self.topPort)
+        try:
+            entry = store.snapshot()
+        except RecorderError as e:
+            return (e.status, {"message": e.message})
+        self.log(f"Snapshot {entry['number']} of port {self.topPort}: {entry['delta']} new bytes, {entry['transferred']} transferred", LogLevel.DEBUG)
+        return (200, store.merge(self.destination))
+
     def log(self, msg, level=LogLevel.INFO):
         self.signals.log.emit(msg, level)
 
-class ProxyTableButton(QToolButton):
-    def __init__(self, portNumber, action, row):
-        super(ProxyTableButton, self).__init__()
-        self.portNumber = portNumber
-        self.action = action
-        self.row = row
-    
-    def getPortNumber(self):
-        return self.portNumber
-
-    def getAction(self):
-        return self.action
-
-    def getRow(self):
-        return self.row
-
 # Start the PySide6 App
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    version_file = QFile(":version.json")
-    version_file.open(QFile.ReadOnly)
-    text_stream = QTextStream(version_file)
-    version_file_text = text_stream.readAll()
-    version_dict = json.loads(version_file_text)
+    version_dict = ResourceLoader.version_info()
     org_name = version_dict["company_name"]
     app_name = version_dict["product_name"]
     version = version_dict["version"]
@@ -516,4 +1131,8 @@ if __name__ == "__main__":
     app.setApplicationName(app_name)
     app.setApplicationVersion(version)
     window = MainWindow()
+    # Runs once the first frame has been processed
+    QTimer.singleShot(0, PROFILER.startupFinished)
+    if exit_after_startup():
+        QTimer.singleShot(0, app.quit)
     sys.exit(app.exec())
\ No newline at end of file
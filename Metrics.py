@@ -0,0 +1,218 @@
+import bisect
+import json
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+
+class Histogram:
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Estimate the q-quantile by linear interpolation inside its bucket
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def summary(self):
+        return {"count": self.count, "sum": self.sum, "mean": self.sum / self.count if self.count else None,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+
+# Thread-safe store of counters, gauges and histograms. Series are keyed by
+# metric name plus keyword labels:
+#   REGISTRY.inc("recorder_requests_total", server=url, endpoint="Info", status="200")
+#   REGISTRY.observe("recorder_request_seconds", 0.012, server=url, endpoint="Info", phase="total")
+class MetricsRegistry:
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.kinds = {}
+        self.help = {}
+        self.values = {}
+
+    def describe(self, name, kind, text):
+        with self.lock:
+            self.kinds[name] = kind
+            self.help[name] = text
+
+    def _key(self, name, kind, labels):
+        known = self.kinds.setdefault(name, kind)
+        if known != kind:
+            raise ValueError(f"{name} is a {known}, not a {kind}")
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            key = self._key(name, COUNTER, labels)
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[self._key(name, GAUGE, labels)] = value
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            key = self._key(name, HISTOGRAM, labels)
+            histogram = self.values.get(key)
+            if histogram is None:
+                histogram = self.values[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+
+    # [(labels dict, value or histogram summary)] for one metric
+    def series(self, name):
+        with self.lock:
+            items = [(dict(labels), value) for (metric, labels), value in self.values.items() if metric == name]
+        return [(labels, value.summary() if isinstance(value, Histogram) else value) for labels, value in items]
+
+    def snapshot(self):
+        result = {}
+        with self.lock:
+            for (name, labels), value in sorted(self.values.items()):
+                entry = dict(labels)
+                if isinstance(value, Histogram):
+                    entry.update(value.summary())
+                else:
+                    entry["value"] = value
+                result.setdefault(name, {"type": self.kinds[name], "series": []})["series"].append(entry)
+        return result
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    # Prometheus text exposition format
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            names = sorted(set(name for name, _ in self.values))
+            for name in names:
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {self.kinds[name]}")
+                for (metric, labels), value in sorted(self.values.items()):
+                    if metric != name:
+                        continue
+                    if isinstance(value, Histogram):
+                        cumulative = 0
+                        for bound, count in zip(list(value.buckets) + ["+Inf"], value.counts):
+                            cumulative += count
+                            lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+                        lines.append(f"{name}_sum{_labels(labels)} {value.sum}")
+                        lines.append(f"{name}_count{_labels(labels)} {value.count}")
+                    else:
+                        lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    # Write to path; .json files get JSON, anything else Prometheus text
+    def export(self, path):
+        with open(path, "w") as f:
+            f.write(self.to_json() if path.endswith(".json") else self.to_prometheus())
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("recorder_requests_total", COUNTER, "Recorder API responses by server, endpoint and status")
+REGISTRY.describe("recorder_request_seconds", HISTOGRAM, "Recorder API call phases: connect (including DNS), tls, ttfb, total, transfer")
+REGISTRY.describe("recorder_retries_total", COUNTER, "Recorder API calls retried")
+REGISTRY.describe("recorder_errors_total", COUNTER, "Recorder API calls that failed without a response")
+REGISTRY.describe("recorder_bytes_total", COUNTER, "Bytes sent to and received from recorder servers")
+REGISTRY.describe("recorder_connections_total", COUNTER, "New connections opened to recorder servers")
+REGISTRY.describe("recorder_breaker_open", GAUGE, "1 while the circuit breaker of a server is open")
+REGISTRY.describe("runner_queue_seconds", HISTOGRAM, "Time runners waited in the thread pool before starting")
+REGISTRY.describe("runner_run_seconds", HISTOGRAM, "Time runners spent running their action")
+REGISTRY.describe("runner_actions_total", COUNTER, "Runner actions by outcome")
+REGISTRY.describe("replay_requests_total", COUNTER, "Replayed requests by response status")
+REGISTRY.describe("replay_request_seconds", HISTOGRAM, "Replayed request latency, first byte sent to last byte read")
+
+
+# Connection setup timings of the current thread's last new connection.
+# urllib3 connects lazily inside the request, on the calling thread, so
+# TrafficRecorder clears them before a request and collects them after.
+_connectTimings = threading.local()
+
+
+def take_connect_timings():
+    timings = getattr(_connectTimings, "value", None)
+    _connectTimings.value = None
+    return timings
+
+
+# Time how long a new connection takes to set up. Only urllib3's
+# documented _new_conn() hook is wrapped, so "connect" covers name
+# resolution and the TCP handshake together.
+class TimedConnectionMixin:
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _connectTimings.value = {"connect": time.perf_counter() - start}
+        return sock
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        timings = getattr(_connectTimings, "value", None) or {}
+        timings["tls"] = max(0.0, time.perf_counter() - start - timings.get("connect", 0.0))
+        _connectTimings.value = timings
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+# HTTPAdapter whose connections record connect/tls timings
+class TimedHTTPAdapter(HTTPAdapter):
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
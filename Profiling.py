@@ -0,0 +1,129 @@
+# Opt-in profiling for the GUI. Import this module before anything heavy so
+# import time is covered too. Enable it with an environment variable or
+# a command line flag:
+#
+#   APPSCAN_RECORDER_PROFILE=startup py MainWindow.py
+#   py MainWindow.py --profile=all
+#
+# "startup" profiles until the main window has been shown once; "all"
+# profiles the whole session and also times hot paths marked with
+# @hotpath. The report (phase timings plus the top functions by
+# cumulative time) is written to APPSCAN_RECORDER_PROFILE_OUT, default
+# traffic-recorder-profile.txt, with the raw pstats data next to it in a
+# .prof file for snakeviz or pstats.
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import time
+
+PROFILE_ENV = "APPSCAN_RECORDER_PROFILE"
+PROFILE_OUT_ENV = "APPSCAN_RECORDER_PROFILE_OUT"
+# Quit as soon as the window has been shown; used by the startup benchmark
+EXIT_AFTER_STARTUP_ENV = "APPSCAN_RECORDER_EXIT_AFTER_STARTUP"
+DEFAULT_REPORT = "traffic-recorder-profile.txt"
+MODES = ("startup", "all")
+REPORT_LINES = 40
+
+
+def _requested_mode(argv):
+    mode = os.environ.get(PROFILE_ENV, "")
+    for arg in argv[1:]:
+        if arg == "--profile":
+            mode = "startup"
+        elif arg.startswith("--profile="):
+            mode = arg.split("=", 1)[1]
+    mode = mode.strip().lower()
+    if mode in ("1", "true", "yes"):
+        mode = "startup"
+    return mode if mode in MODES else None
+
+
+class Profiler:
+
+    def __init__(self, mode=None, output=None):
+        self.mode = mode
+        self.output = output or os.environ.get(PROFILE_OUT_ENV) or DEFAULT_REPORT
+        self.started = time.perf_counter()
+        self.marks = []
+        self.hotpaths = {}
+        self.profile = None
+        self.written = False
+        if mode:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    @property
+    def enabled(self):
+        return self.profile is not None
+
+    # Record a startup phase, in seconds since this module was imported
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter() - self.started))
+
+    def startupFinished(self):
+        self.mark("shown")
+        if self.mode == "startup":
+            self.write()
+
+    def finish(self):
+        self.mark("exit")
+        if self.mode == "all":
+            self.write()
+
+    def recordHotpath(self, name, seconds):
+        count, total, worst = self.hotpaths.get(name, (0, 0.0, 0.0))
+        self.hotpaths[name] = (count + 1, total + seconds, max(worst, seconds))
+
+    def write(self):
+        if not self.enabled or self.written:
+            return
+        self.profile.disable()
+        self.written = True
+        base = os.path.splitext(self.output)[0]
+        self.profile.dump_stats(base + ".prof")
+        with open(self.output, "w") as f:
+            f.write(self.report())
+        sys.stderr.write(f"Profile written to {os.path.abspath(self.output)}\n")
+
+    def report(self):
+        out = io.StringIO()
+        out.write(f"Profile mode: {self.mode}\n\nPhases (seconds since start):\n")
+        previous = 0.0
+        for name, at in self.marks:
+            out.write(f"  {name:<24} {at:8.3f}  (+{at - previous:.3f})\n")
+            previous = at
+        if self.hotpaths:
+            out.write("\nHot paths:\n")
+            for name, (count, total, worst) in sorted(self.hotpaths.items(), key=lambda item: -item[1][1]):
+                out.write(f"  {name:<24} {count:6d} calls  {total * 1000:9.1f} ms total  {total / count * 1000:7.2f} ms mean  {worst * 1000:7.2f} ms max\n")
+        if self.profile is not None:
+            out.write("\n")
+            stats = pstats.Stats(self.profile, stream=out)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_LINES)
+        return out.getvalue()
+
+
+PROFILER = Profiler(_requested_mode(sys.argv))
+
+
+# Time a function while profiling in "all" mode; a no-op check otherwise
+def hotpath(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if PROFILER.mode != "all":
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.recordHotpath(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def exit_after_startup():
+    return os.environ.get(EXIT_AFTER_STARTUP_ENV, "") not in ("", "0")
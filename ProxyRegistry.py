@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import threading
+import time
+
+REGISTRY_ENV = "APPSCAN_RECORDER_REGISTRY"
+
+# Statuses, matching the ones shown in the proxy table
+LISTENING = "Listening"
+STOPPED = "Stopped"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS proxies (
+    server TEXT NOT NULL,
+    port TEXT NOT NULL,
+    encrypted INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    started REAL,
+    stopped REAL,
+    harvested REAL,
+    seen REAL,
+    PRIMARY KEY (server, port)
+);
+CREATE INDEX IF NOT EXISTS proxies_status ON proxies (status);
+"""
+
+
+# The one registry the GUI and the command line client share, so proxies
+# started from either are reconciled by both
+def default_registry_path():
+    return os.environ.get(REGISTRY_ENV) or os.path.join(os.path.expanduser("~"), ".cache", "TrafficRecorder", "proxies.db")
+
+
+# Durable record of every proxy the client started, so a restarted (or
+# crashed) client can rebuild its proxy table and find proxies that are
+# still listening on a server. Rows are keyed by (server, port) and hold
+# the encryption flag, the last known status and when the proxy was
+# started, stopped, last harvested and last seen listening. The database
+# runs in WAL mode and every change is committed at once. Safe to share
+# between threads.
+class ProxyRegistry:
+
+    def __init__(self, path=None):
+        self.path = path or default_registry_path()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Record proxies given as (server, port, encrypted) as listening.
+    # A proxy started again on a port the registry knows replaces it.
+    def record_started(self, proxies):
+        now = time.time()
+        rows = [(server, str(port), int(bool(encrypted)), LISTENING, now, now) for server, port, encrypted in proxies]
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT INTO proxies (server, port, encrypted, status, started, seen) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (server, port) DO UPDATE SET encrypted = excluded.encrypted, status = excluded.status, "
+                "started = excluded.started, seen = excluded.seen, stopped = NULL", rows)
+
+    # keys are (server, port) pairs
+    def record_stopped(self, keys):
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany("UPDATE proxies SET status = ?, stopped = ? WHERE server = ? AND port = ? AND status != ?",
+                                [(STOPPED, now, server, str(port), STOPPED) for server, port in keys])
+
+    def record_harvested(self, keys):
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany("UPDATE proxies SET harvested = ? WHERE server = ? AND port = ?",
+                                [(now, server, str(port)) for server, port in keys])
+
+    # Apply {(server, port): status} for proxies the registry knows
+    def set_statuses(self, statuses):
+        now = time.time()
+        with self.lock, self.db:
+            for (server, port), status in statuses.items():
+                if status == LISTENING:
+                    self.db.execute("UPDATE proxies SET status = ?, seen = ?, stopped = NULL WHERE server = ? AND port = ?",
+                                    (LISTENING, now, server, str(port)))
+                else:
+                    self.db.execute("UPDATE proxies SET status = ?, stopped = COALESCE(stopped, ?) WHERE server = ? AND port = ?",
+                                    (status, now, server, str(port)))
+
+    def remove(self, keys):
+        with self.lock, self.db:
+            self.db.executemany("DELETE FROM proxies WHERE server = ? AND port = ?", [(server, str(port)) for server, port in keys])
+
+    # Forget stopped proxies, optionally only those stopped before a time
+    def prune(self, before=None):
+        with self.lock, self.db:
+            cursor = self.db.execute("DELETE FROM proxies WHERE status = ? AND COALESCE(stopped, 0) <= ?",
+                                     (STOPPED, time.time() if before is None else before))
+            return cursor.rowcount
+
+    # (started, stopped) times of a proxy, None where unknown
+    def window(self, server, port):
+        with self.lock:
+            row = self.db.execute("SELECT started, stopped FROM proxies WHERE server = ? AND port = ?",
+                                  (server, str(port))).fetchone()
+        return (row["started"], row["stopped"]) if row else (None, None)
+
+    # Proxies as dicts in the order they were started, optionally limited
+    # to one server or status
+    def proxies(self, server=None, status=None):
+        clauses = []
+        params = []
+        for column, value in (("server", server), ("status", status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        sql = "SELECT * FROM proxies"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY COALESCE(started, seen), server, CAST(port AS INTEGER)"
+        with self.lock:
+            rows = [dict(row) for row in self.db.execute(sql, params)]
+        for row in rows:
+            row["encrypted"] = bool(row["encrypted"])
+        return rows
+
+    # Bring the registry in line with what the servers report, in one
+    # transaction. activeByServer maps a server to the set of ports it
+    # lists as listening, or None when its state is unknown (unreachable,
+    # or Info does not list proxies); unknown servers are left alone.
+    # Ports a server lists that the registry has never seen are added.
+    #
+    # Returns {"listening", "stopped", "discovered"}, each a list of
+    # (server, port) whose status changed or that were added.
+    def reconcile(self, activeByServer):
+        now = time.time()
+        changes = {"listening": [], "stopped": [], "discovered": []}
+        with self.lock, self.db:
+            for server, active in activeByServer.items():
+                if active is None:
+                    continue
+                active = set(str(port) for port in active)
+                known = {row["port"]: row["status"] for row in self.db.execute(
+                    "SELECT port, status FROM proxies WHERE server = ?", (server,))}
+                for port, status in known.items():
+                    if port in active and status != LISTENING:
+                        changes["listening"].append((server, port))
+                    elif port not in active and status != STOPPED:
+                        changes["stopped"].append((server, port))
+                changes["discovered"] += [(server, port) for port in sorted(active - set(known), key=_portOrder)]
+                self.db.executemany("UPDATE proxies SET status = ?, seen = ?, stopped = NULL WHERE server = ? AND port = ?",
+                                    [(LISTENING, now, server, port) for port in active if port in known])
+            self.db.executemany("UPDATE proxies SET status = ?, stopped = ? WHERE server = ? AND port = ?",
+                                [(STOPPED, now, server, port) for server, port in changes["stopped"]])
+            self.db.executemany("INSERT INTO proxies (server, port, encrypted, status, seen) VALUES (?, ?, 0, ?, ?)",
+                                [(server, port, LISTENING, now) for server, port in changes["discovered"]])
+        return changes
+
+
+def _portOrder(port):
+    return (0, int(port)) if port.isdigit() else (1, port)
@@ -0,0 +1,246 @@
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, Signal
+from PySide6.QtGui import QMovie
+from PySide6.QtWidgets import QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication
+
+
+class ProxyRecord:
+
+    def __init__(self, server, port, encrypted=False, status="Listening"):
+        self.server = server
+        self.port = str(port)
+        self.encrypted = bool(encrypted)
+        self.status = status
+
+    def key(self):
+        return (self.server, self.port)
+
+
+# Table model holding every proxy the client knows about. Rows are looked
+# up through a (server, port) -> row dict instead of scanning the table,
+# and changes are applied in batches so one signal covers many rows.
+class ProxyTableModel(QAbstractTableModel):
+
+    LISTENING = "Listening"
+    STOPPED = "Stopped"
+
+    HEADERS = ["", "Status", "Port", "Server", "Encrypted", "Stop", "Traffic", "Remove"]
+    ICON_COLUMN = 0
+    STATUS_COLUMN = 1
+    PORT_COLUMN = 2
+    SERVER_COLUMN = 3
+    ENCRYPTED_COLUMN = 4
+    # Button columns and the action they trigger
+    ACTIONS = {5: "stop", 6: "traffic", 7: "remove"}
+    BUTTON_TEXT = {5: "Stop", 6: "Download", 7: "Remove"}
+
+    def __init__(self, parent=None):
+        super(ProxyTableModel, self).__init__(parent)
+        self.records = []
+        self.rowIndex = {}
+        self.listeningMovie = None
+        self.stoppedPixmap = None
+        self.iconFactories = None
+        # Rows whose proxy is listening, and the same rows as (first, last)
+        # runs, rebuilt only after the set changes
+        self.listeningRows = set()
+        self.listeningRanges = []
+        self.listeningRangesDirty = False
+
+    # Icons for the status column. The movie's current frame is shown for
+    # listening proxies; only their icon cells are repainted on each frame
+    # and the movie only runs while some proxy is listening.
+    # Either argument may be a callable returning the icon, which is then
+    # only created when the first row is painted.
+    def setIcons(self, listeningMovie, stoppedPixmap):
+        self.iconFactories = (listeningMovie, stoppedPixmap)
+        self.listeningMovie = None
+        self.stoppedPixmap = None
+
+    def loadIcons(self):
+        listeningMovie, stoppedPixmap = self.iconFactories
+        self.iconFactories = None
+        self.listeningMovie = listeningMovie() if callable(listeningMovie) else listeningMovie
+        self.stoppedPixmap = stoppedPixmap() if callable(stoppedPixmap) else stoppedPixmap
+        self.listeningMovie.frameChanged.connect(self.iconFrameChanged)
+        self.updateMovie()
+
+    # One dataChanged per run of consecutive listening rows
+    def iconFrameChanged(self, frame):
+        if self.listeningRangesDirty:
+            self.listeningRanges = row_ranges(self.listeningRows)
+            self.listeningRangesDirty = False
+        for first, last in self.listeningRanges:
+            self.dataChanged.emit(self.index(first, self.ICON_COLUMN), self.index(last, self.ICON_COLUMN), [Qt.DecorationRole])
+
+    def setRowListening(self, row, listening):
+        if listening:
+            self.listeningRows.add(row)
+        else:
+            self.listeningRows.discard(row)
+        self.listeningRangesDirty = True
+
+    def updateMovie(self):
+        if self.listeningMovie is None:
+            return
+        running = self.listeningMovie.state() == QMovie.Running
+        listening = bool(self.listeningRows)
+        if listening and not running:
+            self.listeningMovie.start()
+        elif running and not listening:
+            self.listeningMovie.stop()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.records)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.records[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == self.STATUS_COLUMN:
+                return record.status
+            if column == self.PORT_COLUMN:
+                return record.port
+            if column == self.SERVER_COLUMN:
+                return record.server
+            if column == self.ENCRYPTED_COLUMN:
+                return str(record.encrypted)
+            return self.BUTTON_TEXT.get(column)
+        if role == Qt.DecorationRole and column == self.ICON_COLUMN:
+            if self.iconFactories:
+                self.loadIcons()
+            if record.status == self.LISTENING:
+                return self.listeningMovie.currentPixmap() if self.listeningMovie else None
+            return self.stoppedPixmap
+        return None
+
+    def record(self, server, port):
+        row = self.rowIndex.get((server, str(port)))
+        if row is None:
+            return None
+        return self.records[row]
+
+    def status(self, server, port):
+        record = self.record(server, port)
+        return record.status if record else None
+
+    # (server, port) keys, optionally limited to one server
+    def ports(self, server=None):
+        return [record.key() for record in self.records if server is None or record.server == server]
+
+    def listeningPorts(self, server=None):
+        return [record.key() for record in self.records if record.status == self.LISTENING and (server is None or record.server == server)]
+
+    def proxyCounts(self):
+        counts = {}
+        for record in self.records:
+            if record.status == self.LISTENING:
+                counts[record.server] = counts.get(record.server, 0) + 1
+        return counts
+
+    # Add proxies given as (server, port, encrypted). Proxies already in
+    # the table are marked Listening again instead of being duplicated.
+    def addProxies(self, proxies):
+        new = []
+        newKeys = set()
+        existing = {}
+        for server, port, encrypted in proxies:
+            key = (server, str(port))
+            if key in self.rowIndex or key in newKeys:
+                existing[key] = self.LISTENING
+            else:
+                new.append(ProxyRecord(server, port, encrypted))
+                newKeys.add(key)
+        if new:
+            first = len(self.records)
+            self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+            for offset, record in enumerate(new):
+                self.records.append(record)
+                self.rowIndex[record.key()] = first + offset
+                self.setRowListening(first + offset, record.status == self.LISTENING)
+            self.endInsertRows()
+        if existing:
+            self.setStatuses(existing)
+        self.updateMovie()
+
+    # Apply {(server, port): status} in one pass, emitting a single
+    # dataChanged over the span of changed rows
+    def setStatuses(self, statuses):
+        changed = []
+        for (server, port), status in statuses.items():
+            row = self.rowIndex.get((server, str(port)))
+            if row is not None and self.records[row].status != status:
+                self.records[row].status = status
+                self.setRowListening(row, status == self.LISTENING)
+                changed.append(row)
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), self.ICON_COLUMN), self.index(max(changed), self.STATUS_COLUMN))
+            self.updateMovie()
+
+    def removePorts(self, keys):
+        keys = [(server, str(port)) for server, port in keys]
+        rows = sorted((self.rowIndex[key] for key in keys if key in self.rowIndex), reverse=True)
+        if not rows:
+            return
+        if len(rows) == 1:
+            self.beginRemoveRows(QModelIndex(), rows[0], rows[0])
+            del self.records[rows[0]]
+            self.endRemoveRows()
+        else:
+            self.beginResetModel()
+            for row in rows:
+                del self.records[row]
+            self.endResetModel()
+        self.rowIndex = {record.key(): row for row, record in enumerate(self.records)}
+        # Rows after a removed one have moved up
+        self.listeningRows = {row for row, record in enumerate(self.records) if record.status == self.LISTENING}
+        self.listeningRangesDirty = True
+        self.updateMovie()
+
+
+# Sorted rows as (first, last) runs of consecutive rows
+def row_ranges(rows):
+    ranges = []
+    for row in sorted(rows):
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1] = (ranges[-1][0], row)
+        else:
+            ranges.append((row, row))
+    return ranges
+
+
+# Paints a push button in a cell and reports clicks as
+# (server, port, action), replacing the per-row QToolButton widgets
+class ProxyButtonDelegate(QStyledItemDelegate):
+
+    clicked = Signal(str, str, str)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data(Qt.DisplayRole)
+        button.state = QStyle.State_Enabled
+        if option.state & QStyle.State_MouseOver:
+            button.state |= QStyle.State_MouseOver
+        QApplication.style().drawControl(QStyle.CE_PushButton, button, painter)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and option.rect.contains(event.position().toPoint()):
+            server = model.index(index.row(), ProxyTableModel.SERVER_COLUMN).data(Qt.DisplayRole)
+            port = model.index(index.row(), ProxyTableModel.PORT_COLUMN).data(Qt.DisplayRole)
+            self.clicked.emit(server, port, ProxyTableModel.ACTIONS[index.column()])
+            return True
+        return False
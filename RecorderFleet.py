@@ -0,0 +1,229 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from TrafficRecorder import TrafficRecorder, DEFAULT_POOL_SIZE, DEFAULT_BATCH_WORKERS, parse_active_ports
+
+# Weight of the newest sample in the latency moving average
+LATENCY_SMOOTHING = 0.3
+
+
+# Drives several recorder servers as one. Each server gets its own
+# TrafficRecorder (and so its own connection pool). New proxies go to the
+# healthy server with the fewest proxies ("count") or the lowest smoothed
+# Info latency ("latency"). Fan-out operations run against every server
+# at once and return {url: result}.
+class RecorderFleet:
+
+    COUNT = "count"
+    LATENCY = "latency"
+
+    def __init__(self, urls=(), poolSize=DEFAULT_POOL_SIZE, strategy=COUNT):
+        self.poolSize = poolSize
+        self.strategy = strategy
+        self.recorders = {}
+        self.proxyCounts = {}
+        self.latencies = {}
+        self.healthy = {}
+        self.lock = threading.Lock()
+        self.setServers(urls)
+
+    def setServers(self, urls):
+        urls = [url for url in urls if url]
+        with self.lock:
+            for url in list(self.recorders):
+                if url not in urls:
+                    self._remove(url)
+            for url in urls:
+                if url not in self.recorders:
+                    self.recorders[url] = TrafficRecorder(url, self.poolSize)
+                    self.proxyCounts[url] = 0
+                    self.latencies[url] = None
+                    self.healthy[url] = None
+
+    def addServer(self, url):
+        self.setServers(self.servers() + [url])
+
+    def removeServer(self, url):
+        with self.lock:
+            self._remove(url)
+
+    def _remove(self, url):
+        self.recorders.pop(url, None)
+        self.proxyCounts.pop(url, None)
+        self.latencies.pop(url, None)
+        self.healthy.pop(url, None)
+
+    def servers(self):
+        with self.lock:
+            return list(self.recorders)
+
+    def recorder(self, url):
+        return self.recorders[url]
+
+    def setProxyCount(self, url, count):
+        with self.lock:
+            if url in self.proxyCounts:
+                self.proxyCounts[url] = count
+
+    def _adjustCount(self, url, delta):
+        with self.lock:
+            if url in self.proxyCounts:
+                self.proxyCounts[url] = max(0, self.proxyCounts[url] + delta)
+
+    # Run func(url, recorder) against every server concurrently
+    def _fanOut(self, func, urls=None):
+        urls = self.servers() if urls is None else list(urls)
+        if not urls:
+            return {}
+
+        def call(url):
+            try:
+                return func(url, self.recorders[url])
+            except Exception as e:
+                return (500, {"message": str(e)})
+
+        with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+            return dict(zip(urls, pool.map(call, urls)))
+
+    def healthyServers(self):
+        with self.lock:
+            return [url for url, ok in self.healthy.items() if ok]
+
+    # Healthy servers, or every server if none has been checked yet
+    def candidates(self):
+        with self.lock:
+            healthy = [url for url, ok in self.healthy.items() if ok]
+            if not healthy:
+                healthy = [url for url, ok in self.healthy.items() if ok is None]
+            return healthy
+
+    def pick_server(self):
+        urls = self.candidates()
+        if not urls:
+            return None
+        with self.lock:
+            if self.strategy == self.LATENCY:
+                key = lambda url: (self.latencies[url] if self.latencies[url] is not None else float("inf"), self.proxyCounts[url])
+            else:
+                key = lambda url: (self.proxyCounts[url], self.latencies[url] if self.latencies[url] is not None else float("inf"))
+            return min(urls, key=key)
+
+    # Call Info on every server, updating latency, health and (when the
+    # server lists them) proxy counts
+    def health_check(self):
+        def check(url, recorder):
+            begin = time.perf_counter()
+            res = recorder.info()
+            elapsed = time.perf_counter() - begin
+            ok = res[0] == 200
+            active = parse_active_ports(res[1]) if ok else None
+            with self.lock:
+                if url in self.healthy:
+                    self.healthy[url] = ok
+                    if ok:
+                        previous = self.latencies[url]
+                        self.latencies[url] = elapsed if previous is None else previous + LATENCY_SMOOTHING * (elapsed - previous)
+                    if active is not None:
+                        self.proxyCounts[url] = len(active)
+            return {"status": res[0], "healthy": ok, "latency": elapsed, "info": res[1]}
+        return self._fanOut(check)
+
+    # Start one proxy on the server picked by the strategy. Returns
+    # (url, (status, body))
+    def start_proxy(self, recordingPort, upperBound=None, encrypted=False, jsonObject=None):
+        url = self.pick_server()
+        if url is None:
+            return (None, (503, {"message": "No recorder server available"}))
+        try:
+            res = self.recorders[url].start_proxy(recordingPort, upperBound, encrypted, jsonObject)
+        except Exception as e:
+            res = (500, {"message": str(e)})
+        if res[0] >= 200 and res[0] < 300:
+            self._adjustCount(url, 1)
+        return (url, res)
+
+    # Spread `count` proxies over the servers, least loaded first, and
+    # start each server's share concurrently. Returns {url: result} with
+    # the same shape as TrafficRecorder.start_proxies.
+    def start_proxies(self, lowerBound, upperBound, count, encrypted=False, randomPorts=False, maxWorkers=DEFAULT_BATCH_WORKERS):
+        urls = self.candidates()
+        if not urls:
+            return {}
+        with self.lock:
+            planned = {url: self.proxyCounts[url] for url in urls}
+        shares = {url: 0 for url in urls}
+        for _ in range(count):
+            url = min(urls, key=lambda u: planned[u])
+            planned[url] += 1
+            shares[url] += 1
+
+        def start(url, recorder):
+            res = recorder.start_proxies(lowerBound, upperBound, shares[url], encrypted, randomPorts, maxWorkers)
+            self._adjustCount(url, len(res["started"]))
+            return res
+        return self._fanOut(start, [url for url in urls if shares[url] > 0])
+
+    def stop_proxy(self, url, recordingPort):
+        res = self.recorders[url].stop_proxy(recordingPort)
+        if res[0] >= 200 and res[0] < 300:
+            self._adjustCount(url, -1)
+        return res
+
+    def stop_all(self):
+        def stopAll(url, recorder):
+            res = recorder.stop_all_proxies()
+            if res[0] >= 200 and res[0] < 300:
+                self.setProxyCount(url, 0)
+            return res
+        return self._fanOut(stopAll)
+
+    # Harvest every server's ports at once. portsByServer and
+    # stopPortsByServer map url -> ports; each server's recordings go to
+    # its own sub-directory of `directory`. Ports on a server that is not
+    # in the fleet (e.g. restored from the registry) are reported as
+    # failed rather than dropped.
+    def harvest_all(self, directory, portsByServer, stopPortsByServer=None, progressCallback=None):
+        stopPortsByServer = stopPortsByServer or {}
+
+        def harvest(url, recorder):
+            callback = (lambda port, written, total: progressCallback(url, port, written, total)) if progressCallback else None
+            return recorder.harvest(portsByServer[url], os.path.join(directory, server_dirname(url)), stopPortsByServer.get(url, ()), progressCallback=callback)
+        known = self.servers()
+        results = self._fanOut(harvest, [url for url in portsByServer if url in known])
+        for url, ports in portsByServer.items():
+            if url not in known:
+                message = f"{url} is not one of the configured recorder servers"
+                results[url] = {"requested": len(ports), "saved": [], "empty": [],
+                                "failed": [{"port": str(port), "status": 404, "message": message} for port in ports]}
+        return results
+
+
+# Flatten a {url: start_proxies/harvest result} mapping into one result
+# of the same shape, tagging every entry with its "server"
+def merge_results(results):
+    merged = {"requested": 0}
+    for url, result in results.items():
+        if not isinstance(result, dict):
+            # The whole call failed for this server
+            merged.setdefault("failed", []).append({"server": url, "status": result[0], "message": str(result[1])})
+            continue
+        for key, value in result.items():
+            if key == "requested":
+                merged["requested"] += value
+            else:
+                merged.setdefault(key, []).extend(dict(entry, server=url) for entry in value)
+    return merged
+
+
+# Filesystem-safe name for a server url, e.g. recorder01_8383
+def server_dirname(url):
+    name = re.sub(r"^[a-z]+://", "", url.strip().lower()).rstrip("/")
+    return re.sub(r"[^a-z0-9.-]+", "_", name)
+
+
+# Split the comma or whitespace separated list typed into the URL box
+def parse_server_urls(text):
+    return [url.strip().rstrip("/") for url in re.split(r"[,\s]+", text) if url.strip()]
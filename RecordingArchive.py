@@ -0,0 +1,303 @@
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import sqlite3
+import ssl
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+# zstandard is optional; gzip from the standard library is the fallback
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_ENV = "APPSCAN_RECORDER_ARCHIVE"
+COPY_CHUNK_SIZE = 1024 * 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+
+# Eviction limits the GUI starts with
+DEFAULT_ARCHIVE_MAX_BYTES = 5 * 1024 ** 3
+DEFAULT_ARCHIVE_MAX_AGE = 90 * 24 * 3600
+# How long a cached certificate is trusted when the server's TLS
+# fingerprint cannot be checked (plain http or unreachable)
+CERTIFICATE_MAX_AGE = 24 * 3600
+
+KIND_RECORDING = "recording"
+KIND_CERTIFICATE = "certificate"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL REFERENCES objects(hash),
+    kind TEXT NOT NULL,
+    name TEXT,
+    server TEXT,
+    port INTEGER,
+    fingerprint TEXT,
+    started REAL,
+    ended REAL,
+    added REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_server ON entries (server, port);
+CREATE INDEX IF NOT EXISTS entries_kind ON entries (kind, added);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+def default_codec():
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def default_archive_dir():
+    return os.environ.get(ARCHIVE_ENV) or os.path.join(os.path.expanduser("~"), ".cache", "TrafficRecorder", "archive")
+
+
+# SHA-256 of the DER certificate the server presents, or None for plain
+# http servers and servers that cannot be reached
+def server_fingerprint(url, timeout=5):
+    parts = urlsplit(url)
+    if parts.scheme != "https" or not parts.hostname:
+        return None
+    try:
+        pem = ssl.get_server_certificate((parts.hostname, parts.port or 443), timeout=timeout)
+    except (OSError, ssl.SSLError):
+        return None
+    return hashlib.sha256(ssl.PEM_cert_to_DER_cert(pem)).hexdigest()
+
+
+def _compressor(codec, raw):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw)
+    return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _decompressor(codec, raw):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This archive object is zstd compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+    return gzip.GzipFile(fileobj=raw, mode="rb")
+
+
+# Local store for recordings and root certificates. Content is stored once
+# per SHA-256 under objects/<2 hex>/<hash>, compressed with zstd when
+# available and gzip otherwise; a SQLite index in archive.db maps entries
+# (kind, server, port, time window, fingerprint) to objects. evict() drops
+# the least recently used entries past maxBytes and entries older than
+# maxAge seconds. Safe to share between threads.
+class RecordingArchive:
+
+    def __init__(self, root=None, maxBytes=None, maxAge=None, codec=None):
+        self.root = root or default_archive_dir()
+        self.maxBytes = maxBytes
+        self.maxAge = maxAge
+        self.codec = codec or default_codec()
+        if self.codec == "zstd" and zstandard is None:
+            raise RuntimeError("zstd compression requires the zstandard package")
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(self.root, "archive.db"), check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def objectPath(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    # Compress a stream into a temporary file next to the store. Returns
+    # (hash, size, temporary path).
+    def _compress(self, stream):
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as raw:
+                with _compressor(self.codec, raw) as out:
+                    while True:
+                        chunk = stream.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        sha.update(chunk)
+                        out.write(chunk)
+                        size += len(chunk)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        return sha.hexdigest(), size, tmp
+
+    # Archive a file or binary stream. Content that is already stored is
+    # not written twice. Returns the new entry as a dict.
+    def add(self, source, kind=KIND_RECORDING, server=None, port=None, name=None, started=None, ended=None, fingerprint=None):
+        if hasattr(source, "read"):
+            digest, size, tmp = self._compress(source)
+        else:
+            name = name or os.path.basename(source)
+            with open(source, "rb") as f:
+                digest, size, tmp = self._compress(f)
+        now = time.time()
+        try:
+            with self.lock, self.db:
+                if self.db.execute("SELECT 1 FROM objects WHERE hash = ?", (digest,)).fetchone() is None:
+                    path = self.objectPath(digest)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp, path)
+                    self.db.execute("INSERT INTO objects (hash, codec, size, stored) VALUES (?, ?, ?, ?)",
+                                    (digest, self.codec, size, os.path.getsize(path)))
+                cursor = self.db.execute(
+                    "INSERT INTO entries (hash, kind, name, server, port, fingerprint, started, ended, added, accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (digest, kind, name, server, int(port) if port is not None else None, fingerprint, started, ended or now, now, now))
+                entryId = cursor.lastrowid
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        if self.maxBytes is not None or self.maxAge is not None:
+            self.evict()
+        return self.entry(entryId)
+
+    def entry(self, entryId):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT e.*, o.size, o.stored, o.codec FROM entries e JOIN objects o ON o.hash = e.hash WHERE e.id = ?",
+                (entryId,)).fetchone()
+        return dict(row) if row else None
+
+    # Entries matching every given filter, newest first. since/until select
+    # entries whose time window overlaps [since, until].
+    def find(self, kind=None, server=None, port=None, since=None, until=None, fingerprint=None, limit=None):
+        clauses = []
+        params = []
+        for column, value in (("e.kind", kind), ("e.server", server), ("e.fingerprint", fingerprint)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if port is not None:
+            clauses.append("e.port = ?")
+            params.append(int(port))
+        if since is not None:
+            clauses.append("e.ended >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("COALESCE(e.started, e.ended) <= ?")
+            params.append(until)
+        sql = "SELECT e.*, o.size, o.stored, o.codec FROM entries e JOIN objects o ON o.hash = e.hash"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY e.added DESC, e.id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            return [dict(row) for row in self.db.execute(sql, params)]
+
+    def touch(self, entryId):
+        with self.lock, self.db:
+            self.db.execute("UPDATE entries SET accessed = ? WHERE id = ?", (time.time(), entryId))
+
+    # Decompressing binary stream of an entry's content
+    def open(self, entryId):
+        entry = self.entry(entryId)
+        if entry is None:
+            raise KeyError(f"No archive entry {entryId}")
+        self.touch(entryId)
+        return _decompressor(entry["codec"], open(self.objectPath(entry["hash"]), "rb"))
+
+    def read(self, entryId):
+        with self.open(entryId) as f:
+            return f.read()
+
+    # Write an entry's content to destination. Returns the bytes written.
+    def extract(self, entryId, destination):
+        with self.open(entryId) as src, open(destination, "wb") as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+            return dst.tell()
+
+    def remove(self, entryId):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM entries WHERE id = ?", (entryId,))
+        self._collect()
+
+    # Delete objects no entry refers to any more
+    def _collect(self):
+        with self.lock:
+            orphans = [row["hash"] for row in self.db.execute(
+                "SELECT hash FROM objects WHERE hash NOT IN (SELECT hash FROM entries)")]
+            with self.db:
+                self.db.executemany("DELETE FROM objects WHERE hash = ?", [(h,) for h in orphans])
+        for digest in orphans:
+            try:
+                os.remove(self.objectPath(digest))
+            except FileNotFoundError:
+                pass
+        return orphans
+
+    # Disk used by stored objects, and the size of their content
+    def usage(self):
+        with self.lock:
+            row = self.db.execute("SELECT COUNT(*) AS objects, COALESCE(SUM(stored), 0) AS stored, "
+                                  "COALESCE(SUM(size), 0) AS size FROM objects").fetchone()
+            entries = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"entries": entries, "objects": row["objects"], "stored": row["stored"], "size": row["size"]}
+
+    # Drop entries older than maxAge, then least recently used entries
+    # until the stored objects fit in maxBytes. Returns the removed entry ids.
+    def evict(self, maxBytes=None, maxAge=None):
+        maxBytes = self.maxBytes if maxBytes is None else maxBytes
+        maxAge = self.maxAge if maxAge is None else maxAge
+        removed = []
+        if maxAge is not None:
+            with self.lock, self.db:
+                cutoff = time.time() - maxAge
+                removed += [row["id"] for row in self.db.execute("SELECT id FROM entries WHERE added < ?", (cutoff,))]
+                self.db.execute("DELETE FROM entries WHERE added < ?", (cutoff,))
+            self._collect()
+        if maxBytes is not None:
+            while self.usage()["stored"] > maxBytes:
+                with self.lock:
+                    row = self.db.execute("SELECT id, hash FROM entries ORDER BY accessed, id LIMIT 1").fetchone()
+                    if row is None:
+                        break
+                    with self.db:
+                        self.db.execute("DELETE FROM entries WHERE id = ?", (row["id"],))
+                removed.append(row["id"])
+                self._collect()
+        return removed
+
+    # The recorder root certificate of a server, served from the archive
+    # while the server presents the same TLS certificate. Without a
+    # fingerprint to compare, a cached certificate is only served for
+    # maxAge seconds. fetch() is called on a miss and returns
+    # (status, bytes) like TrafficRecorder.certificate(); successful
+    # results are archived.
+    def certificate(self, server, fetch, fingerprint=None, maxAge=CERTIFICATE_MAX_AGE):
+        fingerprint = fingerprint or server_fingerprint(server)
+        cached = self.find(KIND_CERTIFICATE, server=server, fingerprint=fingerprint, limit=1)
+        if cached and (fingerprint is not None or cached[0]["added"] >= time.time() - maxAge):
+            return (200, self.read(cached[0]["id"]))
+        status, body = fetch()
+        if status >= 200 and status < 300 and isinstance(body, bytes):
+            self.add(io.BytesIO(body), KIND_CERTIFICATE, server=server, name="certificate.pem", fingerprint=fingerprint)
+        return (status, body)
+
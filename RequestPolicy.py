@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+
+
+# Timeouts and retry rules for one recorder endpoint. Every endpoint is
+# retried when the connection could not be established, since the request
+# never reached the server. Idempotent endpoints are also retried after
+# read timeouts, dropped connections and 502/503/504 responses.
+class EndpointPolicy:
+
+    RETRY_STATUSES = (502, 503, 504)
+
+    def __init__(self, connectTimeout=5.0, readTimeout=30.0, retries=2, idempotent=True, backoff=0.25, maxBackoff=5.0):
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.retries = retries
+        self.idempotent = idempotent
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+
+    def timeout(self):
+        return (self.connectTimeout, self.readTimeout)
+
+    # Exponential backoff with full jitter
+    def delay(self, attempt):
+        return random.uniform(0, min(self.maxBackoff, self.backoff * 2 ** attempt))
+
+    def copy(self, **changes):
+        policy = EndpointPolicy(self.connectTimeout, self.readTimeout, self.retries, self.idempotent, self.backoff, self.maxBackoff)
+        for key, value in changes.items():
+            setattr(policy, key, value)
+        return policy
+
+
+DEFAULT_POLICIES = {
+    "Info": EndpointPolicy(readTimeout=10.0),
+    "StartProxy": EndpointPolicy(readTimeout=30.0, idempotent=False),
+    "StopProxy": EndpointPolicy(readTimeout=30.0, idempotent=False),
+    "StopAllProxies": EndpointPolicy(readTimeout=60.0),
+    "Certificate": EndpointPolicy(readTimeout=30.0),
+    # Read timeout is per socket read, not for the whole download
+    "Traffic": EndpointPolicy(readTimeout=120.0),
+    "EncryptDastConfig": EndpointPolicy(readTimeout=300.0, idempotent=False),
+    "DownloadEncryptedDastConfig": EndpointPolicy(readTimeout=120.0),
+}
+
+
+# Fails fast while a server is down. After failureThreshold consecutive
+# failures the breaker opens and calls are rejected without touching the
+# network. After resetTimeout seconds a single trial call is let through
+# (half-open); its outcome closes or re-opens the breaker.
+class CircuitBreaker:
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failureThreshold=5, resetTimeout=30.0):
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.openedAt = 0.0
+        self.trialInFlight = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.openedAt >= self.resetTimeout:
+                self.state = self.HALF_OPEN
+                self.trialInFlight = False
+            if self.state == self.HALF_OPEN and not self.trialInFlight:
+                self.trialInFlight = True
+                return True
+            return False
+
+    def recordSuccess(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trialInFlight = False
+
+    def recordFailure(self):
+        with self.lock:
+            self.failures += 1
+            self.trialInFlight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failureThreshold:
+                self.state = self.OPEN
+                self.openedAt = time.monotonic()
+
+    def retryAfter(self):
+        with self.lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.resetTimeout - (time.monotonic() - self.openedAt))
+
+
+# One breaker per server url, shared by every client talking to it
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(url):
+    with _breakers_lock:
+        breaker = _breakers.get(url)
+        if breaker is None:
+            breaker = CircuitBreaker()
+            _breakers[url] = breaker
+        return breaker
@@ -0,0 +1,94 @@
+# The GUI's icons, GIFs and version.json live in Resources.rcc, a binary
+# Qt resource bundle built by build.py (rcc --binary). Registering it
+# memory maps the file and Qt decodes an asset only when something opens
+# it, so nothing is loaded when this module is imported and load() only
+# registers the bundle the first time it is called. That replaces the
+# generated Resources_rc.py, whose one large bytes literal was unmarshalled
+# and registered in full at import.
+#
+# With APPSCAN_RECORDER_HEADLESS set resources are skipped entirely: icons
+# stay empty and read() serves files from disk. A Resources_rc.py left by
+# an older build is still used when there is no bundle.
+import json
+import os
+import sys
+import threading
+
+RESOURCE_BUNDLE = "Resources.rcc"
+# Use a bundle somewhere else
+BUNDLE_ENV = "APPSCAN_RECORDER_RESOURCES"
+HEADLESS_ENV = "APPSCAN_RECORDER_HEADLESS"
+VERSION_FILE = "version.json"
+
+_lock = threading.Lock()
+# None until load() has run, then True once resources are registered
+_loaded = None
+_registered = None
+
+
+def headless():
+    return os.environ.get(HEADLESS_ENV, "") not in ("", "0")
+
+
+# The bundle next to this module (also where Nuitka unpacks data files)
+# or next to the executable, unless BUNDLE_ENV points elsewhere
+def bundle_path():
+    if os.environ.get(BUNDLE_ENV):
+        return os.environ[BUNDLE_ENV]
+    for directory in (os.path.dirname(os.path.abspath(__file__)), os.path.dirname(os.path.abspath(sys.argv[0] or "."))):
+        path = os.path.join(directory, RESOURCE_BUNDLE)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+# Register the resources once. Returns False when headless or when
+# neither the bundle nor Resources_rc.py is available.
+def load():
+    global _loaded, _registered
+    if headless():
+        return False
+    with _lock:
+        if _loaded is not None:
+            return _loaded
+        from PySide6.QtCore import QResource
+        path = bundle_path()
+        if path and QResource.registerResource(path):
+            _registered = path
+            _loaded = True
+        else:
+            try:
+                import Resources_rc
+                _loaded = True
+            except ImportError:
+                _loaded = False
+        return _loaded
+
+
+def unload():
+    global _loaded, _registered
+    with _lock:
+        if _registered:
+            from PySide6.QtCore import QResource
+            QResource.unregisterResource(_registered)
+        _loaded = None
+        _registered = None
+
+
+# Contents of a resource, e.g. read("version.json"). Falls back to the
+# file on disk when resources are not loaded or do not have it.
+def read(name):
+    if load():
+        from PySide6.QtCore import QFile
+        resource = QFile(":" + name)
+        if resource.open(QFile.ReadOnly):
+            try:
+                return bytes(resource.readAll().data())
+            finally:
+                resource.close()
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), "rb") as f:
+        return f.read()
+
+
+def version_info():
+    return json.loads(read(VERSION_FILE).decode("utf-8"))
@@ -0,0 +1,58 @@
+import time
+
+from PySide6.QtCore import QObject
+
+
+# Queues TrafficRecorderRunners on a QThreadPool, keyed by
+# (server, action, port). A request whose key is already in flight does
+# not start a second runner; its callbacks are attached to the running
+# one instead. With supersede=True the in-flight runner is cancelled in
+# favour of the new one: it is taken off the pool queue if it has not
+# started yet, otherwise its results are dropped.
+class RunnerDispatcher(QObject):
+
+    def __init__(self, threadpool, parent=None):
+        super(RunnerDispatcher, self).__init__(parent)
+        self.threadpool = threadpool
+        self.inFlight = {}
+
+    def isInFlight(self, key):
+        return key in self.inFlight
+
+    # connect(runner) wires the caller's slots to the runner's signals.
+    # Returns the runner that will deliver the result.
+    def submit(self, key, runner, connect=None, supersede=False):
+        existing = self.inFlight.get(key)
+        if existing is not None:
+            if not supersede:
+                if connect:
+                    connect(existing)
+                return existing
+            self.cancel(key)
+        if connect:
+            connect(runner)
+        runner.dispatchKey = key
+        # Bound slot, so it runs on the GUI thread and not in the worker
+        runner.signals.finished.connect(self.finished)
+        self.inFlight[key] = runner
+        runner.setAutoDelete(False)
+        # Read by the runner to report how long it waited for a thread
+        runner.queuedAt = time.perf_counter()
+        self.threadpool.start(runner)
+        return runner
+
+    def cancel(self, key):
+        runner = self.inFlight.pop(key, None)
+        if runner is None:
+            return False
+        if not self.threadpool.tryTake(runner):
+            runner.cancel()
+        return True
+
+    def finished(self, runner):
+        if self.inFlight.get(runner.dispatchKey) is runner:
+            del self.inFlight[runner.dispatchKey]
+
+    def cancelAll(self):
+        for key in list(self.inFlight):
+            self.cancel(key)
@@ -0,0 +1,88 @@
+import threading
+
+# Poll intervals in seconds
+DEFAULT_MIN_INTERVAL = 2.0
+DEFAULT_MAX_INTERVAL = 60.0
+DEFAULT_BACKOFF = 2.0
+
+
+# Background reconciler for proxy state. `source` is a callable returning
+# the set of ports the recorder currently has listening (or None if the
+# server cannot tell us), so a plain function can stand in for a real
+# server in tests. After every poll only the difference to the previous
+# poll is passed to `callback` as (startedPorts, stoppedPorts). When
+# nothing changes the interval grows by `backoff` up to maxInterval; any
+# change, or a call to poke(), drops it back to minInterval.
+class StatusPoller:
+
+    def __init__(self, source, callback, minInterval=DEFAULT_MIN_INTERVAL, maxInterval=DEFAULT_MAX_INTERVAL, backoff=DEFAULT_BACKOFF, errorCallback=None):
+        self.source = source
+        self.callback = callback
+        self.errorCallback = errorCallback
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.backoff = backoff
+        self.interval = minInterval
+        self.known = None
+        self.lock = threading.Lock()
+        self.wakeEvent = threading.Event()
+        self.stopEvent = threading.Event()
+        self.thread = None
+
+    # Seed the baseline with the ports the client believes are listening,
+    # so proxies that died while nobody was polling show up in the first diff
+    def reset(self, expectedPorts=()):
+        with self.lock:
+            self.known = set(str(port) for port in expectedPorts)
+        self.poke()
+
+    # Poll again soon, e.g. right after the user started or stopped a proxy
+    def poke(self):
+        self.interval = self.minInterval
+        self.wakeEvent.set()
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target=self.run, name="StatusPoller", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        self.stopEvent.set()
+        self.wakeEvent.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def isRunning(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def pollOnce(self):
+        try:
+            active = self.source()
+        except Exception as e:
+            active = None
+            if self.errorCallback:
+                self.errorCallback(str(e))
+        if active is None:
+            self.interval = min(self.interval * self.backoff, self.maxInterval)
+            return None
+        active = set(str(port) for port in active)
+        with self.lock:
+            previous = self.known if self.known is not None else set()
+            self.known = active
+        started = active - previous
+        stopped = previous - active
+        if started or stopped:
+            self.interval = self.minInterval
+            self.callback(started, stopped)
+        else:
+            self.interval = min(self.interval * self.backoff, self.maxInterval)
+        return (started, stopped)
+
+    def run(self):
+        while not self.stopEvent.is_set():
+            self.wakeEvent.clear()
+            self.pollOnce()
+            self.wakeEvent.wait(self.interval)
@@ -0,0 +1,251 @@
+import os
+import sqlite3
+import xml.parsers.expat
+from urllib.parse import urlsplit
+
+# Bytes fed to the parser per read
+PARSE_CHUNK_SIZE = 1024 * 1024
+# Rows written to the index per transaction
+INSERT_BATCH_SIZE = 1000
+INDEX_VERSION = 1
+
+# Attribute or child element names each field may be stored under
+FIELD_NAMES = {
+    "method": ("method", "verb"),
+    "url": ("url", "uri", "requesturl"),
+    "host": ("host", "hostname"),
+    "path": ("path",),
+    "status": ("status", "statuscode"),
+}
+
+
+def _local(name):
+    return name.rsplit(":", 1)[-1].lower()
+
+
+def _field(name):
+    name = _local(name)
+    for field, names in FIELD_NAMES.items():
+        if name in names:
+            return field
+    return None
+
+
+# Stream a .dast.config recording and yield one dict per recorded request:
+# offset/length of the raw element in the file, method, url, host, path
+# and response status. Only the element currently being parsed is kept in
+# memory, so file size does not matter. Request elements are matched by
+# local tag name, case-insensitively; fields are read from attributes or
+# from child elements of the same name, and status from the nested
+# response element. The bytes read since the current request element began
+# are kept so its exact end can be found, whether it closes with
+# "</Request >" or is self-closing.
+def iter_requests(source, requestTag="Request", chunkSize=PARSE_CHUNK_SIZE):
+    requestTag = requestTag.lower()
+    own = not hasattr(source, "read")
+    stream = open(source, "rb") if own else source
+    parser = xml.parsers.expat.ParserCreate()
+    parser.buffer_text = True
+    ready = []
+    state = {"entry": None, "depth": 0, "capture": None, "text": [], "inner": False}
+    # Bytes fed to the parser from file offset window["start"] onwards
+    window = {"data": bytearray(), "start": 0}
+
+    def start(name, attrs):
+        entry = state["entry"]
+        local = _local(name)
+        if entry is None:
+            if local == requestTag:
+                entry = {"offset": parser.CurrentByteIndex, "method": None, "url": None, "host": None, "path": None, "status": None}
+                state["entry"] = entry
+                state["depth"] = 1
+                state["inner"] = False
+                for key, value in attrs.items():
+                    field = _field(key)
+                    if field and field != "status":
+                        entry[field] = value
+            return
+        state["inner"] = True
+        state["depth"] += 1
+        if local == "response":
+            for key, value in attrs.items():
+                if _field(key) == "status":
+                    entry["status"] = value
+        field = _field(name)
+        if field and entry[field] is None:
+            state["capture"] = (field, state["depth"])
+            state["text"] = []
+
+    def end(name):
+        entry = state["entry"]
+        if entry is None:
+            return
+        capture = state["capture"]
+        if capture and capture[1] == state["depth"]:
+            entry[capture[0]] = "".join(state["text"]).strip() or None
+            state["capture"] = None
+        state["depth"] -= 1
+        if state["depth"] == 0:
+            # Expat reports a self-closing element as ending just after its
+            # "/>", and any other at the "<" of its end tag
+            data = window["data"]
+            end = parser.CurrentByteIndex - window["start"]
+            if state["inner"] or data[end - 2:end] != b"/>":
+                end = data.index(b">", end) + 1
+            entry["length"] = window["start"] + end - entry["offset"]
+            finish(entry)
+            ready.append(entry)
+            state["entry"] = None
+
+    def characters(data):
+        state["inner"] = True
+        if state["capture"]:
+            state["text"].append(data)
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = characters
+    try:
+        while True:
+            chunk = stream.read(chunkSize)
+            window["data"] += chunk
+            parser.Parse(chunk, not chunk)
+            # Keep the open request element, or else whatever may be the
+            # start of the next tag
+            if state["entry"] is not None:
+                keep = state["entry"]["offset"] - window["start"]
+            else:
+                keep = window["data"].rfind(b"<")
+                if keep < 0:
+                    keep = len(window["data"])
+            del window["data"][:keep]
+            window["start"] += keep
+            while ready:
+                yield ready.pop(0)
+            if not chunk:
+                break
+    finally:
+        if own:
+            stream.close()
+
+
+def finish(entry):
+    if entry["url"] and (not entry["host"] or not entry["path"]):
+        parts = urlsplit(entry["url"])
+        entry["host"] = entry["host"] or parts.hostname
+        entry["path"] = entry["path"] or parts.path
+    if entry["method"]:
+        entry["method"] = entry["method"].upper()
+    try:
+        entry["status"] = int(entry["status"]) if entry["status"] is not None else None
+    except ValueError:
+        entry["status"] = None
+
+
+# On-disk index of a recording, kept next to it as <recording>.idx by
+# default. Building it streams the recording once; afterwards requests can
+# be filtered and paged with SQL and single entries are read back by
+# seeking to their offset. The index is rebuilt when the recording's size
+# or modification time changes.
+class TrafficIndex:
+
+    def __init__(self, recordingPath, indexPath=None, requestTag="Request"):
+        self.recordingPath = recordingPath
+        self.indexPath = indexPath or recordingPath + ".idx"
+        self.requestTag = requestTag
+        self.db = sqlite3.connect(self.indexPath)
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS requests (id INTEGER PRIMARY KEY, offset INTEGER, length INTEGER, method TEXT, host TEXT, path TEXT, url TEXT, status INTEGER)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def signature(self):
+        stat = os.stat(self.recordingPath)
+        return f"{INDEX_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def isCurrent(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        return row is not None and row[0] == self.signature()
+
+    # Index the recording unless the existing index is current. Returns
+    # the number of requests. progressCallback gets (requests, bytesParsed).
+    def build(self, force=False, progressCallback=None):
+        if not force and self.isCurrent():
+            return self.count()
+        signature = self.signature()
+        with self.db:
+            self.db.execute("DELETE FROM requests")
+            self.db.execute("DELETE FROM meta")
+        rows = []
+        count = 0
+        for entry in iter_requests(self.recordingPath, self.requestTag):
+            rows.append((entry["offset"], entry["length"], entry["method"], entry["host"], entry["path"], entry["url"], entry["status"]))
+            count += 1
+            if len(rows) >= INSERT_BATCH_SIZE:
+                self._insert(rows)
+                rows = []
+                if progressCallback:
+                    progressCallback(count, entry["offset"] + entry["length"])
+        self._insert(rows)
+        with self.db:
+            self.db.execute("CREATE INDEX IF NOT EXISTS requests_host ON requests (host)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS requests_status ON requests (status)")
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (signature,))
+        return count
+
+    def _insert(self, rows):
+        if rows:
+            with self.db:
+                self.db.executemany("INSERT INTO requests (offset, length, method, host, path, url, status) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _where(self, host=None, method=None, status=None, path=None):
+        clauses = []
+        params = []
+        if host:
+            clauses.append("host = ?")
+            params.append(host)
+        if method:
+            clauses.append("method = ?")
+            params.append(method.upper())
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(int(status))
+        if path:
+            clauses.append("path LIKE ?")
+            params.append(path.replace("%", "\\%").replace("_", "\\_") + "%")
+            clauses[-1] += " ESCAPE '\\'"
+        return (" WHERE " + " AND ".join(clauses) if clauses else "", params)
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self.db.execute(f"SELECT COUNT(*) FROM requests{where}", params).fetchone()[0]
+
+    # One page of matching requests; path filters by prefix
+    def query(self, host=None, method=None, status=None, path=None, limit=50, offset=0):
+        where, params = self._where(host, method, status, path)
+        cursor = self.db.execute(f"SELECT id, offset, length, method, host, path, url, status FROM requests{where} ORDER BY id LIMIT ? OFFSET ?", params + [limit, offset])
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    # Request counts and total bytes grouped by host, method and status
+    def summary(self):
+        result = {"requests": self.count(), "bytes": self.db.execute("SELECT COALESCE(SUM(length), 0) FROM requests").fetchone()[0]}
+        for column in ("host", "method", "status"):
+            result[column] = {str(key): count for key, count in self.db.execute(f"SELECT {column}, COUNT(*) FROM requests GROUP BY {column} ORDER BY COUNT(*) DESC")}
+        return result
+
+    # Raw bytes of one recorded request/response element
+    def read(self, requestId):
+        row = self.db.execute("SELECT offset, length FROM requests WHERE id = ?", (requestId,)).fetchone()
+        if row is None:
+            raise KeyError(requestId)
+        with open(self.recordingPath, "rb") as f:
+            f.seek(row[0])
+            return f.read(row[1])
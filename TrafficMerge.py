@@ -0,0 +1,83 @@
+import hashlib
+import os
+import re
+from urllib.parse import urlsplit
+
+from TrafficIndex import iter_requests
+
+# Paths with these extensions are static assets, dropped with dropStatic
+STATIC_EXTENSIONS = frozenset([
+    ".css", ".js", ".mjs", ".map", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".webp", ".bmp",
+    ".woff", ".woff2", ".ttf", ".otf", ".eot", ".mp3", ".mp4", ".webm", ".avi",
+])
+
+# Parts of a recorded request that differ between otherwise identical
+# exchanges: timing attributes, whitespace between elements and headers
+# that carry the current time
+VOLATILE_ATTRIBUTES = re.compile(rb'\s(?:time|timestamp|date|duration|elapsed|started|id)="[^"]*"', re.IGNORECASE)
+VOLATILE_HEADERS = re.compile(rb'(?:^|(?<=&#10;)|(?<=\n))(?:Date|Expires|Age|Last-Modified|X-Request-Id):[^&\n<]*', re.IGNORECASE)
+INTER_ELEMENT_SPACE = re.compile(rb">\s+<")
+
+
+def normalize(raw):
+    raw = VOLATILE_ATTRIBUTES.sub(b"", raw)
+    raw = VOLATILE_HEADERS.sub(b"", raw)
+    return INTER_ELEMENT_SPACE.sub(b"><", raw.strip())
+
+
+def request_digest(raw):
+    return hashlib.blake2b(normalize(raw), digest_size=16).digest()
+
+
+def is_static(entry, extensions=STATIC_EXTENSIONS):
+    path = entry["path"] or (urlsplit(entry["url"]).path if entry["url"] else "")
+    return os.path.splitext(path)[1].lower() in extensions
+
+
+# Merge several .dast.config recordings into one. Requests are streamed
+# one element at a time, identical request/response pairs (after
+# normalize()) are written once, and with dropStatic requests for static
+# assets are left out. The document prolog and closing tags come from the
+# first recording that has requests. Memory holds one 16 byte digest per
+# unique request, never the recordings themselves.
+#
+# Returns {"inputs", "requests", "written", "duplicates", "static", "bytes"}.
+def merge_recordings(sources, destination, dropStatic=False, staticExtensions=STATIC_EXTENSIONS,
+                     requestTag="Request", progressCallback=None):
+    seen = set()
+    stats = {"inputs": len(sources), "requests": 0, "written": 0, "duplicates": 0, "static": 0, "bytes": 0}
+    footer = None
+    tmp = destination + ".part"
+    with open(tmp, "wb") as out:
+        for number, source in enumerate(sources):
+            with open(source, "rb") as raw:
+                end = None
+                for entry in iter_requests(source, requestTag):
+                    if footer is None and end is None:
+                        # Prolog and root element of the first recording
+                        raw.seek(0)
+                        out.write(raw.read(entry["offset"]).rstrip(b" \t"))
+                    stats["requests"] += 1
+                    end = entry["offset"] + entry["length"]
+                    if dropStatic and is_static(entry, staticExtensions):
+                        stats["static"] += 1
+                        continue
+                    raw.seek(entry["offset"])
+                    element = raw.read(entry["length"])
+                    digest = request_digest(element)
+                    if digest in seen:
+                        stats["duplicates"] += 1
+                        continue
+                    seen.add(digest)
+                    out.write(b"  " + element + b"\n")
+                    stats["written"] += 1
+                if footer is None and end is not None:
+                    raw.seek(end)
+                    footer = raw.read().lstrip()
+            if progressCallback:
+                progressCallback(number + 1, len(sources), stats)
+        if footer:
+            out.write(footer)
+        stats["bytes"] = out.tell()
+    os.replace(tmp, destination)
+    return stats
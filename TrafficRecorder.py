@@ -1,30 +1,375 @@
+import base64
+import contextlib
+import datetime
+import functools
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 import urllib3
 
+from Metrics import REGISTRY, TimedHTTPAdapter, take_connect_timings
+from RequestPolicy import DEFAULT_POLICIES, EndpointPolicy, get_breaker
+
 urllib3.disable_warnings()
 
+# Default number of keep-alive connections kept open per recorder server
+DEFAULT_POOL_SIZE = 16
+
+# Default number of concurrent requests for batch operations
+DEFAULT_BATCH_WORKERS = 8
+
+# Chunk size used when streaming recordings to disk
+TRAFFIC_CHUNK_SIZE = 256 * 1024
+
+# Attempts after the first for a download to a path; each one resumes
+# where the previous attempt stopped
+TRAFFIC_RESUME_RETRIES = 5
+# Backoff between resume attempts: base delay, doubled per attempt, capped
+TRAFFIC_RESUME_BACKOFF = 0.5
+TRAFFIC_RESUME_MAX_BACKOFF = 10
+# Parallel downloads never split a recording into parts smaller than this
+MIN_SEGMENT_SIZE = 1024 * 1024
+# How often a running download records its progress in the .part.json file
+PARTIAL_SAVE_INTERVAL = 8 * 1024 * 1024
+
+# Statuses StartProxy answers with when the requested port is taken
+PORT_IN_USE_STATUSES = (400, 409)
+
+# Form field name the recorder expects for EncryptDastConfig uploads
+ENCRYPT_FORM_FIELD = "file"
+
+# Polling interval bounds while the server encrypts an upload
+ENCRYPT_POLL_INTERVAL = 0.5
+ENCRYPT_MAX_POLL_INTERVAL = 10
+ENCRYPT_TIMEOUT = 600
+# 404s from DownloadEncryptedDastConfig whose message says neither "still
+# encrypting" nor "unknown id" tolerated in a row before giving up
+ENCRYPT_MAX_UNCLEAR_POLLS = 5
+# Words in a 404 message that tell the two cases apart
+ENCRYPT_PENDING_WORDS = ("progress", "pending", "processing", "encrypting", "not ready", "not yet")
+ENCRYPT_UNKNOWN_WORDS = ("unknown", "no such", "not found", "invalid", "expired")
+
+# Shared sessions, one per (server url, pool size). requests.Session and the
+# urllib3 pool underneath it are safe to share between QThreadPool workers,
+# so every TrafficRecorder pointed at the same server reuses open TCP/TLS
+# connections instead of handshaking on every call.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url, poolSize=DEFAULT_POOL_SIZE):
+    key = (url, poolSize)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            # pool_block keeps the pool at poolSize under load instead of
+            # opening (and then discarding) extra connections
+            adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=poolSize, pool_block=True)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.verify = False
+            session.headers["Connection"] = "keep-alive"
+            _sessions[key] = session
+        return session
+
+
+# Yields a writable binary file for destination, which is either a path
+# or an already open file-like object (left open for the caller)
+@contextlib.contextmanager
+def open_destination(destination):
+    if hasattr(destination, "write"):
+        yield destination
+    else:
+        with open(destination, "wb") as f:
+            yield f
+
+
+# multipart/form-data body for a single file that requests can stream.
+# __len__ gives requests the Content-Length up front, so the upload is not
+# chunk-encoded, and iterating reads the file chunk by chunk instead of
+# loading it into memory. source is a path, bytes, or a binary file.
+class MultipartFile:
+
+    def __init__(self, source, field=ENCRYPT_FORM_FIELD, filename=None, chunkSize=TRAFFIC_CHUNK_SIZE, progressCallback=None):
+        self.source = source
+        self.chunkSize = chunkSize
+        self.progressCallback = progressCallback
+        if isinstance(source, (bytes, bytearray)):
+            self.size = len(source)
+            filename = filename or "traffic.dast.config"
+        elif hasattr(source, "read"):
+            position = source.tell()
+            self.size = source.seek(0, os.SEEK_END) - position
+            source.seek(position)
+            filename = filename or os.path.basename(getattr(source, "name", "") or "traffic.dast.config")
+        else:
+            self.size = os.path.getsize(source)
+            filename = filename or os.path.basename(source)
+        self.boundary = uuid.uuid4().hex
+        self.head = (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n').encode()
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+    @property
+    def contentType(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return len(self.head) + self.size + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        sent = 0
+        if isinstance(self.source, (bytes, bytearray)):
+            for start in range(0, self.size, self.chunkSize):
+                chunk = bytes(self.source[start:start + self.chunkSize])
+                sent += len(chunk)
+                self.progress(sent)
+                yield chunk
+        else:
+            own = not hasattr(self.source, "read")
+            f = open(self.source, "rb") if own else self.source
+            try:
+                while sent < self.size:
+                    chunk = f.read(min(self.chunkSize, self.size - sent))
+                    if not chunk:
+                        break
+                    sent += len(chunk)
+                    self.progress(sent)
+                    yield chunk
+            finally:
+                if own:
+                    f.close()
+        yield self.tail
+
+    def progress(self, sent):
+        if self.progressCallback:
+            self.progressCallback(sent, self.size)
+
+
+# Pull the set of listening ports out of an Info response. Returns None
+# when the response does not list proxies.
+def parse_active_ports(info):
+    if not isinstance(info, dict):
+        return None
+    for key in ("proxies", "activeProxies", "runningProxies", "ports"):
+        if key in info and isinstance(info[key], list):
+            ports = set()
+            for proxy in info[key]:
+                if isinstance(proxy, dict):
+                    proxy = proxy.get("port", proxy.get("recordingPort"))
+                if proxy is not None:
+                    ports.add(str(proxy))
+            return ports
+    return None
+
+
+# SHA-256 of the full recording as hex, from X-Checksum-SHA256 or a
+# sha-256 entry of Repr-Digest/Digest; None if the server sent neither
+def response_checksum(headers):
+    value = headers.get("X-Checksum-SHA256")
+    if value:
+        return value.strip().lower()
+    for name in ("Repr-Digest", "Digest"):
+        for item in (headers.get(name) or "").split(","):
+            algorithm, sep, encoded = item.strip().partition("=")
+            if sep and algorithm.strip().lower() == "sha-256":
+                try:
+                    return base64.b64decode(encoded.strip().strip(":")).hex()
+                except ValueError:
+                    pass
+    return None
+
+
+# (start, end, total) of a "bytes start-last/total" Content-Range, end
+# exclusive and total None when unknown
+def parse_content_range(header):
+    match = re.fullmatch(r"\s*bytes\s+(\d+)-(\d+)/(\d+|\*)\s*", header or "")
+    if not match:
+        return None
+    total = int(match.group(3)) if match.group(3) != "*" else None
+    return (int(match.group(1)), int(match.group(2)) + 1, total)
+
+
+def file_sha256(path, chunkSize=TRAFFIC_CHUNK_SIZE):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunkSize), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+# Whether a 404 from DownloadEncryptedDastConfig means the file is still
+# being encrypted (True), the id is unknown (False), or cannot tell (None)
+def encrypt_pending(body):
+    message = (body.get("message") if isinstance(body, dict) else body) or ""
+    message = str(message).lower()
+    if any(word in message for word in ENCRYPT_PENDING_WORDS):
+        return True
+    if any(word in message for word in ENCRYPT_UNKNOWN_WORDS):
+        return False
+    return None
+
+
+# A ranged Traffic request was answered with the whole recording (it
+# changed since the download started, or the server ignores Range)
+class RangeNotSatisfied(Exception):
+    pass
+
+
+# Raised by TrafficRecorder._request and turned into a (status, body) tuple
+# by the public methods
+class RecorderError(Exception):
+
+    def __init__(self, status, message):
+        super(RecorderError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Public TrafficRecorder calls return (status, {"message": ...}) instead of
+# raising when a request fails or the circuit breaker is open
+def recorder_call(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except RecorderError as e:
+            return (e.status, {"message": e.message})
+    return wrapper
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
 class TrafficRecorder:
     
     url = None
 
-    def __init__(self, url=None):
-        self.url = url
+    # policies maps endpoint names (e.g. "Traffic") to EndpointPolicy
+    # overrides; endpoints not listed use DEFAULT_POLICIES
+    def __init__(self, url=None, poolSize=DEFAULT_POOL_SIZE, policies=None):
+        self.poolSize = poolSize
+        self.policies = dict(DEFAULT_POLICIES)
+        if policies:
+            self.policies.update(policies)
+        self.setUrl(url)
 
     def setUrl(self, url):
         self.url = url
+        self.session = get_session(url, self.poolSize) if url else None
+        self.breaker = get_breaker(url) if url else None
+
+    # Send one request under the endpoint's policy: connect/read timeouts,
+    # jittered retries and the server's circuit breaker. Returns the
+    # response or raises RecorderError.
+    def _request(self, method, endpoint, api_path, **kwargs):
+        if not self.url:
+            raise RecorderError(400, "No recorder server URL set")
+        policy = self.policies.get(endpoint) or EndpointPolicy()
+        labels = {"server": self.url, "endpoint": endpoint}
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                REGISTRY.inc("recorder_errors_total", kind="breaker-open", **labels)
+                raise RecorderError(503, f"{self.url} is not responding; retrying in {self.breaker.retryAfter():.0f}s")
+            take_connect_timings()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, self.url + api_path, timeout=policy.timeout(), **kwargs)
+            except requests.RequestException as e:
+                self.breaker.recordFailure()
+                self._recordBreaker()
+                REGISTRY.inc("recorder_errors_total", kind=type(e).__name__, **labels)
+                notConnected = isinstance(e, requests.ConnectTimeout) or (isinstance(e, requests.ConnectionError) and isinstance(getattr(e.args[0] if e.args else None, "reason", None), urllib3.exceptions.NewConnectionError))
+                if attempt < policy.retries and (notConnected or (policy.idempotent and isinstance(e, (requests.Timeout, requests.ConnectionError)))):
+                    REGISTRY.inc("recorder_retries_total", **labels)
+                    time.sleep(policy.delay(attempt))
+                    attempt += 1
+                    continue
+                if isinstance(e, requests.Timeout):
+                    raise RecorderError(504, f"Timed out talking to {self.url}: {e}")
+                if isinstance(e, requests.ConnectionError):
+                    raise RecorderError(502, f"Could not connect to {self.url}: {e}")
+                raise RecorderError(500, str(e))
+            self._recordResponse(response, labels, time.perf_counter() - start, kwargs)
+            if response.status_code >= 500:
+                self.breaker.recordFailure()
+            else:
+                self.breaker.recordSuccess()
+            self._recordBreaker()
+            if response.status_code in EndpointPolicy.RETRY_STATUSES and policy.idempotent and attempt < policy.retries:
+                REGISTRY.inc("recorder_retries_total", **labels)
+                response.close()
+                time.sleep(policy.delay(attempt))
+                attempt += 1
+                continue
+            return response
+
+    # For streamed responses "total" ends when the headers arrive; the
+    # body is timed as "transfer" by _writeStream
+    def _recordResponse(self, response, labels, elapsed, kwargs):
+        REGISTRY.inc("recorder_requests_total", status=response.status_code, **labels)
+        REGISTRY.observe("recorder_request_seconds", elapsed, phase="total", **labels)
+        REGISTRY.observe("recorder_request_seconds", response.elapsed.total_seconds(), phase="ttfb", **labels)
+        timings = take_connect_timings()
+        if timings:
+            REGISTRY.inc("recorder_connections_total", server=self.url)
+            for phase, seconds in timings.items():
+                REGISTRY.observe("recorder_request_seconds", seconds, phase=phase, **labels)
+        data = kwargs.get("data")
+        if data is not None and hasattr(data, "__len__"):
+            REGISTRY.inc("recorder_bytes_total", len(data), direction="sent", **labels)
+        if not kwargs.get("stream"):
+            REGISTRY.inc("recorder_bytes_total", len(response.content), direction="received", **labels)
+
+    def _recordBreaker(self):
+        REGISTRY.set("recorder_breaker_open", 1 if self.breaker.state == self.breaker.OPEN else 0, server=self.url)
+
+    def _get(self, endpoint, api_path, **kwargs):
+        return self._request("GET", endpoint, api_path, **kwargs)
+
+    def _post(self, endpoint, api_path, **kwargs):
+        return self._request("POST", endpoint, api_path, **kwargs)
+
+    # Error responses are not always JSON
+    def _json(self, response):
+        try:
+            return response.json()
+        except ValueError:
+            return {"message": response.text}
 
     # Get Traffic Recorder Server Info
     # Tested
+    @recorder_call
     def info(self):
         api_path = "/automation/Info"
-        try:
-            response = requests.get(self.url+api_path, verify=False)
-            return (response.status_code, response.json())
-        except Exception as e:
-            return (500, str(e))
-        
+        response = self._get("Info", api_path)
+        return (response.status_code, self._json(response))
+
+    # Ports the recorder reports as listening, or None if unknown
+    def active_proxies(self):
+        res = self.info()
+        if res[0] != 200:
+            raise ConnectionError(f"Info request failed - status code {res[0]}: {res[1]}")
+        return parse_active_ports(res[1])
 
     # 
+    @recorder_call
     def start_proxy(self, recordingPort, upperBound=None, encrypted=False, jsonObject=None):
         if upperBound == 0:
             upperBound = None
@@ -35,49 +380,502 @@ class TrafficRecorder:
         if encrypted:
             query_params["encrypted"] = True
         if not jsonObject:
-            response = requests.get(self.url+api_path, params=query_params, verify=False)
+            response = self._get("StartProxy", api_path, params=query_params)
         else:
             headers = {"Content-Type": "application/json"}
-            response = requests.post(self.url+api_path, headers=headers, params=query_params, json=jsonObject, verify=False)
-        return (response.status_code, response.json())
+            response = self._post("StartProxy", api_path, headers=headers, params=query_params, json=jsonObject)
+        return (response.status_code, self._json(response))
+
+    # Start `count` proxies in [lowerBound, upperBound] with at most
+    # maxWorkers requests in flight. By default ports are tried in order
+    # and a port the server refuses as already in use is skipped for the
+    # next free candidate. With randomPorts the server picks a port from
+    # the range for every proxy. StartProxy is not idempotent, so nothing
+    # is retried here; any other failure (server down, circuit breaker
+    # open, 5xx) stops the whole batch and is reported for every proxy not
+    # yet started. Returns
+    # {"requested": n, "started": [response, ...], "failed": [error, ...]}
+    def start_proxies(self, lowerBound, upperBound, count, encrypted=False, randomPorts=False, maxWorkers=DEFAULT_BATCH_WORKERS):
+        lowerBound = int(lowerBound)
+        upperBound = int(upperBound)
+        if upperBound < lowerBound:
+            lowerBound, upperBound = upperBound, lowerBound
+        if not randomPorts:
+            count = min(count, upperBound - lowerBound + 1)
+        candidates = iter(range(lowerBound, upperBound + 1))
+        candidates_lock = threading.Lock()
+        # First failure that stopped the batch
+        stopped = []
 
+        def nextPort():
+            with candidates_lock:
+                return None if stopped else next(candidates, None)
+
+        def attempt(port, upper):
+            try:
+                res = self.start_proxy(port, upper, encrypted)
+            except Exception as e:
+                res = (500, {"message": str(e)})
+            if not (res[0] >= 200 and res[0] < 300) and res[0] not in PORT_IN_USE_STATUSES:
+                with candidates_lock:
+                    stopped.append(res)
+            return res
+
+        def startOne(_):
+            if stopped:
+                return stopped[0]
+            if randomPorts:
+                return attempt(lowerBound, upperBound)
+            res = (409, {"message": f"No free port left in {lowerBound}-{upperBound}"})
+            port = nextPort()
+            while port is not None:
+                res = attempt(port, None)
+                if (res[0] >= 200 and res[0] < 300) or res[0] not in PORT_IN_USE_STATUSES:
+                    return res
+                port = nextPort()
+            return stopped[0] if stopped else res
+
+        result = {"requested": count, "started": [], "failed": []}
+        with ThreadPoolExecutor(max_workers=max(1, min(maxWorkers, count))) as pool:
+            for status, body in pool.map(startOne, range(count)):
+                if status >= 200 and status < 300:
+                    result["started"].append(body)
+                else:
+                    if not isinstance(body, dict):
+                        body = {"message": str(body)}
+                    result["failed"].append(dict(body, status=status))
+        return result
+
+    @recorder_call
     def stop_proxy(self, recordingPort):
         api_path = f"/automation/StopProxy/{recordingPort}"
-        response = requests.get(self.url + api_path, verify=False)
-        return (response.status_code, response.json())
+        response = self._get("StopProxy", api_path)
+        return (response.status_code, self._json(response))
 
+    @recorder_call
     def stop_all_proxies(self):
         api_path = "/automation/StopAllProxies"
-        response = requests.get(self.url + api_path)
-        return (response.status_code, response.json())
+        response = self._get("StopAllProxies", api_path)
+        return (response.status_code, self._json(response))
 
+    @recorder_call
     def certificate(self):
         api_path = "/automation/Certificate"
-        response = requests.get(self.url + api_path, verify=False)
+        response = self._get("Certificate", api_path)
         #Since 200 responses return binary content, not json
         if response.status_code >= 200 and response.status_code < 300:
             return (response.status_code, response.content)
-        return (response.status_code, response.json())
+        return (response.status_code, self._json(response))
 
-    def traffic(self, recordingPort):
+    # Without a destination the recording is returned as bytes. With one
+    # (a path or binary file object) the body is streamed to it in chunks
+    # and the number of bytes written is returned instead, so the whole
+    # recording is never held in memory. progressCallback is called with
+    # (bytesWritten, totalBytes); totalBytes is None if the server did not
+    # send a Content-Length.
+    #
+    # Downloads to a path are resumable unless resume is False: see
+    # download_traffic. segments > 1 fetches that many ranges in parallel.
+    @recorder_call
+    def traffic(self, recordingPort, destination=None, progressCallback=None, chunkSize=TRAFFIC_CHUNK_SIZE,
+                segments=1, resume=True, retries=TRAFFIC_RESUME_RETRIES):
         api_path = f"/automation/Traffic/{recordingPort}"
-        response = requests.get(self.url + api_path, verify=False)
-        #Since 200 responses return binary content, not json
-        print(response.text)
-        if response.status_code >= 200 and response.status_code < 300:
-            return (response.status_code, response.content)
-        return (response.status_code, response.json())
+        if resume and isinstance(destination, (str, os.PathLike)):
+            return (200, self.download_traffic(recordingPort, destination, progressCallback, chunkSize, segments, retries))
+        if destination is None:
+            response = self._get("Traffic", api_path)
+            #Since 200 responses return binary content, not json
+            if response.status_code >= 200 and response.status_code < 300:
+                return (response.status_code, response.content)
+            return (response.status_code, self._json(response))
+        with self._get("Traffic", api_path, stream=True) as response:
+            if response.status_code < 200 or response.status_code >= 300:
+                return (response.status_code, self._json(response))
+            try:
+                return (response.status_code, self._writeStream(response, destination, progressCallback, chunkSize))
+            except requests.RequestException as e:
+                raise RecorderError(502, f"Traffic download from {self.url} was interrupted: {e}")
+
+    # Open a streaming Traffic response, optionally from byte `offset` via
+    # an HTTP Range request. The caller checks response.status_code: 206
+    # means the range was honoured, 200 means the server sent everything.
+    # Raises RecorderError for error responses.
+    @contextlib.contextmanager
+    def open_traffic(self, recordingPort, offset=0):
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        response = self._get("Traffic", f"/automation/Traffic/{recordingPort}", stream=True, headers=headers)
+        try:
+            if response.status_code < 200 or response.status_code >= 300:
+                body = self._json(response)
+                raise RecorderError(response.status_code, body.get("message", str(body)) if isinstance(body, dict) else str(body))
+            yield response
+        finally:
+            response.close()
+
+    # Download a recording to path through path.part, tracking progress in
+    # path.part.json. An interrupted attempt, or an earlier call that died
+    # part way, continues from the bytes already on disk with a Range
+    # request; If-Range with the recording's ETag makes the server send the
+    # whole recording instead if it changed meanwhile, and the download
+    # then starts over, as it does when the server ignores Range. With
+    # segments > 1 and a server that supports ranges the recording is split
+    # into that many parts fetched in parallel. The finished file is
+    # checked against the length and SHA-256 the server reported before it
+    # is renamed to path. Returns the number of bytes; raises RecorderError.
+    def download_traffic(self, recordingPort, path, progressCallback=None, chunkSize=TRAFFIC_CHUNK_SIZE, segments=1,
+                         retries=TRAFFIC_RESUME_RETRIES):
+        api_path = f"/automation/Traffic/{recordingPort}"
+        partPath = os.fspath(path) + ".part"
+        statePath = partPath + ".json"
+        state = self._loadPartial(statePath, recordingPort) if os.path.exists(partPath) else None
+        attempt = 0
+        saved = 0
+        while True:
+            try:
+                if state is None:
+                    state = self._startDownload(api_path, recordingPort, partPath, statePath, segments)
+                self._resumeDownload(api_path, state, partPath, statePath, progressCallback, chunkSize)
+                size = self._verifyDownload(state, partPath)
+                break
+            except RangeNotSatisfied:
+                error = None
+            except RecorderError as e:
+                if e.status not in (409, 502, 504):
+                    # Nothing worth resuming, e.g. no recording for the port
+                    if state is None or not any(part["done"] for part in state["parts"]):
+                        self._discardPartial(partPath, statePath)
+                    raise
+                error = e
+            # 409 (failed verification) and changed recordings start over
+            if error is None or error.status == 409:
+                state = None
+                self._discardPartial(partPath, statePath)
+            # Attempts that got further than the last one do not use up retries
+            done = sum(part["done"] for part in state["parts"]) if state else 0
+            if done > saved:
+                saved = done
+                attempt = 0
+            elif attempt >= retries:
+                raise error or RecorderError(502, f"The recording of port {recordingPort} kept changing during the download")
+            else:
+                attempt += 1
+            REGISTRY.inc("recorder_retries_total", server=self.url, endpoint="Traffic")
+            time.sleep(min(TRAFFIC_RESUME_MAX_BACKOFF, TRAFFIC_RESUME_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.5))
+        os.replace(partPath, path)
+        os.remove(statePath)
+        return size
 
-    # TODO
-    def encrypt(self, dastConfigBytes):
+    def _discardPartial(self, partPath, statePath):
+        for leftover in (partPath, statePath):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    def _loadPartial(self, statePath, recordingPort):
+        try:
+            with open(statePath, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("server") != self.url or str(state.get("port")) != str(recordingPort):
+            return None
+        return state
+
+    def _savePartial(self, statePath, state):
+        tmp = statePath + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, statePath)
+
+    # Plan a new download. For a parallel download a one byte Range request
+    # finds the length; otherwise the download is a single part whose
+    # length is learnt from the first response in _fetchPart.
+    def _startDownload(self, api_path, recordingPort, partPath, statePath, segments):
+        state = {"server": self.url, "port": str(recordingPort), "etag": None, "length": None, "checksum": None,
+                 "parts": [{"start": 0, "end": None, "done": 0, "complete": False}]}
+        if segments > 1:
+            with self._get("Traffic", api_path, stream=True, headers={"Range": "bytes=0-0"}) as response:
+                span = parse_content_range(response.headers.get("Content-Range"))
+                if response.status_code == 206 and span and span[2]:
+                    length = span[2]
+                    state["etag"] = response.headers.get("ETag")
+                    state["checksum"] = response_checksum(response.headers)
+                    state["length"] = length
+                    count = max(1, min(segments, length // MIN_SEGMENT_SIZE))
+                    bounds = [length * i // count for i in range(count + 1)]
+                    state["parts"] = [{"start": bounds[i], "end": bounds[i + 1], "done": 0, "complete": False} for i in range(count)]
+                elif response.status_code != 416 and (response.status_code < 200 or response.status_code >= 300):
+                    # 416 is an empty recording, fetched as a single part
+                    body = self._json(response)
+                    raise RecorderError(response.status_code, body.get("message", str(body)) if isinstance(body, dict) else str(body))
+        with open(partPath, "wb") as f:
+            if state["length"]:
+                f.truncate(state["length"])
+        self._savePartial(statePath, state)
+        return state
+
+    def _resumeDownload(self, api_path, state, partPath, statePath, progressCallback, chunkSize):
+        pending = [part for part in state["parts"] if not part["complete"]]
+        lock = threading.Lock()
+
+        def progress():
+            if progressCallback:
+                progressCallback(sum(part["done"] for part in state["parts"]), state["length"])
+
+        fetch = lambda part: self._fetchPart(api_path, state, part, partPath, statePath, lock, progress, chunkSize)
+        if len(pending) == 1:
+            fetch(pending[0])
+        elif pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                for future in [pool.submit(fetch, part) for part in pending]:
+                    future.result()
+
+    # Fetch the rest of one part and write it at its offset in the .part file
+    def _fetchPart(self, api_path, state, part, partPath, statePath, lock, progress, chunkSize):
+        offset = part["start"] + part["done"]
+        headers = {}
+        if offset or part["end"] is not None:
+            headers["Range"] = f"bytes={offset}-" + (str(part["end"] - 1) if part["end"] is not None else "")
+            if state["etag"]:
+                headers["If-Range"] = state["etag"]
+        with self._get("Traffic", api_path, stream=True, headers=headers) as response:
+            if response.status_code == 416:
+                raise RangeNotSatisfied()
+            if response.status_code < 200 or response.status_code >= 300:
+                body = self._json(response)
+                raise RecorderError(response.status_code, body.get("message", str(body)) if isinstance(body, dict) else str(body))
+            if headers.get("Range"):
+                span = parse_content_range(response.headers.get("Content-Range"))
+                if response.status_code != 206 or not span or span[0] != offset:
+                    raise RangeNotSatisfied()
+            else:
+                with lock:
+                    length = response.headers.get("Content-Length")
+                    state["length"] = int(length) if length else None
+                    state["etag"] = response.headers.get("ETag")
+                    state["checksum"] = response_checksum(response.headers)
+                    part["end"] = state["length"]
+                    self._savePartial(statePath, state)
+            received = 0
+            unsaved = 0
+            start = time.perf_counter()
+            try:
+                with open(partPath, "r+b") as f:
+                    f.seek(offset)
+                    try:
+                        for chunk in response.iter_content(chunkSize):
+                            f.write(chunk)
+                            received += len(chunk)
+                            unsaved += len(chunk)
+                            with lock:
+                                part["done"] += len(chunk)
+                                if unsaved >= PARTIAL_SAVE_INTERVAL:
+                                    f.flush()
+                                    self._savePartial(statePath, state)
+                                    unsaved = 0
+                            progress()
+                    except requests.RequestException as e:
+                        raise RecorderError(502, f"Traffic download from {self.url} was interrupted: {e}")
+                    finally:
+                        f.flush()
+                        with lock:
+                            self._savePartial(statePath, state)
+            finally:
+                self._recordTransfer("Traffic", received, time.perf_counter() - start)
+        if part["end"] is not None and part["done"] < part["end"] - part["start"]:
+            raise RecorderError(502, f"Traffic download from {self.url} ended {part['end'] - part['start'] - part['done']} bytes early")
+        with lock:
+            part["complete"] = True
+            self._savePartial(statePath, state)
+
+    # Raises RecorderError(409) when the file does not match what the
+    # server reported. Returns its size.
+    def _verifyDownload(self, state, partPath):
+        size = sum(part["done"] for part in state["parts"])
+        if state["length"] is not None and (size != state["length"] or os.path.getsize(partPath) != size):
+            raise RecorderError(409, f"Downloaded {size} of {state['length']} bytes")
+        if state["checksum"] and file_sha256(partPath) != state["checksum"]:
+            raise RecorderError(409, "The downloaded recording does not match the server's checksum")
+        return size
+
+    def _writeStream(self, response, destination, progressCallback=None, chunkSize=TRAFFIC_CHUNK_SIZE, endpoint="Traffic"):
+        total = response.headers.get("Content-Length")
+        total = int(total) if total else None
+        written = 0
+        start = time.perf_counter()
+        try:
+            with open_destination(destination) as f:
+                for chunk in response.iter_content(chunkSize):
+                    f.write(chunk)
+                    written += len(chunk)
+                    if progressCallback:
+                        progressCallback(written, total)
+        finally:
+            self._recordTransfer(endpoint, written, time.perf_counter() - start)
+        return written
+
+    def _recordTransfer(self, endpoint, received, elapsed):
+        labels = {"server": self.url, "endpoint": endpoint}
+        REGISTRY.inc("recorder_bytes_total", received, direction="received", **labels)
+        REGISTRY.observe("recorder_request_seconds", elapsed, phase="transfer", **labels)
+
+    # Download the traffic of every port in `ports` into `directory` in
+    # parallel, naming files traffic_<port>_<timestamp>.dast.config. Ports
+    # listed in stopPorts are stopped before their traffic is fetched.
+    # Recordings with no traffic are deleted again. Returns
+    # {"requested": n, "saved": [...], "empty": [...], "failed": [...]}
+    def harvest(self, ports, directory, stopPorts=(), maxWorkers=DEFAULT_BATCH_WORKERS, progressCallback=None):
+        ports = [str(port) for port in ports]
+        stopPorts = set(str(port) for port in stopPorts)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        os.makedirs(directory, exist_ok=True)
+
+        def harvestOne(port):
+            stopped = False
+            try:
+                if port in stopPorts:
+                    res = self.stop_proxy(port)
+                    if res[0] < 200 or res[0] >= 300:
+                        return (res[0], {"port": port, "message": res[1].get("message") if isinstance(res[1], dict) else str(res[1])})
+                    stopped = True
+                path = os.path.join(directory, f"traffic_{port}_{timestamp}.dast.config")
+                callback = (lambda written, total: progressCallback(port, written, total)) if progressCallback else None
+                res = self.traffic(port, path, callback)
+            except Exception as e:
+                return (500, {"port": port, "stopped": stopped, "message": str(e)})
+            if res[0] < 200 or res[0] >= 300:
+                message = res[1].get("message") if isinstance(res[1], dict) else str(res[1])
+                return (res[0], {"port": port, "stopped": stopped, "message": message})
+            return (res[0], {"port": port, "stopped": stopped, "path": path, "bytes": res[1]})
+
+        result = {"requested": len(ports), "saved": [], "empty": [], "failed": []}
+        if not ports:
+            return result
+        with ThreadPoolExecutor(max_workers=max(1, min(maxWorkers, len(ports)))) as pool:
+            for status, entry in pool.map(harvestOne, ports):
+                if status < 200 or status >= 300:
+                    result["failed"].append(dict(entry, status=status))
+                elif entry["bytes"] == 0:
+                    os.remove(entry["path"])
+                    result["empty"].append(entry)
+                else:
+                    result["saved"].append(entry)
+        return result
+
+    # Upload a dast.config (path, bytes or binary file) for encryption.
+    # The file is streamed, never read into memory. Returns
+    # (status, {"uuid": ...}); pass the uuid to encrypt_download.
+    @recorder_call
+    def encrypt(self, dastConfig, progressCallback=None):
         api_path = "/automation/EncryptDastConfig"
-        pass
+        body = MultipartFile(dastConfig, progressCallback=progressCallback)
+        response = self._post("EncryptDastConfig", api_path, data=body, headers={"Content-Type": body.contentType})
+        return (response.status_code, self._json(response))
 
-    # TODO
-    def encrypt_download(self, uuid):
+    # Download an encrypted dast.config. Like traffic(), the content is
+    # returned as bytes, or streamed to destination and the number of bytes
+    # written returned. Nothing is written unless the server answers 2xx.
+    @recorder_call
+    def encrypt_download(self, uuid, destination=None, progressCallback=None, chunkSize=TRAFFIC_CHUNK_SIZE):
         api_path = f"/automation/DownloadEncryptedDastConfig/{uuid}"
-        pass
+        if destination is None:
+            response = self._get("DownloadEncryptedDastConfig", api_path)
+            if response.status_code >= 200 and response.status_code < 300:
+                return (response.status_code, response.content)
+            return (response.status_code, self._json(response))
+        with self._get("DownloadEncryptedDastConfig", api_path, stream=True) as response:
+            if response.status_code < 200 or response.status_code >= 300:
+                return (response.status_code, self._json(response))
+            try:
+                return (response.status_code, self._writeStream(response, destination, progressCallback, chunkSize, "DownloadEncryptedDastConfig"))
+            except requests.RequestException as e:
+                raise RecorderError(502, f"Encrypted download from {self.url} was interrupted: {e}")
+
+    # Poll encrypt_download until the server has finished encrypting, with
+    # exponential backoff between polls. The server answers 404 both while
+    # the upload is still being encrypted and for ids it does not know, so
+    # the message decides: an unknown id fails at once, and after
+    # ENCRYPT_MAX_UNCLEAR_POLLS 404s in a row that say neither, the id is
+    # assumed unknown too. Returns the last encrypt_download result, or
+    # (504, ...) once `timeout` seconds have passed.
+    def wait_encrypted(self, uuid, destination=None, timeout=ENCRYPT_TIMEOUT, interval=ENCRYPT_POLL_INTERVAL,
+                       maxInterval=ENCRYPT_MAX_POLL_INTERVAL, progressCallback=None):
+        deadline = time.monotonic() + timeout
+        unclear = 0
+        while True:
+            res = self.encrypt_download(uuid, destination, progressCallback)
+            if res[0] != 404:
+                return res
+            pending = encrypt_pending(res[1])
+            if pending is False:
+                return res
+            unclear = 0 if pending else unclear + 1
+            if unclear >= ENCRYPT_MAX_UNCLEAR_POLLS:
+                return (404, {"message": f"No encryption job {uuid} on {self.url}: {res[1]}"})
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return (504, {"message": f"Encryption of {uuid} did not finish within {timeout}s"})
+            time.sleep(min(interval * random.uniform(0.8, 1.2), remaining))
+            interval = min(interval * 2, maxInterval)
+
+    # Upload, wait for and download one encrypted file. Returns
+    # (status, {"uuid", "path", "bytes"}) or the failing call's result.
+    def encrypt_file(self, source, destination, timeout=ENCRYPT_TIMEOUT, progressCallback=None):
+        res = self.encrypt(source, progressCallback)
+        if res[0] < 200 or res[0] >= 300:
+            return res
+        key = res[1].get("uuid") if isinstance(res[1], dict) else None
+        if not key:
+            return (502, {"message": f"EncryptDastConfig did not return a uuid: {res[1]}"})
+        tmp = os.fspath(destination) + ".part"
+        try:
+            res = self.wait_encrypted(key, tmp, timeout)
+            if res[0] < 200 or res[0] >= 300:
+                return res
+            os.replace(tmp, destination)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return (res[0], {"uuid": key, "path": destination, "bytes": res[1]})
+
+    # Encrypt every file matching `pattern` in `directory` into
+    # outputDirectory (same file names), with at most maxWorkers files in
+    # flight. Server-side encryption time overlaps with other uploads.
+    # progressCallback is called with (source, status, done, total) as
+    # each file finishes. Returns {"requested": n, "encrypted": [...], "failed": [...]}
+    def encrypt_directory(self, directory, outputDirectory, pattern="*.dast.config", maxWorkers=DEFAULT_BATCH_WORKERS,
+                          timeout=ENCRYPT_TIMEOUT, progressCallback=None):
+        if os.path.abspath(directory) == os.path.abspath(outputDirectory):
+            raise ValueError("The output directory must differ from the input directory")
+        sources = sorted(glob.glob(os.path.join(directory, pattern)))
+        os.makedirs(outputDirectory, exist_ok=True)
+        done = [0]
+        done_lock = threading.Lock()
+
+        def encryptOne(source):
+            destination = os.path.join(outputDirectory, os.path.basename(source))
+            try:
+                res = self.encrypt_file(source, destination, timeout)
+            except Exception as e:
+                res = (500, {"message": str(e)})
+            if progressCallback:
+                with done_lock:
+                    done[0] += 1
+                    count = done[0]
+                progressCallback(source, res[0], count, len(sources))
+            return source, res
+
+        result = {"requested": len(sources), "encrypted": [], "failed": []}
+        if not sources:
+            return result
+        with ThreadPoolExecutor(max_workers=max(1, min(maxWorkers, len(sources)))) as pool:
+            for source, (status, body) in pool.map(encryptOne, sources):
+                if status >= 200 and status < 300:
+                    result["encrypted"].append(dict(body, source=source))
+                else:
+                    message = body.get("message") if isinstance(body, dict) else str(body)
+                    result["failed"].append({"source": source, "status": status, "message": message})
+        return result
 
 ## Test Code
 ## tr = TrafficRecorder("https://ec2amaz-44nu39t:8383")
-## print(tr.info())
\ No newline at end of file
+## print(tr.info())
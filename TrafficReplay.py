@@ -0,0 +1,222 @@
+import asyncio
+import itertools
+import time
+import xml.etree.ElementTree as ElementTree
+from urllib.parse import urlsplit, urlunsplit
+
+import aiohttp
+
+from Metrics import REGISTRY, Histogram
+from TrafficIndex import iter_requests
+
+DEFAULT_REPLAY_CONCURRENCY = 32
+DEFAULT_REPLAY_TIMEOUT = 30
+# Requests parsed per trip to the reader thread
+REPLAY_BATCH_SIZE = 256
+REPLAY_CHUNK_SIZE = 64 * 1024
+
+# Headers that belong to the recorded connection, not to the request
+HOP_HEADERS = frozenset([
+    "host", "content-length", "transfer-encoding", "connection", "keep-alive", "proxy-connection",
+    "proxy-authorization", "proxy-authenticate", "te", "trailer", "upgrade",
+])
+# Child elements of a recorded request that may hold its body
+BODY_NAMES = ("body", "requestbody", "content", "postdata")
+
+
+# Local name of an ElementTree tag, without namespace or prefix
+def _tag(name):
+    return name.rsplit("}", 1)[-1].rsplit(":", 1)[-1].lower()
+
+
+# Split recorded header text ("Name: value" per line) into pairs
+def parse_headers(text):
+    headers = []
+    for line in (text or "").splitlines():
+        name, sep, value = line.partition(":")
+        if sep and name.strip():
+            headers.append((name.strip(), value.strip()))
+    return headers
+
+
+# Headers and body of one raw <Request> element. The body is the text of
+# a body element directly under the request, never the response's.
+def parse_request_element(raw):
+    try:
+        element = ElementTree.fromstring(raw)
+    except ElementTree.ParseError:
+        return [], None
+    headers = []
+    body = None
+    for child in element:
+        name = _tag(child.tag)
+        if name == "headers":
+            headers = parse_headers(child.text)
+        elif name in BODY_NAMES and body is None and child.text:
+            body = child.text.encode("utf-8")
+    return headers, body
+
+
+# Stream the requests of a recording as dicts with method, url, headers,
+# body and the recorded response status. match(entry) may skip requests
+# using the fields iter_requests() reports.
+def iter_replay_requests(source, requestTag="Request", match=None):
+    with open(source, "rb") as raw:
+        for entry in iter_requests(source, requestTag):
+            if not entry["url"] or (match is not None and not match(entry)):
+                continue
+            raw.seek(entry["offset"])
+            headers, body = parse_request_element(raw.read(entry["length"]))
+            yield {"method": entry["method"] or "GET", "url": entry["url"], "headers": headers, "body": body, "status": entry["status"]}
+
+
+# The listening proxy of a recorder, so replayed traffic is recorded again
+def recording_proxy_url(recorderUrl, recordingPort):
+    return f"http://{urlsplit(recorderUrl).hostname}:{recordingPort}"
+
+
+# Point a recorded URL at target, keeping its path and query. A path on
+# the target is used as a prefix.
+def retarget(url, target):
+    if not target:
+        return url
+    parts = urlsplit(url)
+    base = urlsplit(target)
+    return urlunsplit((base.scheme, base.netloc, base.path.rstrip("/") + (parts.path or "/"), parts.query, ""))
+
+
+# Spaces requests 1/rate seconds apart across every worker of a replay
+class RateLimiter:
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next = None
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        if self.next is None or self.next < now:
+            self.next = now
+        delay = self.next - now
+        self.next += self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# Replays the requests of a .dast.config recording against a target.
+# The recording is streamed: a reader thread parses it in batches into a
+# bounded queue and `concurrency` workers send the requests over one
+# pooled aiohttp session, optionally capped at `rate` requests per second
+# and routed through a proxy (e.g. a recording port, see
+# recording_proxy_url). Responses are read in full but not kept.
+#
+#   report = TrafficReplay("http://localhost:8080", concurrency=64, rate=500).run("login.dast.config")
+#
+# run()/replay() return {"requests", "completed", "failed", "mismatched",
+# "statuses", "errors", "bytesSent", "bytesReceived", "elapsed",
+# "requestsPerSecond", "latency", "histogram"}; mismatched counts
+# responses whose status differs from the recorded one, latency is a
+# Histogram summary in seconds and histogram lists (upper bound, count)
+# buckets. Timings also go to the metrics registry.
+class TrafficReplay:
+
+    def __init__(self, target=None, concurrency=DEFAULT_REPLAY_CONCURRENCY, rate=None, poolSize=None, proxy=None,
+                 timeout=DEFAULT_REPLAY_TIMEOUT, preserveHost=False, progressCallback=None):
+        self.target = target
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.poolSize = poolSize or self.concurrency
+        self.proxy = proxy
+        self.timeout = timeout
+        self.preserveHost = preserveHost
+        self.progressCallback = progressCallback
+
+    def run(self, source, requestTag="Request", match=None, limit=None):
+        return asyncio.run(self.replay(source, requestTag, match, limit))
+
+    async def replay(self, source, requestTag="Request", match=None, limit=None):
+        requests = iter_replay_requests(source, requestTag, match)
+        if limit is not None:
+            requests = itertools.islice(requests, limit)
+        queue = asyncio.Queue(maxsize=self.concurrency * 4)
+        limiter = RateLimiter(self.rate) if self.rate else None
+        latency = Histogram()
+        report = {"requests": 0, "completed": 0, "failed": 0, "mismatched": 0, "statuses": {}, "errors": {},
+                  "bytesSent": 0, "bytesReceived": 0}
+        # ssl=False matches verify=False on the recorder clients
+        connector = aiohttp.TCPConnector(limit=self.poolSize, ssl=False, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        started = time.perf_counter()
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, auto_decompress=False) as session:
+            workers = [asyncio.create_task(self._worker(session, queue, limiter, latency, report)) for _ in range(self.concurrency)]
+            try:
+                await self._produce(requests, queue)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+        elapsed = time.perf_counter() - started
+        report["elapsed"] = elapsed
+        report["requestsPerSecond"] = report["requests"] / elapsed if elapsed > 0 else 0.0
+        report["latency"] = latency.summary()
+        report["histogram"] = list(zip(list(latency.buckets) + ["+Inf"], latency.counts))
+        return report
+
+    # Parse in a thread so the event loop never waits on the file
+    async def _produce(self, requests, queue):
+        while True:
+            batch = await asyncio.to_thread(lambda: list(itertools.islice(requests, REPLAY_BATCH_SIZE)))
+            if not batch:
+                return
+            for request in batch:
+                await queue.put(request)
+
+    async def _worker(self, session, queue, limiter, latency, report):
+        while True:
+            request = await queue.get()
+            if request is None:
+                return
+            if limiter is not None:
+                await limiter.wait()
+            await self._send(session, request, latency, report)
+
+    def _headers(self, request):
+        return [(name, value) for name, value in request["headers"]
+                if name.lower() not in HOP_HEADERS or (self.preserveHost and name.lower() == "host")]
+
+    async def _send(self, session, request, latency, report):
+        url = retarget(request["url"], self.target)
+        body = request["body"]
+        report["requests"] += 1
+        start = time.perf_counter()
+        try:
+            async with session.request(request["method"], url, headers=self._headers(request), data=body,
+                                       proxy=self.proxy, allow_redirects=False) as response:
+                received = 0
+                async for chunk in response.content.iter_chunked(REPLAY_CHUNK_SIZE):
+                    received += len(chunk)
+                status = response.status
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            error = type(e).__name__ + (f": {e}" if str(e) else "")
+            report["failed"] += 1
+            report["errors"][error] = report["errors"].get(error, 0) + 1
+            REGISTRY.inc("replay_requests_total", status="error")
+        else:
+            elapsed = time.perf_counter() - start
+            report["completed"] += 1
+            report["statuses"][str(status)] = report["statuses"].get(str(status), 0) + 1
+            if request["status"] is not None and status != request["status"]:
+                report["mismatched"] += 1
+            report["bytesReceived"] += received
+            latency.observe(elapsed)
+            REGISTRY.inc("replay_requests_total", status=str(status))
+            REGISTRY.observe("replay_request_seconds", elapsed, method=request["method"])
+        report["bytesSent"] += len(body) if body else 0
+        if self.progressCallback:
+            self.progressCallback(report["requests"], report)
+
+
+def replay_recording(source, target=None, **options):
+    return TrafficReplay(target, **options).run(source)
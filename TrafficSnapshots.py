@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+from TrafficRecorder import RecorderError, TRAFFIC_CHUNK_SIZE
+
+# Snapshots are compared against the previous one in blocks of this size
+BLOCK_SIZE = 64 * 1024
+# How far before the previous end a ranged request starts, to catch
+# rewritten tails such as the closing element of the recording
+TAIL_WINDOW = 4 * BLOCK_SIZE
+MANIFEST = "manifest.json"
+
+
+def block_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+# Full length of the recording a Traffic response is part of, if known
+def recording_length(response):
+    contentRange = response.headers.get("Content-Range", "")
+    total = contentRange.rpartition("/")[2]
+    if response.status_code == 206 and total.isdigit():
+        return int(total)
+    contentLength = response.headers.get("Content-Length", "")
+    if response.status_code == 200 and contentLength.isdigit():
+        return int(contentLength)
+    return None
+
+
+# Incremental checkpoints of a proxy's recording while it keeps listening.
+# Every snapshot stores only the bytes from the first changed block of the
+# previous snapshot onward, plus that offset ("base"). Blocks are compared
+# by hash, so old snapshots never need to be re-read. When the server
+# honours Range requests only the tail is downloaded; otherwise the full
+# recording is streamed and compared but still only the new part is kept.
+# merge() stitches the chain back into a complete recording. A recording
+# shorter than the last snapshot belongs to a proxy restarted on the port:
+# the block hashes are reset and the next snapshot is stored whole, so
+# earlier snapshots can still be merged but nothing is shared with them.
+class SnapshotStore:
+
+    def __init__(self, directory, recorder=None, recordingPort=None):
+        self.directory = directory
+        self.recorder = recorder
+        self.recordingPort = recordingPort
+        os.makedirs(directory, exist_ok=True)
+        self.manifestPath = os.path.join(directory, MANIFEST)
+        self.manifest = self.loadManifest()
+
+    def loadManifest(self):
+        if os.path.exists(self.manifestPath):
+            with open(self.manifestPath, "r") as f:
+                return json.load(f)
+        return {"port": self.recordingPort, "blockSize": BLOCK_SIZE, "blocks": [], "snapshots": []}
+
+    def saveManifest(self):
+        tmp = self.manifestPath + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self.manifestPath)
+
+    @property
+    def snapshots(self):
+        return self.manifest["snapshots"]
+
+    def length(self):
+        return self.snapshots[-1]["length"] if self.snapshots else 0
+
+    # Take a snapshot. Returns the new manifest entry; "delta" is the
+    # number of bytes stored and "transferred" what was downloaded.
+    def snapshot(self):
+        blockSize = self.manifest["blockSize"]
+        previous = self.length()
+        startBlock = max(0, previous - TAIL_WINDOW) // blockSize
+        try:
+            entry = self._download(startBlock)
+        except RecorderError as e:
+            if e.status != 416:
+                raise
+            # The recording ends before the window: a new recording
+            self.manifest["blocks"] = []
+            entry = None
+        if entry is None:
+            # The range did not overlap anything we had; start over from 0
+            entry = self._download(0)
+        self.snapshots.append(entry)
+        self.saveManifest()
+        return entry
+
+    def _download(self, startBlock):
+        blockSize = self.manifest["blockSize"]
+        blocks = self.manifest["blocks"]
+        number = len(self.snapshots) + 1
+        deltaName = f"snapshot_{number:05d}.delta"
+        deltaPath = os.path.join(self.directory, deltaName)
+        with self.recorder.open_traffic(self.recordingPort, startBlock * blockSize) as response:
+            if response.status_code != 206:
+                startBlock = 0
+            total = recording_length(response)
+            if total is not None and total < self.length():
+                # A new recording; nothing before it can be reused
+                blocks = self.manifest["blocks"] = []
+                if startBlock > 0:
+                    return None
+            newBlocks = blocks[:startBlock]
+            base = None
+            transferred = 0
+            index = startBlock
+            pending = bytearray()
+            with open(deltaPath, "wb") as delta:
+                def consume(block):
+                    nonlocal base, index
+                    digest = block_hash(block)
+                    if base is None and (index >= len(blocks) or blocks[index] != digest):
+                        base = index * blockSize
+                    if base is not None:
+                        delta.write(block)
+                    newBlocks.append(digest)
+                    index += 1
+                try:
+                    for chunk in response.iter_content(TRAFFIC_CHUNK_SIZE):
+                        transferred += len(chunk)
+                        pending += chunk
+                        while len(pending) >= blockSize:
+                            consume(bytes(pending[:blockSize]))
+                            del pending[:blockSize]
+                    if pending:
+                        consume(bytes(pending))
+                except requests.RequestException as e:
+                    raise RecorderError(502, f"Snapshot download was interrupted: {e}")
+        length = startBlock * blockSize + transferred
+        if base is None:
+            base = length
+        if response.status_code == 206 and startBlock > 0 and base == startBlock * blockSize and startBlock < len(blocks):
+            # Even the first block of the window changed, so the prefix we
+            # skipped cannot be trusted
+            os.remove(deltaPath)
+            return None
+        self.manifest["blocks"] = newBlocks
+        return {"number": number, "time": time.time(), "base": base, "length": length, "file": deltaName,
+                "delta": length - base, "transferred": transferred}
+
+    # Segments (file, start, end) that make up snapshot `upTo` (default:
+    # the latest)
+    def segments(self, upTo=None):
+        upTo = len(self.snapshots) if upTo is None else upTo
+        segments = []
+        for entry in self.snapshots[:upTo]:
+            kept = []
+            remaining = entry["base"]
+            for path, start, end in segments:
+                if remaining <= 0:
+                    break
+                take = min(end - start, remaining)
+                kept.append((path, start, start + take))
+                remaining -= take
+            kept.append((os.path.join(self.directory, entry["file"]), 0, entry["length"] - entry["base"]))
+            segments = kept
+        return segments
+
+    # Write the full recording as of snapshot `upTo` to destination
+    def merge(self, destination, upTo=None, chunkSize=TRAFFIC_CHUNK_SIZE):
+        written = 0
+        with open(destination, "wb") as out:
+            for path, start, end in self.segments(upTo):
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    remaining = end - start
+                    while remaining > 0:
+                        chunk = f.read(min(chunkSize, remaining))
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        remaining -= len(chunk)
+                        written += len(chunk)
+        return written
+
+
+# Take a snapshot with `store` every `interval` seconds until `count`
+# snapshots were taken, or until interrupted when count is None.
+# callback(entry) runs after each one. Returns the entries taken.
+def snapshot_every(store, interval, count=None, callback=None):
+    taken = []
+    while True:
+        entry = store.snapshot()
+        taken.append(entry)
+        if callback:
+            callback(entry)
+        if count is not None and len(taken) >= count:
+            return taken
+        time.sleep(interval)
@@ -0,0 +1,214 @@
+# Client benchmarks against the mock recorder (or a real one with --url).
+# Measures start/stop throughput, Info latency percentiles, download speed
+# and client memory for the sequential, thread pool and asyncio paths.
+#
+#   py benchmark.py
+#   py benchmark.py --proxies 200 --latency 0.02 --traffic-size 100MB --json
+#   py benchmark.py --startup --startup-budget 2.5
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from MockRecorderServer import MockRecorderServer, parse_size
+from TrafficRecorder import TrafficRecorder
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(name, samples, elapsed, count=None):
+    count = len(samples) if count is None else count
+    return {
+        "name": name,
+        "count": count,
+        "seconds": elapsed,
+        "ops_per_sec": count / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def timed(func, *args):
+    begin = time.perf_counter()
+    res = func(*args)
+    return (time.perf_counter() - begin, res)
+
+
+def bench_info(url, calls, workers):
+    recorder = TrafficRecorder(url)
+    begin = time.perf_counter()
+    samples = [timed(recorder.info)[0] for _ in range(calls)]
+    results = [summarize("info sequential", samples, time.perf_counter() - begin)]
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        samples = [t for t, _ in pool.map(lambda _: timed(recorder.info), range(calls))]
+    results.append(summarize(f"info threads x{workers}", samples, time.perf_counter() - begin))
+    return results
+
+
+def bench_start_stop(url, proxies, basePort, workers):
+    recorder = TrafficRecorder(url)
+    results = []
+    ports = range(basePort, basePort + proxies)
+
+    begin = time.perf_counter()
+    samples = [timed(recorder.start_proxy, port)[0] for port in ports]
+    results.append(summarize("start sequential", samples, time.perf_counter() - begin))
+    begin = time.perf_counter()
+    samples = [timed(recorder.stop_proxy, port)[0] for port in ports]
+    results.append(summarize("stop sequential", samples, time.perf_counter() - begin))
+
+    begin = time.perf_counter()
+    batch = recorder.start_proxies(basePort, basePort + proxies - 1, proxies, maxWorkers=workers)
+    results.append(summarize(f"start_proxies x{workers}", [], time.perf_counter() - begin, len(batch["started"])))
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        samples = [t for t, _ in pool.map(lambda port: timed(recorder.stop_proxy, port), ports)]
+    results.append(summarize(f"stop threads x{workers}", samples, time.perf_counter() - begin))
+
+    try:
+        from AsyncTrafficRecorder import AsyncTrafficRecorder, gather_bounded
+    except ImportError:
+        return results
+
+    async def run():
+        async with AsyncTrafficRecorder(url, workers) as client:
+            async def timedAsync(coro):
+                begin = time.perf_counter()
+                await coro
+                return time.perf_counter() - begin
+            begin = time.perf_counter()
+            samples = await gather_bounded([timedAsync(client.start_proxy(port)) for port in ports], workers)
+            results.append(summarize(f"start asyncio x{workers}", samples, time.perf_counter() - begin))
+            begin = time.perf_counter()
+            samples = await gather_bounded([timedAsync(client.stop_proxy(port)) for port in ports], workers)
+            results.append(summarize(f"stop asyncio x{workers}", samples, time.perf_counter() - begin))
+    asyncio.run(run())
+    return results
+
+
+def bench_download(url, port, repeat):
+    recorder = TrafficRecorder(url)
+    recorder.start_proxy(port)
+    recorder.stop_proxy(port)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "traffic.dast.config")
+        calls = (
+            ("download to memory", lambda: recorder.traffic(port)),
+            ("download streamed", lambda: recorder.traffic(port, path, resume=False)),
+            ("download resumable", lambda: recorder.traffic(port, path)),
+            ("download 4 ranges", lambda: recorder.traffic(port, path, segments=4)),
+        )
+        for name, call in calls:
+            samples = []
+            size = 0
+            for _ in range(repeat):
+                elapsed, res = timed(call)
+                samples.append(elapsed)
+                size = res[1] if isinstance(res[1], int) else len(res[1])
+                del res
+            # Separate pass for memory, tracemalloc slows the download down
+            tracemalloc.start()
+            res = call()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            del res
+            result = summarize(name, samples, sum(samples))
+            result["bytes"] = size
+            result["mb_per_sec"] = size * repeat / (1024 * 1024) / sum(samples) if sum(samples) > 0 else 0.0
+            result["peak_alloc_mb"] = peak / (1024 * 1024)
+            results.append(result)
+    return results
+
+
+# Launch the GUI until its first frame has been shown, `runs` times. The
+# first run is the coldest. Needs the generated UI_Components.py and
+# Resources.rcc from build.py.
+def bench_startup(runs):
+    env = dict(os.environ, APPSCAN_RECORDER_EXIT_AFTER_STARTUP="1")
+    if sys.platform.startswith("linux") and not env.get("DISPLAY") and not env.get("WAYLAND_DISPLAY"):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "MainWindow.py")
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        ret = subprocess.run([sys.executable, script], env=env, capture_output=True, timeout=120)
+        samples.append(time.perf_counter() - start)
+        if ret.returncode != 0:
+            raise RuntimeError(f"MainWindow.py exited with {ret.returncode}:\n{ret.stderr.decode(errors='replace')}")
+    result = summarize("gui startup", samples, sum(samples))
+    result["first_ms"] = samples[0] * 1000
+    return [result]
+
+
+def print_table(results):
+    print(f"{'benchmark':<26}{'count':>7}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'MB/s':>10}{'peak MB':>10}")
+    for r in results:
+        mbps = f"{r['mb_per_sec']:.1f}" if "mb_per_sec" in r else ""
+        peak = f"{r['peak_alloc_mb']:.1f}" if "peak_alloc_mb" in r else ""
+        print(f"{r['name']:<26}{r['count']:>7}{r['ops_per_sec']:>10.1f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{mbps:>10}{peak:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the traffic recorder clients")
+    parser.add_argument("--url", help="Benchmark a running recorder instead of the built-in mock")
+    parser.add_argument("--proxies", type=int, default=50, help="Proxies started/stopped per run")
+    parser.add_argument("--base-port", type=int, default=20000)
+    parser.add_argument("--calls", type=int, default=200, help="Info calls per run")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.005, help="Mock server latency in seconds")
+    parser.add_argument("--traffic-size", type=parse_size, default=20 * 1024 * 1024, help="Mock recording size")
+    parser.add_argument("--repeat", type=int, default=3, help="Downloads per mode")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--startup", action="store_true", help="Only benchmark GUI startup")
+    parser.add_argument("--startup-runs", type=int, default=5)
+    parser.add_argument("--startup-budget", type=float, default=3.0, help="Fail when the first start or median start takes longer, in seconds")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        results = bench_startup(args.startup_runs)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print_table(results)
+        startup = results[0]
+        worst = max(startup["first_ms"], startup["p50_ms"]) / 1000
+        if worst > args.startup_budget:
+            print(f"Startup took {worst:.2f}s, over the {args.startup_budget:.2f}s budget", file=sys.stderr)
+            return 1
+        return 0
+
+    server = None
+    url = args.url
+    if not url:
+        server = MockRecorderServer(latency=args.latency, trafficSize=args.traffic_size).start()
+        url = server.url
+    try:
+        results = bench_info(url, args.calls, args.workers)
+        results += bench_start_stop(url, args.proxies, args.base_port, args.workers)
+        results += bench_download(url, args.base_port + args.proxies, args.repeat)
+    finally:
+        if server:
+            server.stop()
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
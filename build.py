@@ -3,6 +3,10 @@ import subprocess
 import shutil
 import sys
 import json
+import hashlib
+import time
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor
 
 
 VERSION_TEMPLATE = """{
@@ -107,49 +111,120 @@ def installRequirements(requirements_file="requirements.txt"):
 # with extension (not recursive)
 def getFilesWithExtension(dir_path,  extension):
     files = []
-    for file in os.listdir(dir_path):
+    for file in sorted(os.listdir(dir_path)):
         if file.endswith(f".{extension}"):
-            files.append(os.path.join(ui_path, file))
+            files.append(os.path.join(dir_path, file))
     return files
     
 # Function to compile the provided ui_file to py
 # and place it in destination_path
 def compileUiFile(ui_file, destination_file):
-    # uic -g python $ui_file >> destination_file
+    # uic -g python $ui_file > destination_file
     ret = subprocess.run(["uic", "-g", "python", ui_file], capture_output=True)
     if(ret.returncode != 0):
         print(f"\nError Compiling {ui_file}")
         print(ret.stderr.decode("utf-8"))
         return False
-    output = ret.stdout
-    with open(destination_file, "ab") as py_file:
+    # Resources come from Resources.rcc through ResourceLoader, not from
+    # an imported Resources_rc module
+    output = ret.stdout.replace(b"import Resources_rc", b"import ResourceLoader")
+    with open(destination_file, "wb") as py_file:
         py_file.write(output)
         py_file.write(b"\r\n\r\n")
     return True
 
-# Function to compile the provided ui_file to py
-# and place it in destination_path
+# Function to compile the provided resources_file to a binary
+# resource bundle, registered at runtime by ResourceLoader
 def compileResources(resources_file, destination_file):
     if not os.path.exists(destination_file):
         #Create the destination file if it doesnt exist
         with open(destination_file, 'w') as fp:
             pass
 
-    #rcc -g python -o Resources.py {PROJECT_NAME}.rc
-    ret = subprocess.run(["rcc", "-g", "python", "-o", destination_file, resources_file], capture_output=True)
+    #rcc --binary -o Resources.rcc Resources.qrc
+    ret = subprocess.run(["rcc", "--binary", "-o", destination_file, resources_file], capture_output=True)
     stderr = ret.stderr.decode("utf-8")
     if(ret.returncode != 0):
         print(stderr)
         return False
     return True
 
+# Hash of the contents of files, in the given order. Missing files
+# hash as missing, so creating one invalidates the step.
+def hashFiles(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.replace("\\", "/").encode("utf-8") + b"\0")
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(b"<missing>")
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+# The qrc file and every file it references
+def resourceInputs(resources_file):
+    inputs = [resources_file]
+    base = os.path.dirname(os.path.abspath(resources_file))
+    for node in ElementTree.parse(resources_file).getroot().iter("file"):
+        if node.text:
+            inputs.append(os.path.join(base, node.text.strip()))
+    return inputs
+
+def loadBuildCache():
+    try:
+        with open(BUILD_CACHE_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def saveBuildCache():
+    with open(BUILD_CACHE_FILE, "w") as f:
+        json.dump(build_cache, f, indent=2)
+
+# True when a step has to run: a forced build, a missing output or
+# inputs that changed since the step last succeeded
+def isStale(step_name, input_hash, outputs=()):
+    if FORCE:
+        return True
+    if any(not os.path.exists(output) for output in outputs):
+        return True
+    return build_cache.get(step_name) != input_hash
+
+def markBuilt(step_name, input_hash):
+    build_cache[step_name] = input_hash
+    saveBuildCache()
+
+# Log how long each step took
+def timeStep(step_name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    step_timings.append((step_name, elapsed, result))
+    print(f"[{step_name}] {result} in {elapsed:.2f}s")
+    return result
+
+def printStepTimings():
+    print("Step Timings:")
+    for step_name, elapsed, result in step_timings:
+        print(f"  {step_name:<14} {elapsed:8.2f}s  {result}")
+    print(f"  {'total':<14} {sum(t[1] for t in step_timings):8.2f}s")
+
 
 target_env = "windows"
-partial = False
-
-if(len(sys.argv)>1):
-    if(sys.argv[1] == "partial"):
-        partial = True
+partial = "partial" in sys.argv[1:]
+# "full" ignores the build cache and runs every step
+FORCE = "full" in sys.argv[1:]
+BUILD_CACHE_DIR = ".build_cache"
+BUILD_CACHE_FILE = os.path.join(BUILD_CACHE_DIR, "hashes.json")
+# Bump when compileUiFile changes its output so cached pieces are rebuilt
+UI_CACHE_VERSION = "2"
+UI_WORKERS = os.cpu_count() or 4
+os.makedirs(os.path.join(BUILD_CACHE_DIR, "ui"), exist_ok=True)
+build_cache = loadBuildCache()
+step_timings = []
 
 print("Starting build script")
 print("=============================================\n")
@@ -165,6 +240,8 @@ with open("version.json", "r") as version_file:
 print(f"Company Name: {version['company_name']}")
 print(f"Product Name: {version['product_name']}")
 print(f"Version: {version['version']}")
+if FORCE:
+    print("Full Build Requested. Ignoring the build cache")
 print("=============================================\n")
 TEST_BUILD = False
 PROJECT_NAME = version['product_name'].title().replace(" ","")
@@ -176,17 +253,22 @@ destination_file = os.path.join(cwd, "UI_Components.py")
 resource_file = os.path.join(cwd, f"Resources.qrc")
 
 
-print("Installing Requirements via pip:")
-with open("requirements.txt") as f:
-    r = f.read()
-    print(r)
+def requirementsStep():
+    requirements_hash = hashFiles(["requirements.txt"])
+    if not isStale("requirements", requirements_hash):
+        return "up to date"
+    print("Installing Requirements via pip:")
+    with open("requirements.txt") as f:
+        r = f.read()
+        print(r)
+    if not installRequirements():
+        print("Error installing packages from requirements.txt")
+        print("Try installing manually 'py -m pip install -r requirements.txt'")
+        sys.exit(1)
+    markBuilt("requirements", requirements_hash)
+    return "installed"
 
-if installRequirements():
-    print("Packages installed successfully")
-else:
-    print("Error installing packages from requirements.txt")
-    print("Try installing manually 'py -m pip install -r requirements.txt'")
-    sys.exit(1)
+timeStep("requirements", requirementsStep)
 print("=============================================\n")
 
 print("Checking required directories:")
@@ -206,39 +288,61 @@ print("Compiling All UI Files to Single Python File")
 print(f"UI File Dir: {ui_path}")
 print(f"Destination Python File: {destination_file}")
 
-if(os.path.exists(destination_file)):
-    print("Existing Destination File Found")
-    destination_file_bak = destination_file + ".bak"
-    print(f"Making Backup: {destination_file_bak}")
-    try:
-        shutil.copyfile(destination_file, destination_file_bak)
-        print("\tFile Backup Success")
-    except Exception as e:
-        print("Error Making Backup File")
-        print(e)
-        print("Quitting...")
-        sys.exit(1)
-    print("Removing Old Destination File")
-    os.remove(destination_file)
-print("=============================================\n")
-
-print("Compiling UI Files from ./resources/ui/")
-ui_files = getFilesWithExtension(ui_path, "ui")
-#If no ui files, create the blank one
-if len(ui_files) == 0:
-    with open("resources/ui/template.ui", "w") as f:
-        f.write(UI_TEMPPLATE)
-    ui_files = ["resources/ui/template.ui"]
-
-for file in ui_files:
-    print(f"> Compiling {file}...", end="")
-    if(compileUiFile(file, destination_file)):
-        print("Success")
-    else:
-        print("Failure")
-        print("Error compiling UI File. Please fix and rerun.")
-        sys.exit(1)
-
+# Each .ui file is compiled on its own into .build_cache/ui, in parallel,
+# and only when it changed; UI_Components.py is then reassembled from the
+# cached pieces if any of them changed
+def uiStep():
+    ui_files = getFilesWithExtension(ui_path, "ui")
+    #If no ui files, create the blank one
+    if len(ui_files) == 0:
+        with open("resources/ui/template.ui", "w") as f:
+            f.write(UI_TEMPPLATE)
+        ui_files = [os.path.join(ui_path, "template.ui")]
+
+    pieces = {}
+    stale = []
+    for file in ui_files:
+        piece = os.path.join(BUILD_CACHE_DIR, "ui", os.path.basename(file) + ".py")
+        pieces[file] = (piece, hashFiles([file]) + UI_CACHE_VERSION)
+        if isStale(f"ui:{os.path.basename(file)}", pieces[file][1], [piece]):
+            stale.append(file)
+
+    def compileOne(file):
+        print(f"> Compiling {file}...")
+        return file, compileUiFile(file, pieces[file][0])
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=min(UI_WORKERS, len(stale))) as pool:
+            for file, ok in pool.map(compileOne, stale):
+                if not ok:
+                    print("Error compiling UI File. Please fix and rerun.")
+                    sys.exit(1)
+                markBuilt(f"ui:{os.path.basename(file)}", pieces[file][1])
+
+    combined_hash = hashFiles([piece for piece, _ in pieces.values()])
+    if not stale and not isStale("ui", combined_hash, [destination_file]):
+        return "up to date"
+
+    if(os.path.exists(destination_file)):
+        print("Existing Destination File Found")
+        destination_file_bak = destination_file + ".bak"
+        print(f"Making Backup: {destination_file_bak}")
+        try:
+            shutil.copyfile(destination_file, destination_file_bak)
+            print("\tFile Backup Success")
+        except Exception as e:
+            print("Error Making Backup File")
+            print(e)
+            print("Quitting...")
+            sys.exit(1)
+    with open(destination_file, "wb") as py_file:
+        for file in ui_files:
+            with open(pieces[file][0], "rb") as piece_file:
+                py_file.write(piece_file.read())
+    markBuilt("ui", combined_hash)
+    return f"compiled {len(stale)} of {len(ui_files)} files"
+
+timeStep("ui", uiStep)
 print("\nUI Files Compiled")
 print("=============================================\n")
 print("Compiling Resources")
@@ -249,17 +353,26 @@ if not os.path.exists("Resources.qrc"):
     with open("Resources.qrc", "w") as f:
         f.write(RESOURCES_TEMPLATE)
 
-resource_dest = "Resources_rc.py"
-if(compileResources("Resources.qrc", resource_dest)):
+resource_dest = "Resources.rcc"
+
+def resourcesStep():
+    resources_hash = hashFiles(resourceInputs("Resources.qrc"))
+    if not isStale("resources", resources_hash, [resource_dest]):
+        return "up to date"
+    if not compileResources("Resources.qrc", resource_dest):
+        print(f"\nError Compiling {resource_file}")
+        sys.exit(1)
     print(f"> File: Resources.qrc to {resource_dest}")
-else:
-    print(f"\nError Compiling {resource_file}")
+    markBuilt("resources", resources_hash)
+    return "compiled"
 
+timeStep("resources", resourcesStep)
 print("=============================================\n")
 
 if(partial):
     print("Partial Build Requested. Not Compiling Binary")
     print("=============================================\n")
+    printStepTimings()
     sys.exit(0)
 
 print("Compiling Binary")
@@ -275,24 +388,36 @@ if(target_env == "windows"):
     
     cmd = f"py -m nuitka --onefile --standalone" \
             f" --enable-plugin=pyside6 " \
+            f" --include-data-files={resource_dest}={resource_dest} " \
             f"{icon}" \
             f" {show_cmd}" \
             f" -o bin/{OUTPUT_FILE}" \
             " MainWindow.py"
-    
-proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-for c in iter(lambda: proc.stdout.read(1), b''):
-    sys.stdout.write(c.decode("utf-8"))
-    
-for c in iter(lambda: proc.stderr.read(1), b''):
-    sys.stdout.write(c.decode("utf-8"))
 
-proc.communicate()
+def binaryStep():
+    # Everything that ends up in the binary, plus the command itself
+    sources = sorted(file for file in os.listdir(cwd) if file.endswith(".py") and file != "build.py")
+    binary_hash = hashFiles(sources + [resource_dest, "version.json", "requirements.txt", version['ico']]) + hashlib.sha256(cmd.encode("utf-8")).hexdigest()
+    if not isStale("binary", binary_hash, [os.path.join("bin", OUTPUT_FILE)]):
+        return "up to date"
+    proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    for line in iter(proc.stdout.readline, b''):
+        sys.stdout.write(line.decode("utf-8", errors="replace"))
+    proc.communicate()
+    if proc.returncode != 0:
+        return f"failed ({proc.returncode})"
+    markBuilt("binary", binary_hash)
+    return "compiled"
+
+result = timeStep("binary", binaryStep)
 
 print("\n=============================================")
-if(proc.returncode == 0):
+if(not result.startswith("failed")):
     print("Binary Compiled Successfully")
     print(f"./bin/{OUTPUT_FILE}")
 else:
     print("Error Compiling Binary")
 print("=============================================\n")
+printStepTimings()
+if(result.startswith("failed")):
+    sys.exit(1)
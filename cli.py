@@ -0,0 +1,433 @@
+# Headless command line client for the AppScan Traffic Recorder.
+# Imports nothing from Qt so it starts quickly in CI jobs. Every command
+# prints one JSON object to stdout and exits non-zero on failure.
+#
+#   py cli.py --url https://recorder:8383 start 9000 --encrypted
+#   py cli.py --url https://recorder:8383 traffic 9000 -o traffic.dast.config
+import argparse
+import json
+import os
+import sys
+
+URL_ENV = "APPSCAN_RECORDER_URL"
+
+
+def output(result, ok=True, stream=None):
+    stream = stream or sys.stdout
+    stream.write(json.dumps(result, default=str) + "\n")
+    return 0 if ok else 1
+
+
+def response(res, stream=None):
+    status, body = res
+    ok = status >= 200 and status < 300
+    return output({"status": status, "body": body}, ok, stream)
+
+
+# Write binary content to a path, or to stdout for "-". The JSON summary
+# then goes to stderr so it does not mix with the payload.
+def save(res, path, recorder=None):
+    status, body = res
+    ok = status >= 200 and status < 300
+    if not ok:
+        return response(res)
+    if path == "-":
+        sys.stdout.buffer.write(body)
+        sys.stdout.buffer.flush()
+        return output({"status": status, "bytes": len(body)}, True, sys.stderr)
+    with open(path, "wb") as f:
+        f.write(body)
+    return output({"status": status, "bytes": len(body), "path": os.path.abspath(path)})
+
+
+def cmd_info(recorder, args):
+    return response(recorder.info())
+
+
+def cmd_start(recorder, args):
+    if args.count > 1 or args.random:
+        if args.upper is None:
+            return output({"message": "--upper is required with --count or --random"}, False)
+        result = recorder.start_proxies(args.port, args.upper, args.count, args.encrypted, args.random, args.workers)
+        record_started(recorder, args, result["started"])
+        return output(result, len(result["failed"]) == 0)
+    res = recorder.start_proxy(args.port, args.upper, args.encrypted)
+    if res[0] >= 200 and res[0] < 300:
+        record_started(recorder, args, [res[1]])
+    return response(res)
+
+
+def cmd_stop(recorder, args):
+    results = {}
+    ok = True
+    stopped = []
+    for port in args.ports:
+        status, body = recorder.stop_proxy(port)
+        results[port] = {"status": status, "body": body}
+        ok = ok and status >= 200 and status < 300
+        if status >= 200 and status < 300:
+            stopped.append((recorder.url, port))
+    if stopped and not args.no_registry:
+        with open_registry(args) as registry:
+            registry.record_stopped(stopped)
+    return output(results, ok)
+
+
+def cmd_stop_all(recorder, args):
+    res = recorder.stop_all_proxies()
+    if res[0] >= 200 and res[0] < 300 and not args.no_registry:
+        with open_registry(args) as registry:
+            registry.record_stopped([(recorder.url, proxy["port"]) for proxy in registry.proxies(recorder.url)])
+    return response(res)
+
+
+def open_registry(args):
+    from ProxyRegistry import ProxyRegistry, default_registry_path
+    return ProxyRegistry(args.registry or default_registry_path())
+
+
+# (started, stopped) of a proxy from the registry, for archive entries
+def proxy_window(args, server, port):
+    if args.no_registry:
+        return (None, None)
+    with open_registry(args) as registry:
+        return registry.window(server, port)
+
+
+# bodies are StartProxy responses
+def record_started(recorder, args, bodies):
+    if args.no_registry:
+        return
+    proxies = [(recorder.url, body["port"], body.get("encryptTraffic", args.encrypted)) for body in bodies
+               if isinstance(body, dict) and "port" in body]
+    if proxies:
+        with open_registry(args) as registry:
+            registry.record_started(proxies)
+
+
+def cmd_proxies(recorder, args):
+    with open_registry(args) as registry:
+        if args.action == "prune":
+            return output({"removed": registry.prune(args.before)})
+        return output({"proxies": registry.proxies(args.server, args.status)})
+
+
+# Compare the registry with the proxies the server lists as listening
+def cmd_reconcile(recorder, args):
+    from TrafficRecorder import parse_active_ports
+    status, body = recorder.info()
+    if status != 200:
+        return response((status, body))
+    active = parse_active_ports(body)
+    if active is None:
+        return output({"message": "The server's Info response does not list its proxies"}, False)
+    with open_registry(args) as registry:
+        changes = registry.reconcile({recorder.url: active})
+        changes["listening_now"] = [proxy["port"] for proxy in registry.proxies(recorder.url, "Listening")]
+    return output(changes)
+
+
+def cmd_traffic(recorder, args):
+    if args.output == "-":
+        # Stream to the pipe; the JSON summary goes to stderr
+        status, body = recorder.traffic(args.port, sys.stdout.buffer, resume=False)
+        sys.stdout.buffer.flush()
+        if status < 200 or status >= 300:
+            return response((status, body), sys.stderr)
+        return output({"status": status, "bytes": body}, True, sys.stderr)
+    status, body = recorder.traffic(args.port, args.output, segments=args.segments, resume=not args.no_resume)
+    if status < 200 or status >= 300:
+        return response((status, body))
+    result = {"status": status, "bytes": body, "path": os.path.abspath(args.output)}
+    if args.archive and body > 0:
+        with open_archive(args) as archive:
+            started, stopped = proxy_window(args, recorder.url, args.port)
+            result["archived"] = archive.add(args.output, server=recorder.url, port=args.port, started=started, ended=stopped)["id"]
+    return output(result)
+
+
+def cmd_harvest(recorder, args):
+    result = recorder.harvest(args.ports, args.directory, args.ports if args.stop else (), args.workers)
+    if args.archive:
+        with open_archive(args) as archive:
+            for entry in result["saved"]:
+                started, stopped = proxy_window(args, recorder.url, entry["port"])
+                entry["archived"] = archive.add(entry["path"], server=recorder.url, port=entry["port"], started=started, ended=stopped)["id"]
+    return output(result, len(result["failed"]) == 0)
+
+
+def cmd_cert(recorder, args):
+    if args.no_cache:
+        return save(recorder.certificate(), args.output)
+    with open_archive(args) as archive:
+        return save(archive.certificate(recorder.url, recorder.certificate), args.output)
+
+
+def open_archive(args):
+    from RecordingArchive import RecordingArchive
+    return RecordingArchive(args.archive_dir)
+
+
+def cmd_archive(recorder, args):
+    with open_archive(args) as archive:
+        if args.action == "list":
+            return output({"entries": archive.find(args.kind, args.server, args.port, args.since, args.until, limit=args.limit)})
+        if args.action == "add":
+            return output(archive.add(args.file, server=args.server, port=args.port))
+        if args.action == "get":
+            if archive.entry(args.id) is None:
+                return output({"message": f"No archive entry {args.id}"}, False)
+            return output({"bytes": archive.extract(args.id, args.output), "path": os.path.abspath(args.output)})
+        if args.action == "evict":
+            removed = archive.evict(args.max_size, args.max_age)
+            return output({"removed": removed, "usage": archive.usage()})
+        return output(archive.usage())
+
+
+def cmd_encrypt(recorder, args):
+    if not args.output:
+        return response(recorder.encrypt(args.file))
+    res = recorder.encrypt_file(args.file, args.output, args.timeout)
+    return response(res)
+
+
+def cmd_encrypt_dir(recorder, args):
+    result = recorder.encrypt_directory(args.directory, args.output, args.pattern, args.workers, args.timeout)
+    return output(result, len(result["failed"]) == 0)
+
+
+def cmd_inspect(recorder, args):
+    from TrafficIndex import TrafficIndex
+    with TrafficIndex(args.file, requestTag=args.tag) as index:
+        index.build(args.rebuild)
+        if args.show is not None:
+            sys.stdout.buffer.write(index.read(args.show) + b"\n")
+            return 0
+        if args.summary:
+            return output(index.summary())
+        filters = {"host": args.host, "method": args.method, "status": args.status, "path": args.path}
+        rows = index.query(limit=args.limit, offset=args.page * args.limit, **filters)
+        return output({"total": index.count(**filters), "page": args.page, "requests": rows})
+
+
+def cmd_snapshot(recorder, args):
+    from TrafficSnapshots import SnapshotStore, snapshot_every
+    store = SnapshotStore(args.directory, recorder, args.port)
+    if args.every is None:
+        taken = [store.snapshot()]
+    else:
+        # Without --count this runs until interrupted, so report each
+        # snapshot as it lands
+        taken = snapshot_every(store, args.every, args.count or None, None if args.count else output)
+    return output({"directory": os.path.abspath(args.directory), "length": store.length(), "snapshots": taken})
+
+
+def cmd_merge_snapshots(recorder, args):
+    from TrafficSnapshots import SnapshotStore
+    store = SnapshotStore(args.directory)
+    if not store.snapshots:
+        return output({"message": f"No snapshots in {args.directory}"}, False)
+    written = store.merge(args.output, args.upto)
+    return output({"bytes": written, "path": os.path.abspath(args.output), "snapshots": args.upto or len(store.snapshots)})
+
+
+def cmd_merge(recorder, args):
+    from TrafficMerge import merge_recordings
+    stats = merge_recordings(args.files, args.output, args.drop_static, requestTag=args.tag)
+    stats["path"] = os.path.abspath(args.output)
+    return output(stats)
+
+
+# Replay a recording against --target, optionally through a recording
+# proxy (--proxy-port on the --url recorder, or any --proxy URL)
+def cmd_replay(recorder, args):
+    from TrafficReplay import TrafficReplay, recording_proxy_url
+    proxy = args.proxy
+    if args.proxy_port is not None:
+        if not args.url:
+            return output({"message": f"--proxy-port needs the recorder URL; use --url or set {URL_ENV}"}, False)
+        proxy = recording_proxy_url(args.url, args.proxy_port)
+    match = None
+    if args.host or args.method or args.path:
+        match = lambda entry: ((not args.host or entry["host"] == args.host)
+                               and (not args.method or entry["method"] == args.method.upper())
+                               and (not args.path or (entry["path"] or "").startswith(args.path)))
+    replay = TrafficReplay(args.target, args.concurrency, args.rate, args.pool_size, proxy, args.timeout, args.preserve_host)
+    report = replay.run(args.file, args.tag, match, args.limit)
+    return output(report, report["failed"] == 0)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Headless AppScan Traffic Recorder client")
+    parser.add_argument("--url", default=os.environ.get(URL_ENV), help=f"Recorder server URL (default: ${URL_ENV})")
+    parser.add_argument("--pool-size", type=int, default=None, help="Keep-alive connections to the server")
+    parser.add_argument("--metrics", metavar="FILE", help="Write call timings to FILE on exit (.json for JSON, otherwise Prometheus text)")
+    parser.add_argument("--archive-dir", default=None, help="Recording archive directory (default: $APPSCAN_RECORDER_ARCHIVE or ~/.cache/TrafficRecorder/archive)")
+    parser.add_argument("--registry", default=None, help="Proxy registry database (default: $APPSCAN_RECORDER_REGISTRY or ~/.cache/TrafficRecorder/proxies.db)")
+    parser.add_argument("--no-registry", action="store_true", help="Do not record started and stopped proxies")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("info", help="Show server info")
+    p.set_defaults(func=cmd_info)
+
+    p = sub.add_parser("start", help="Start one proxy, or a batch with --count/--random")
+    p.add_argument("port", help="Port, or lower bound of the range")
+    p.add_argument("--upper", help="Upper bound of the port range")
+    p.add_argument("--count", type=int, default=1, help="Number of proxies to start in the range")
+    p.add_argument("--random", action="store_true", help="Let the server pick ports in the range")
+    p.add_argument("--encrypted", action="store_true", help="Encrypt the recorded traffic")
+    p.add_argument("--workers", type=int, default=8, help="Concurrent start requests")
+    p.set_defaults(func=cmd_start)
+
+    p = sub.add_parser("stop", help="Stop proxies")
+    p.add_argument("ports", nargs="+")
+    p.set_defaults(func=cmd_stop)
+
+    p = sub.add_parser("stop-all", help="Stop every proxy on the server")
+    p.set_defaults(func=cmd_stop_all)
+
+    p = sub.add_parser("reconcile", help="Update the proxy registry from the proxies the server lists")
+    p.set_defaults(func=cmd_reconcile)
+
+    p = sub.add_parser("proxies", help="Show or prune the proxies recorded in the registry")
+    actions = p.add_subparsers(dest="action", required=True)
+    a = actions.add_parser("list", help="List recorded proxies in the order they were started")
+    a.add_argument("--server")
+    a.add_argument("--status", choices=["Listening", "Stopped"])
+    a = actions.add_parser("prune", help="Forget stopped proxies")
+    a.add_argument("--before", type=float, help="Only those stopped before this Unix time")
+    p.set_defaults(func=cmd_proxies, offline=True)
+
+    p = sub.add_parser("traffic", help="Download a proxy's traffic")
+    p.add_argument("port")
+    p.add_argument("-o", "--output", required=True, help="Destination file, or - for stdout")
+    p.add_argument("--archive", action="store_true", help="Also keep a compressed copy in the archive")
+    p.add_argument("--segments", type=int, default=1, help="Download this many ranges in parallel")
+    p.add_argument("--no-resume", action="store_true", help="Stream straight to the file without a resumable .part file")
+    p.set_defaults(func=cmd_traffic)
+
+    p = sub.add_parser("harvest", help="Download traffic of several proxies into a directory")
+    p.add_argument("directory")
+    p.add_argument("ports", nargs="+")
+    p.add_argument("--stop", action="store_true", help="Stop each proxy before downloading")
+    p.add_argument("--workers", type=int, default=8, help="Concurrent downloads")
+    p.add_argument("--archive", action="store_true", help="Also keep compressed copies in the archive")
+    p.set_defaults(func=cmd_harvest)
+
+    p = sub.add_parser("cert", help="Download the recorder root certificate")
+    p.add_argument("-o", "--output", required=True, help="Destination file, or - for stdout")
+    p.add_argument("--no-cache", action="store_true", help="Always fetch from the server instead of the archive")
+    p.set_defaults(func=cmd_cert)
+
+    p = sub.add_parser("encrypt", help="Encrypt a .dast.config file")
+    p.add_argument("file")
+    p.add_argument("-o", "--output", help="Wait for the encrypted file and save it here")
+    p.add_argument("--timeout", type=float, default=600, help="Seconds to wait for the server to encrypt")
+    p.set_defaults(func=cmd_encrypt)
+
+    p = sub.add_parser("encrypt-dir", help="Encrypt every recording in a directory")
+    p.add_argument("directory")
+    p.add_argument("-o", "--output", required=True, help="Directory for the encrypted files")
+    p.add_argument("--pattern", default="*.dast.config")
+    p.add_argument("--workers", type=int, default=8, help="Files encrypted concurrently")
+    p.add_argument("--timeout", type=float, default=600, help="Seconds to wait for each file")
+    p.set_defaults(func=cmd_encrypt_dir)
+
+    p = sub.add_parser("snapshot", help="Save what is new in a listening proxy's traffic since the last snapshot")
+    p.add_argument("port")
+    p.add_argument("directory", help="Snapshot directory of this proxy")
+    p.add_argument("--every", type=float, metavar="SECONDS", help="Keep taking snapshots at this interval")
+    p.add_argument("--count", type=int, help="Stop after this many snapshots when using --every")
+    p.set_defaults(func=cmd_snapshot)
+
+    p = sub.add_parser("merge-snapshots", help="Rebuild a full recording from a snapshot directory")
+    p.add_argument("directory")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--upto", type=int, metavar="N", help="Rebuild the recording as of snapshot N")
+    p.set_defaults(func=cmd_merge_snapshots, offline=True)
+
+    p = sub.add_parser("merge", help="Merge recordings into one, dropping duplicate requests")
+    p.add_argument("files", nargs="+")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--drop-static", action="store_true", help="Leave out requests for static assets")
+    p.add_argument("--tag", default="Request", help="Element name of a recorded request")
+    p.set_defaults(func=cmd_merge, offline=True)
+
+    p = sub.add_parser("archive", help="Browse and maintain the local recording archive")
+    actions = p.add_subparsers(dest="action", required=True)
+    a = actions.add_parser("list", help="List archived entries, newest first")
+    a.add_argument("--kind", choices=["recording", "certificate"])
+    a.add_argument("--server")
+    a.add_argument("--port", type=int)
+    a.add_argument("--since", type=float, help="Unix time")
+    a.add_argument("--until", type=float, help="Unix time")
+    a.add_argument("--limit", type=int, default=50)
+    a = actions.add_parser("add", help="Archive a recording file")
+    a.add_argument("file")
+    a.add_argument("--server")
+    a.add_argument("--port", type=int)
+    a = actions.add_parser("get", help="Extract an archived entry")
+    a.add_argument("id", type=int)
+    a.add_argument("-o", "--output", required=True)
+    a = actions.add_parser("evict", help="Drop old and least recently used entries")
+    a.add_argument("--max-size", type=int, metavar="BYTES", help="Keep at most this much on disk")
+    a.add_argument("--max-age", type=float, metavar="SECONDS")
+    actions.add_parser("usage", help="Disk used by the archive")
+    p.set_defaults(func=cmd_archive, offline=True)
+
+    p = sub.add_parser("replay", help="Replay the requests of a recording against a target")
+    p.add_argument("file")
+    p.add_argument("--target", help="Base URL to send requests to instead of their recorded host")
+    p.add_argument("--concurrency", type=int, default=32, help="Requests in flight")
+    p.add_argument("--rate", type=float, help="At most this many requests per second")
+    p.add_argument("--proxy-port", type=int, help="Route through this recording port of the --url recorder")
+    p.add_argument("--proxy", help="Route through this proxy URL")
+    p.add_argument("--timeout", type=float, default=30, help="Seconds per request")
+    p.add_argument("--preserve-host", action="store_true", help="Send the recorded Host header")
+    p.add_argument("--limit", type=int, help="Replay at most this many requests")
+    p.add_argument("--host", help="Only requests to this host")
+    p.add_argument("--method", help="Only requests with this method")
+    p.add_argument("--path", help="Only requests whose path starts with this")
+    p.add_argument("--tag", default="Request", help="Element name of a recorded request")
+    p.set_defaults(func=cmd_replay, offline=True)
+
+    p = sub.add_parser("inspect", help="Index a .dast.config recording and list its requests")
+    p.add_argument("file")
+    p.add_argument("--host")
+    p.add_argument("--method")
+    p.add_argument("--status", type=int)
+    p.add_argument("--path", help="Path prefix")
+    p.add_argument("--limit", type=int, default=50, help="Requests per page")
+    p.add_argument("--page", type=int, default=0)
+    p.add_argument("--summary", action="store_true", help="Counts by host, method and status")
+    p.add_argument("--show", type=int, metavar="ID", help="Print the raw recorded request with this id")
+    p.add_argument("--tag", default="Request", help="Element name of a recorded request")
+    p.add_argument("--rebuild", action="store_true", help="Rebuild the index even if it is current")
+    p.set_defaults(func=cmd_inspect, offline=True)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "offline", False):
+        try:
+            return args.func(None, args)
+        except Exception as e:
+            return output({"message": str(e)}, False)
+    if not args.url:
+        return output({"message": f"No server URL given; use --url or set {URL_ENV}"}, False)
+    # Imported here so --help does not pay for requests
+    from TrafficRecorder import TrafficRecorder, DEFAULT_POOL_SIZE
+    recorder = TrafficRecorder(args.url.rstrip("/"), args.pool_size or DEFAULT_POOL_SIZE)
+    try:
+        return args.func(recorder, args)
+    except Exception as e:
+        return output({"message": str(e)}, False)
+    finally:
+        if args.metrics:
+            from Metrics import REGISTRY
+            REGISTRY.export(args.metrics)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, next to MainWindow.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MockRecorderServer import MockRecorderServer  # noqa: E402
+import RequestPolicy  # noqa: E402
+
+
+# Circuit breakers are shared per server url; every test starts closed
+@pytest.fixture(autouse=True)
+def reset_breakers():
+    RequestPolicy._breakers.clear()
+    yield
+    RequestPolicy._breakers.clear()
+
+
+# An in-process mock recorder; options go to MockRecorderServer
+@pytest.fixture
+def mock_server(request):
+    options = getattr(request, "param", {})
+    with MockRecorderServer(**options) as server:
+        yield server
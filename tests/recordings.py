@@ -0,0 +1,17 @@
+# Small hand-written .dast.config recordings for the parser tests
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<TrafficRecording>\n'
+FOOTER = '</TrafficRecording>\n'
+
+
+def request(method, url, status=200, body="ok", time="0", date="Mon, 01 Jan 2024 00:00:00 GMT"):
+    host = url.split("/")[2]
+    return (f'  <Request method="{method}" url="{url}" time="{time}">\n'
+            f'    <Headers>Host: {host}&#10;Date: {date}</Headers>\n'
+            f'    <Response status="{status}"><Body>{body}</Body></Response>\n'
+            f'  </Request>\n')
+
+
+def write_recording(path, requests):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HEADER + "".join(requests) + FOOTER)
+    return str(path)
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from AsyncTrafficRecorder import AsyncTrafficRecorder, gather_bounded
+from RequestPolicy import DEFAULT_POLICIES
+from TrafficRecorder import TrafficRecorder
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_calls_match_the_blocking_client(mock_server, tmp_path):
+    async def session():
+        async with AsyncTrafficRecorder(mock_server.url) as recorder:
+            assert (await recorder.info())[0] == 200
+            assert (await recorder.start_proxy(9200))[1]["port"] == 9200
+            assert (await recorder.start_proxy(9200))[0] == 400
+            assert (await recorder.stop_proxy(9200))[0] == 200
+            return await recorder.traffic(9200, str(tmp_path / "async.dast.config"))
+    status, written = run(session())
+    expected = TrafficRecorder(mock_server.url).traffic(9200)[1]
+    assert status == 200 and written == len(expected)
+    assert (tmp_path / "async.dast.config").read_bytes() == expected
+
+
+def test_gathered_calls_share_a_bounded_pool(mock_server):
+    async def startAll():
+        async with AsyncTrafficRecorder(mock_server.url, poolSize=4) as recorder:
+            return await gather_bounded([recorder.start_proxy(9300 + i) for i in range(40)], limit=8)
+    results = run(startAll())
+    assert [body["port"] for status, body in results] == list(range(9300, 9340))
+    assert mock_server.state.calls["StartProxy"] == 40
+
+
+def test_refused_connection_is_a_502():
+    async def info():
+        async with AsyncTrafficRecorder("http://127.0.0.1:1") as recorder:
+            return await recorder.info()
+    status, body = run(info())
+    assert status == 502 and "Could not connect" in body["message"]
+
+
+@pytest.mark.parametrize("mock_server", [{"latency": 0.5}], indirect=True)
+def test_read_timeout_is_a_504(mock_server):
+    async def info():
+        policies = {"Info": DEFAULT_POLICIES["Info"].copy(readTimeout=0.1)}
+        async with AsyncTrafficRecorder(mock_server.url, policies=policies) as recorder:
+            return await recorder.info()
+    status, body = run(info())
+    assert status == 504 and "Timed out" in body["message"]
+
+
+def test_other_client_errors_are_a_500():
+    async def info():
+        async with AsyncTrafficRecorder("not-a-url") as recorder:
+            return await recorder.info()
+    assert run(info())[0] == 500
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+import cli
+from TrafficRecorder import TrafficRecorder
+
+
+@pytest.fixture
+def run(mock_server, tmp_path, capsys):
+    def run(*argv):
+        code = cli.main(["--url", mock_server.url, "--registry", str(tmp_path / "proxies.db")] + list(argv))
+        captured = capsys.readouterr()
+        return code, json.loads(captured.out)
+    return run
+
+
+def test_start_stop_and_registry(run, mock_server):
+    code, result = run("start", "9000", "--upper", "9010", "--count", "3")
+    assert code == 0 and len(result["started"]) == 3
+    code, result = run("stop", "9000")
+    assert code == 0 and result["9000"]["status"] == 200
+    code, result = run("proxies", "list")
+    statuses = {proxy["port"]: proxy["status"] for proxy in result["proxies"]}
+    assert statuses == {"9000": "Stopped", "9001": "Listening", "9002": "Listening"}
+    code, result = run("stop", "9000")
+    assert code == 1 and result["9000"]["status"] == 404
+
+
+def test_start_batch_needs_an_upper_bound(run):
+    code, result = run("start", "9000", "--count", "2")
+    assert code == 1 and "--upper" in result["message"]
+
+
+def test_traffic_to_a_file(run, mock_server, tmp_path):
+    assert run("start", "9000")[0] == 0
+    path = tmp_path / "out.dast.config"
+    code, result = run("traffic", "9000", "-o", str(path), "--segments", "2")
+    assert code == 0 and result["bytes"] == path.stat().st_size
+    assert path.read_bytes() == TrafficRecorder(mock_server.url).traffic(9000)[1]
+
+
+# The recording goes to stdout and the JSON summary to stderr
+def test_traffic_to_stdout(mock_server, tmp_path, capsysbinary):
+    assert TrafficRecorder(mock_server.url).start_proxy(9000)[0] == 200
+    code = cli.main(["--url", mock_server.url, "--no-registry", "traffic", "9000", "-o", "-"])
+    captured = capsysbinary.readouterr()
+    assert code == 0 and captured.out == TrafficRecorder(mock_server.url).traffic(9000)[1]
+    assert json.loads(captured.err)["bytes"] == len(captured.out)
+
+
+def test_harvest_stops_and_archives(run, mock_server, tmp_path):
+    assert run("start", "9000", "--upper", "9001", "--count", "2")[0] == 0
+    code, result = run("--archive-dir", str(tmp_path / "archive"), "harvest", str(tmp_path / "out"), "9000", "9001",
+                       "--stop", "--archive")
+    assert code == 0 and sorted(entry["port"] for entry in result["saved"]) == ["9000", "9001"]
+    assert all(proxy.stopped is not None for proxy in mock_server.state.proxies.values())
+    code, listed = run("--archive-dir", str(tmp_path / "archive"), "archive", "list", "--port", "9000")
+    assert [entry["id"] for entry in listed["entries"]] == [entry["archived"] for entry in result["saved"] if entry["port"] == "9000"]
+    assert listed["entries"][0]["started"] is not None
+
+
+def test_missing_url_fails(capsys, monkeypatch):
+    monkeypatch.delenv(cli.URL_ENV, raising=False)
+    assert cli.main(["info"]) == 1
+    assert "No server URL" in json.loads(capsys.readouterr().out)["message"]
@@ -0,0 +1,59 @@
+import pytest
+
+from TrafficRecorder import TrafficRecorder
+
+
+@pytest.mark.parametrize("mock_server", [{"encryptDelay": 0.1}], indirect=True)
+def test_encrypt_file_accepts_path_objects(mock_server, tmp_path):
+    source = tmp_path / "in.dast.config"
+    source.write_bytes(b"<Traffic/>")
+    destination = tmp_path / "out.dast.config"
+    status, body = TrafficRecorder(mock_server.url).encrypt_file(source, destination, timeout=10)
+    assert status == 200 and body["path"] == destination
+    encrypted = destination.read_bytes()
+    assert encrypted.startswith(b"MOCK-ENCRYPTED\n") and b"<Traffic/>" in encrypted
+    assert not (tmp_path / "out.dast.config.part").exists()
+
+
+@pytest.mark.parametrize("mock_server", [{"encryptDelay": 0.3}], indirect=True)
+def test_wait_encrypted_polls_until_ready(mock_server):
+    recorder = TrafficRecorder(mock_server.url)
+    key = recorder.encrypt(b"<Traffic/>")[1]["uuid"]
+    status, body = recorder.wait_encrypted(key, interval=0.05)
+    assert status == 200 and body.startswith(b"MOCK-ENCRYPTED\n")
+    assert mock_server.state.calls["DownloadEncryptedDastConfig"] > 1
+
+
+def test_wait_encrypted_gives_up_on_an_unknown_id(mock_server):
+    status, body = TrafficRecorder(mock_server.url).wait_encrypted("no-such-id", interval=0.01)
+    assert status == 404
+    assert mock_server.state.calls["DownloadEncryptedDastConfig"] == 1
+
+
+@pytest.mark.parametrize("mock_server", [{"encryptDelay": 60}], indirect=True)
+def test_wait_encrypted_times_out(mock_server, tmp_path):
+    recorder = TrafficRecorder(mock_server.url)
+    destination = tmp_path / "out.dast.config"
+    source = tmp_path / "in.dast.config"
+    source.write_bytes(b"<Traffic/>")
+    status, body = recorder.encrypt_file(source, destination, timeout=0.3)
+    assert status == 504 and "did not finish" in body["message"]
+    assert list(tmp_path.iterdir()) == [source]
+
+
+@pytest.mark.parametrize("mock_server", [{"encryptDelay": 0.1}], indirect=True)
+def test_encrypt_directory(mock_server, tmp_path):
+    source = tmp_path / "in"
+    source.mkdir()
+    for name in ("a", "b", "c"):
+        (source / f"{name}.dast.config").write_bytes(f"<Traffic name='{name}'/>".encode())
+    (source / "notes.txt").write_text("not a recording")
+    progress = []
+    result = TrafficRecorder(mock_server.url).encrypt_directory(
+        str(source), str(tmp_path / "out"), timeout=10, progressCallback=lambda *args: progress.append(args))
+    assert result["requested"] == 3 and result["failed"] == []
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == ["a.dast.config", "b.dast.config", "c.dast.config"]
+    assert b"<Traffic name='b'/>" in (tmp_path / "out" / "b.dast.config").read_bytes()
+    assert sorted(done for source, status, done, total in progress) == [1, 2, 3]
+    with pytest.raises(ValueError):
+        TrafficRecorder(mock_server.url).encrypt_directory(str(source), str(source))
@@ -0,0 +1,32 @@
+import os
+
+from TrafficRecorder import TrafficRecorder
+
+
+def test_harvest_saves_stops_and_reports(mock_server, tmp_path):
+    recorder = TrafficRecorder(mock_server.url)
+    for port in (9000, 9001):
+        assert recorder.start_proxy(port)[0] == 200
+    progress = {}
+    result = recorder.harvest([9000, 9001, 9002], str(tmp_path), stopPorts=[9000],
+                              progressCallback=lambda port, written, total: progress.__setitem__(port, (written, total)))
+
+    assert result["requested"] == 3 and result["empty"] == []
+    saved = {entry["port"]: entry for entry in result["saved"]}
+    assert sorted(saved) == ["9000", "9001"]
+    assert saved["9000"]["stopped"] and not saved["9001"]["stopped"]
+    assert mock_server.state.proxies[9000].stopped is not None
+    assert mock_server.state.proxies[9001].stopped is None
+    for port, entry in saved.items():
+        assert os.path.basename(entry["path"]).startswith(f"traffic_{port}_")
+        assert os.path.getsize(entry["path"]) == entry["bytes"] == progress[port][0]
+    assert open(saved["9000"]["path"], "rb").read() == recorder.traffic(9000)[1]
+    assert [(entry["port"], entry["status"]) for entry in result["failed"]] == [("9002", 404)]
+
+
+# A port that cannot be stopped is not downloaded
+def test_harvest_skips_ports_it_could_not_stop(mock_server, tmp_path):
+    recorder = TrafficRecorder(mock_server.url)
+    result = recorder.harvest([9005], str(tmp_path), stopPorts=[9005])
+    assert [(entry["port"], entry["status"]) for entry in result["failed"]] == [("9005", 404)]
+    assert os.listdir(tmp_path) == []
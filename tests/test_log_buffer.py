@@ -0,0 +1,34 @@
+from LogBuffer import LogBuffer, LogLevel
+
+
+def test_buffer_keeps_only_the_newest_entries():
+    buffer = LogBuffer(capacity=3)
+    for i in range(300):
+        buffer.add(f"message {i}")
+    assert [entry.msg for entry in buffer.snapshot()] == ["message 297", "message 298", "message 299"]
+    assert len(buffer.drain()) == 3
+    assert buffer.drain() == []
+
+
+def test_drain_returns_each_entry_once():
+    buffer = LogBuffer()
+    buffer.add("first")
+    assert [entry.msg for entry in buffer.drain()] == ["first"]
+    buffer.add("second")
+    assert [entry.msg for entry in buffer.drain()] == ["second"]
+    assert len(buffer.snapshot()) == 2
+
+
+def test_snapshot_filters_by_level():
+    buffer = LogBuffer()
+    buffer.add("info")
+    buffer.add("error", LogLevel.ERROR)
+    buffer.add("debug", LogLevel.DEBUG)
+    assert [entry.msg for entry in buffer.snapshot({LogLevel.INFO, LogLevel.ERROR})] == ["info", "error"]
+
+
+def test_payloads_are_summarized_and_truncated():
+    buffer = LogBuffer(maxMessageLength=10)
+    assert buffer.add("") is None and buffer.add(None) is None
+    assert buffer.add(b"\x00" * 2048).msg == "<2048 bytes>"
+    assert buffer.add("x" * 25).msg == "x" * 10 + "... (15 more characters)"
@@ -0,0 +1,46 @@
+from ProxyRegistry import LISTENING, STOPPED, ProxyRegistry
+
+SERVER = "http://recorder01:8383"
+OTHER = "http://recorder02:8383"
+
+
+def statuses(registry):
+    return {(row["server"], row["port"]): row["status"] for row in registry.proxies()}
+
+
+def test_reconcile_applies_what_the_servers_report(tmp_path):
+    with ProxyRegistry(str(tmp_path / "proxies.db")) as registry:
+        registry.record_started([(SERVER, 9001, False), (SERVER, 9002, True), (OTHER, 9100, False)])
+        registry.record_stopped([(SERVER, 9003)])
+        registry.record_started([(SERVER, 9003, False)])
+        registry.record_stopped([(SERVER, 9003)])
+
+        # 9001 still listens, 9002 went away, 9003 came back and 9004 was
+        # started by someone else; OTHER could not be reached
+        changes = registry.reconcile({SERVER: {"9001", "9003", "9004"}, OTHER: None})
+
+        assert changes == {"listening": [(SERVER, "9003")], "stopped": [(SERVER, "9002")], "discovered": [(SERVER, "9004")]}
+        assert statuses(registry) == {(SERVER, "9001"): LISTENING, (SERVER, "9002"): STOPPED, (SERVER, "9003"): LISTENING,
+                                      (SERVER, "9004"): LISTENING, (OTHER, "9100"): LISTENING}
+        stopped = registry.proxies(status=STOPPED)[0]
+        assert stopped["encrypted"] is True and stopped["stopped"] is not None
+
+
+def test_reconcile_again_changes_nothing(tmp_path):
+    with ProxyRegistry(str(tmp_path / "proxies.db")) as registry:
+        registry.record_started([(SERVER, 9001, False), (SERVER, 9002, False)])
+        registry.reconcile({SERVER: {"9001"}})
+        assert registry.reconcile({SERVER: {"9001"}}) == {"listening": [], "stopped": [], "discovered": []}
+
+
+def test_registry_survives_a_restart_and_prunes(tmp_path):
+    path = str(tmp_path / "proxies.db")
+    with ProxyRegistry(path) as registry:
+        registry.record_started([(SERVER, 9001, False), (SERVER, 9002, False)])
+        registry.record_stopped([(SERVER, 9002)])
+    with ProxyRegistry(path) as registry:
+        started, stopped = registry.window(SERVER, 9002)
+        assert started <= stopped
+        assert registry.window(SERVER, 9999) == (None, None)
+        assert registry.prune() == 1
+        assert [row["port"] for row in registry.proxies()] == ["9001"]
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from MockRecorderServer import MockRecorderServer
+from RecorderFleet import RecorderFleet, merge_results, server_dirname
+from TrafficRecorder import TrafficRecorder
+
+
+@pytest.fixture
+def second_server():
+    with MockRecorderServer() as server:
+        yield server
+
+
+def listening(server):
+    return [port for port, proxy in server.state.proxies.items() if proxy.stopped is None]
+
+
+def test_count_strategy_fills_the_least_loaded_server(mock_server, second_server):
+    busy = TrafficRecorder(mock_server.url)
+    for port in (9000, 9001, 9002):
+        assert busy.start_proxy(port)[0] == 200
+    fleet = RecorderFleet([mock_server.url, second_server.url])
+    fleet.health_check()
+    assert fleet.proxyCounts == {mock_server.url: 3, second_server.url: 0}
+
+    results = fleet.start_proxies(9100, 9199, 5)
+    merged = merge_results(results)
+    assert merged["requested"] == 5 and len(merged["started"]) == 5
+    assert len(listening(mock_server)) == 4 and len(listening(second_server)) == 4
+    assert fleet.proxyCounts == {mock_server.url: 4, second_server.url: 4}
+
+
+@pytest.mark.parametrize("mock_server", [{"latency": 0.2}], indirect=True)
+def test_latency_strategy_prefers_the_faster_server(mock_server, second_server):
+    fleet = RecorderFleet([mock_server.url, second_server.url], strategy=RecorderFleet.LATENCY)
+    fleet.health_check()
+    url, (status, body) = fleet.start_proxy(9000)
+    assert url == second_server.url and status == 200
+    assert listening(second_server) == [9000] and listening(mock_server) == []
+
+
+def test_unhealthy_servers_get_no_proxies(mock_server):
+    fleet = RecorderFleet(["http://127.0.0.1:1", mock_server.url])
+    checks = fleet.health_check()
+    assert not checks["http://127.0.0.1:1"]["healthy"] and checks[mock_server.url]["healthy"]
+    assert fleet.healthyServers() == [mock_server.url]
+    results = fleet.start_proxies(9000, 9099, 3)
+    assert list(results) == [mock_server.url] and len(listening(mock_server)) == 3
+
+
+def test_harvest_all_reports_servers_outside_the_fleet(mock_server, tmp_path):
+    fleet = RecorderFleet([mock_server.url])
+    assert fleet.start_proxy(9000)[1][0] == 200
+    results = fleet.harvest_all(str(tmp_path), {mock_server.url: [9000], "http://gone:8383": [9001, 9002]})
+    assert [entry["port"] for entry in results[mock_server.url]["saved"]] == ["9000"]
+    assert os.path.dirname(results[mock_server.url]["saved"][0]["path"]) == str(tmp_path / server_dirname(mock_server.url))
+    assert [(entry["port"], entry["status"]) for entry in results["http://gone:8383"]["failed"]] == [("9001", 404), ("9002", 404)]
+    merged = merge_results(results)
+    assert merged["requested"] == 3 and {entry["server"] for entry in merged["failed"]} == {"http://gone:8383"}
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from RecordingArchive import KIND_CERTIFICATE, RecordingArchive
+from TrafficRecorder import TrafficRecorder
+
+
+@pytest.fixture
+def archive(tmp_path):
+    with RecordingArchive(str(tmp_path / "archive"), codec="gzip") as archive:
+        yield archive
+
+
+def download(server, port, path):
+    recorder = TrafficRecorder(server.url)
+    assert recorder.start_proxy(port)[0] == 200
+    assert recorder.traffic(port, str(path))[0] == 200
+    return str(path)
+
+
+def test_recordings_are_stored_once_and_extracted_whole(mock_server, archive, tmp_path):
+    path = download(mock_server, 9000, tmp_path / "9000.dast.config")
+    first = archive.add(path, server=mock_server.url, port=9000, started=100.0, ended=200.0)
+    second = archive.add(path, server=mock_server.url, port=9000)
+    assert first["hash"] == second["hash"]
+    usage = archive.usage()
+    assert usage["entries"] == 2 and usage["objects"] == 1 and usage["stored"] < usage["size"]
+    assert [entry["id"] for entry in archive.find(server=mock_server.url, port=9000)] == [second["id"], first["id"]]
+    assert [entry["id"] for entry in archive.find(until=150.0)] == [first["id"]]
+    assert archive.extract(first["id"], str(tmp_path / "out")) == usage["size"]
+    assert (tmp_path / "out").read_bytes() == (tmp_path / "9000.dast.config").read_bytes()
+
+
+def test_evict_drops_the_least_recently_used(mock_server, archive, tmp_path):
+    ids = [archive.add(download(mock_server, port, tmp_path / f"{port}.dast.config"), port=port)["id"] for port in (9000, 9001, 9002)]
+    archive.touch(ids[0])
+    assert archive.evict(maxBytes=archive.usage()["stored"] - 1) == [ids[1]]
+    assert archive.usage()["objects"] == 2
+    assert sorted(archive.evict(maxAge=-1)) == [ids[0], ids[2]]
+    assert archive.usage() == {"entries": 0, "objects": 0, "stored": 0, "size": 0}
+
+
+# Plain http servers have no fingerprint, so the cached copy expires
+def test_certificate_cache_expires_without_a_fingerprint(mock_server, archive):
+    recorder = TrafficRecorder(mock_server.url)
+    fetched = []
+
+    def fetch():
+        fetched.append(1)
+        return recorder.certificate()
+
+    status, body = archive.certificate(mock_server.url, fetch)
+    assert status == 200 and archive.certificate(mock_server.url, fetch) == (200, body)
+    assert len(fetched) == 1
+    time.sleep(0.01)
+    assert archive.certificate(mock_server.url, fetch, maxAge=0) == (200, body)
+    assert len(fetched) == 2
+    assert len(archive.find(KIND_CERTIFICATE, server=mock_server.url)) == 2
+
+
+# A matching fingerprint is trusted regardless of age
+def test_certificate_cache_follows_the_fingerprint(mock_server, archive):
+    recorder = TrafficRecorder(mock_server.url)
+    fetched = []
+
+    def fetch():
+        fetched.append(1)
+        return recorder.certificate()
+
+    archive.certificate(mock_server.url, fetch, fingerprint="aa")
+    time.sleep(0.01)
+    archive.certificate(mock_server.url, fetch, fingerprint="aa", maxAge=0)
+    assert len(fetched) == 1
+    archive.certificate(mock_server.url, fetch, fingerprint="bb")
+    assert len(fetched) == 2
+    assert mock_server.state.calls["Certificate"] == 2
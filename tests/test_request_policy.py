@@ -0,0 +1,55 @@
+import time
+
+from RequestPolicy import DEFAULT_POLICIES, CircuitBreaker, EndpointPolicy, get_breaker
+from TrafficRecorder import TrafficRecorder
+
+
+def test_breaker_opens_after_threshold_and_half_opens():
+    breaker = CircuitBreaker(failureThreshold=3, resetTimeout=0.05)
+    for _ in range(2):
+        breaker.recordFailure()
+    assert breaker.allow() and breaker.state == CircuitBreaker.CLOSED
+    breaker.recordFailure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow() and breaker.retryAfter() > 0
+
+    time.sleep(0.06)
+    # Only one trial call gets through while half-open
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.recordFailure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.recordSuccess()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failureThreshold=2)
+    breaker.recordFailure()
+    breaker.recordSuccess()
+    breaker.recordFailure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_rejects_calls_without_the_network():
+    url = "http://127.0.0.1:1"
+    policies = {"Info": EndpointPolicy(connectTimeout=0.5, retries=0)}
+    recorder = TrafficRecorder(url, policies=policies)
+    for _ in range(get_breaker(url).failureThreshold):
+        assert recorder.info()[0] == 502
+    assert get_breaker(url).state == CircuitBreaker.OPEN
+    status, body = recorder.info()
+    assert status == 503 and "not responding" in body["message"]
+
+
+def test_non_idempotent_calls_are_not_retried_on_5xx(mock_server):
+    mock_server.state.errorRate = 1.0
+    policies = {name: DEFAULT_POLICIES[name].copy(retries=3, backoff=0) for name in ("StartProxy", "Info")}
+    recorder = TrafficRecorder(mock_server.url, policies=policies)
+    assert recorder.start_proxy(9000)[0] == 503
+    assert recorder.info()[0] == 503
+    assert mock_server.state.calls["StartProxy"] == 1
+    assert mock_server.state.calls["Info"] == 4
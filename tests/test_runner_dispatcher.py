@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+
+from RunnerDispatcher import RunnerDispatcher  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def pool():
+    pool = QtCore.QThreadPool()
+    pool.setMaxThreadCount(1)
+    yield pool
+    pool.waitForDone(5000)
+
+
+class Signals(QtCore.QObject):
+    finished = QtCore.Signal(object)
+
+
+# Receives signals on the GUI thread, after any slot connected before it
+class Probe(QtCore.QObject):
+
+    def __init__(self):
+        super().__init__()
+        self.received = []
+
+    @QtCore.Slot(object)
+    def receive(self, value):
+        self.received.append(value)
+
+
+# The parts of TrafficRecorderRunner the dispatcher uses. run() blocks
+# until release() so tests control what is in flight.
+class BlockingRunner(QtCore.QRunnable):
+
+    def __init__(self):
+        super().__init__()
+        self.signals = Signals()
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.ran = False
+        self.cancelled = False
+
+    def run(self):
+        self.started.set()
+        self.gate.wait(5)
+        self.ran = True
+        self.signals.finished.emit(self)
+
+    def release(self):
+        self.gate.set()
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def wait_until(app, condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        app.processEvents()
+        time.sleep(0.01)
+
+
+def test_a_key_in_flight_gets_the_running_runner(app, pool):
+    dispatcher = RunnerDispatcher(pool)
+    first, second = BlockingRunner(), BlockingRunner()
+    connected = []
+    assert dispatcher.submit("key", first, connected.append) is first
+    assert dispatcher.submit("key", second, connected.append) is first
+    assert connected == [first, first]
+    first.release()
+    wait_until(app, lambda: not dispatcher.isInFlight("key"))
+    assert first.ran and not second.ran
+
+
+def test_supersede_takes_a_queued_runner_off_the_pool(app, pool):
+    dispatcher = RunnerDispatcher(pool)
+    blocker, queued, replacement = BlockingRunner(), BlockingRunner(), BlockingRunner()
+    dispatcher.submit("busy", blocker)
+    blocker.started.wait(5)
+    dispatcher.submit("key", queued)
+    assert dispatcher.submit("key", replacement, supersede=True) is replacement
+    replacement.release()
+    blocker.release()
+    wait_until(app, lambda: not dispatcher.inFlight)
+    assert replacement.ran and not queued.ran and not queued.cancelled
+
+
+# A runner that already started is cancelled, and finishing later does
+# not take its replacement out of flight
+def test_supersede_cancels_a_running_runner(app, pool):
+    pool.setMaxThreadCount(2)
+    dispatcher = RunnerDispatcher(pool)
+    running, replacement = BlockingRunner(), BlockingRunner()
+    dispatcher.submit("key", running)
+    running.started.wait(5)
+    dispatcher.submit("key", replacement, supersede=True)
+    assert running.cancelled
+    probe = Probe()
+    running.signals.finished.connect(probe.receive)
+    running.release()
+    wait_until(app, lambda: probe.received)
+    assert dispatcher.inFlight == {"key": replacement}
+    replacement.release()
+    wait_until(app, lambda: not dispatcher.inFlight)
+
+
+def test_cancel_all_empties_the_queue(app, pool):
+    dispatcher = RunnerDispatcher(pool)
+    blocker, queued = BlockingRunner(), BlockingRunner()
+    dispatcher.submit("busy", blocker)
+    blocker.started.wait(5)
+    dispatcher.submit("key", queued)
+    dispatcher.cancelAll()
+    assert not dispatcher.inFlight and blocker.cancelled and not queued.cancelled
+    blocker.release()
+    pool.waitForDone(5000)
+    assert not queued.ran
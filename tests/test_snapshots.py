@@ -0,0 +1,90 @@
+import pytest
+
+from TrafficRecorder import TrafficRecorder
+from TrafficSnapshots import BLOCK_SIZE, SnapshotStore, snapshot_every
+
+PORT = 9100
+
+
+def listening_proxy(server):
+    recorder = TrafficRecorder(server.url)
+    assert recorder.start_proxy(PORT)[0] == 200
+    return recorder
+
+
+# New requests recorded by the proxy since the last call
+def record(server, requests):
+    server.state.proxies[PORT].entries += requests
+
+
+# Every snapshot merges back into the recording as it was when it was taken
+@pytest.mark.parametrize("mock_server", [
+    {"trafficSize": 1024 * 1024, "entrySize": 4096},
+    {"trafficSize": 1024 * 1024, "entrySize": 4096, "ranges": False},
+], indirect=True)
+def test_merged_snapshots_match_the_recording(mock_server, tmp_path):
+    recorder = listening_proxy(mock_server)
+    store = SnapshotStore(str(tmp_path / "snapshots"), recorder, PORT)
+    recordings = []
+    for requests in (0, 10, 0, 300):
+        record(mock_server, requests)
+        entry = store.snapshot()
+        recordings.append(recorder.traffic(PORT)[1])
+        assert entry["length"] == len(recordings[-1])
+    for number, recording in enumerate(recordings, 1):
+        assert store.merge(str(tmp_path / "merged"), upTo=number) == len(recording)
+        assert (tmp_path / "merged").read_bytes() == recording
+
+    first, grown, unchanged, last = store.snapshots
+    assert first["base"] == 0 and first["delta"] == first["length"]
+    # Only the block holding the old footer and what follows it is stored
+    added = grown["length"] - first["length"]
+    assert added <= grown["delta"] <= added + BLOCK_SIZE and unchanged["delta"] == 0
+    full = mock_server.state.ranges is False
+    assert (grown["transferred"] == grown["length"]) == full
+
+
+def test_a_reopened_store_continues_the_chain(mock_server, tmp_path):
+    recorder = listening_proxy(mock_server)
+    SnapshotStore(str(tmp_path / "snapshots"), recorder, PORT).snapshot()
+    record(mock_server, 5)
+    store = SnapshotStore(str(tmp_path / "snapshots"), recorder, PORT)
+    assert store.snapshot()["number"] == 2
+    store.merge(str(tmp_path / "merged"))
+    assert (tmp_path / "merged").read_bytes() == recorder.traffic(PORT)[1]
+
+
+def test_snapshot_every_takes_count_snapshots(mock_server, tmp_path):
+    recorder = listening_proxy(mock_server)
+    store = SnapshotStore(str(tmp_path / "snapshots"), recorder, PORT)
+    seen = []
+    taken = snapshot_every(store, 0, count=3, callback=seen.append)
+    assert [entry["number"] for entry in taken] == [1, 2, 3] and seen == taken
+
+
+# A proxy restarted on the same port records from scratch; trafficSize
+# sets how long the new recording is
+def restart(server, recorder, trafficSize):
+    assert recorder.stop_proxy(PORT)[0] == 200
+    server.state.trafficSize = trafficSize
+    assert recorder.start_proxy(PORT)[0] == 200
+
+
+# 16KB ends before the ranged window (416), 1920KB inside it
+@pytest.mark.parametrize("mock_server", [
+    {"trafficSize": 2 * 1024 * 1024, "entrySize": 4096},
+    {"trafficSize": 2 * 1024 * 1024, "entrySize": 4096, "ranges": False},
+], indirect=True)
+@pytest.mark.parametrize("newSize", [16 * 1024, 1920 * 1024])
+def test_snapshot_after_a_restart_starts_over(mock_server, tmp_path, newSize):
+    recorder = listening_proxy(mock_server)
+    store = SnapshotStore(str(tmp_path / "snapshots"), recorder, PORT)
+    first = store.snapshot()
+    restart(mock_server, recorder, newSize)
+
+    entry = store.snapshot()
+    current = recorder.traffic(PORT)[1]
+    assert entry["base"] == 0 and entry["length"] == entry["delta"] == len(current) < first["length"]
+    assert store.merge(str(tmp_path / "merged")) == len(current)
+    assert (tmp_path / "merged").read_bytes() == current
+    assert store.merge(str(tmp_path / "before"), upTo=1) == first["length"]
@@ -0,0 +1,40 @@
+import pytest
+
+from TrafficRecorder import PORT_IN_USE_STATUSES, TrafficRecorder
+
+
+def listening(server):
+    return sorted(port for port, proxy in server.state.proxies.items() if proxy.stopped is None)
+
+
+def test_ports_in_use_are_skipped(mock_server):
+    recorder = TrafficRecorder(mock_server.url)
+    for port in (9001, 9003):
+        assert recorder.start_proxy(port)[0] == 200
+    result = recorder.start_proxies(9000, 9010, 3)
+    assert sorted(body["port"] for body in result["started"]) == [9000, 9002, 9004]
+    assert result["failed"] == []
+    assert listening(mock_server) == [9000, 9001, 9002, 9003, 9004]
+
+
+def test_a_full_range_reports_the_missing_proxies(mock_server):
+    recorder = TrafficRecorder(mock_server.url)
+    assert recorder.start_proxy(9000)[0] == 200
+    result = recorder.start_proxies(9001, 9000, 2)
+    assert [body["port"] for body in result["started"]] == [9001]
+    assert len(result["failed"]) == 1 and result["failed"][0]["status"] in PORT_IN_USE_STATUSES
+
+
+def test_random_ports_stay_in_the_range(mock_server):
+    result = TrafficRecorder(mock_server.url).start_proxies(9000, 9099, 5, randomPorts=True)
+    ports = [body["port"] for body in result["started"]]
+    assert len(set(ports)) == 5 and all(9000 <= port <= 9099 for port in ports)
+
+
+# StartProxy is not idempotent: the first failure stops the batch
+@pytest.mark.parametrize("mock_server", [{"errorRate": 1.0}], indirect=True)
+def test_a_failure_stops_the_batch(mock_server):
+    result = TrafficRecorder(mock_server.url).start_proxies(9000, 9010, 5, maxWorkers=1)
+    assert result["started"] == []
+    assert [entry["status"] for entry in result["failed"]] == [503] * 5
+    assert mock_server.state.calls["StartProxy"] == 1
@@ -0,0 +1,95 @@
+import hashlib
+import os
+
+import pytest
+
+from TrafficRecorder import TrafficRecorder
+
+PORT = 9000
+
+
+class Crash(Exception):
+    pass
+
+
+def stopped_proxy(server):
+    recorder = TrafficRecorder(server.url)
+    assert recorder.start_proxy(PORT)[0] == 200
+    assert recorder.stop_proxy(PORT)[0] == 200
+    return recorder
+
+
+def full_recording(recorder):
+    status, body = recorder.traffic(PORT)
+    assert status == 200
+    return body
+
+
+# Stop a download once `limit` bytes have arrived, the way a crash would
+def crash_after(limit):
+    def progress(done, total):
+        if done >= limit:
+            raise Crash()
+    return progress
+
+
+@pytest.mark.parametrize("mock_server", [{"trafficSize": 3 * 1024 * 1024}], indirect=True)
+@pytest.mark.parametrize("segments", [1, 4])
+def test_download_matches_checksum(mock_server, tmp_path, segments):
+    recorder = stopped_proxy(mock_server)
+    path = str(tmp_path / "port.dast.config")
+    status, size = recorder.traffic(PORT, path, segments=segments)
+    data = open(path, "rb").read()
+    assert status == 200 and size == len(data)
+    assert data == full_recording(recorder)
+    assert os.listdir(tmp_path) == ["port.dast.config"]
+
+
+# Three drops fit in the retry budget even when each restarts from 0
+@pytest.mark.parametrize("mock_server", [
+    {"trafficSize": 2 * 1024 * 1024, "trafficDropFirst": 3, "seed": 1},
+    {"trafficSize": 2 * 1024 * 1024, "trafficDropFirst": 3, "seed": 1, "ranges": False},
+], indirect=True)
+def test_dropped_connections_are_resumed(mock_server, tmp_path):
+    recorder = stopped_proxy(mock_server)
+    path = str(tmp_path / "port.dast.config")
+    assert recorder.traffic(PORT, path, segments=4, retries=5)[0] == 200
+    assert mock_server.state.trafficDropFirst == 0
+    expected = full_recording(recorder)
+    assert hashlib.sha256(open(path, "rb").read()).hexdigest() == hashlib.sha256(expected).hexdigest()
+
+
+@pytest.mark.parametrize("mock_server", [{"trafficSize": 4 * 1024 * 1024}], indirect=True)
+def test_leftover_part_file_is_resumed(mock_server, tmp_path):
+    recorder = stopped_proxy(mock_server)
+    path = str(tmp_path / "port.dast.config")
+    with pytest.raises(Crash):
+        recorder.traffic(PORT, path, progressCallback=crash_after(1024 * 1024))
+    assert os.path.exists(path + ".part") and os.path.exists(path + ".part.json")
+
+    resumedFrom = []
+    progress = lambda done, total: resumedFrom.append(done) if not resumedFrom else None
+    assert recorder.traffic(PORT, path, progressCallback=progress)[0] == 200
+    assert resumedFrom[0] > 1024 * 1024
+    assert open(path, "rb").read() == full_recording(recorder)
+    assert not os.path.exists(path + ".part.json")
+
+
+# A .part file damaged between runs fails the checksum and starts over
+@pytest.mark.parametrize("mock_server", [{"trafficSize": 2 * 1024 * 1024}], indirect=True)
+def test_corrupt_part_file_fails_checksum_and_restarts(mock_server, tmp_path):
+    recorder = stopped_proxy(mock_server)
+    path = str(tmp_path / "port.dast.config")
+    with pytest.raises(Crash):
+        recorder.traffic(PORT, path, progressCallback=crash_after(512 * 1024))
+    with open(path + ".part", "r+b") as f:
+        f.write(b"corrupted")
+
+    assert recorder.traffic(PORT, path)[0] == 200
+    assert open(path, "rb").read() == full_recording(recorder)
+
+
+def test_missing_recording_is_reported(mock_server, tmp_path):
+    status, body = TrafficRecorder(mock_server.url).traffic(PORT, str(tmp_path / "none.dast.config"))
+    assert status == 404
+    assert not os.listdir(tmp_path)
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from TrafficIndex import TrafficIndex, iter_requests
+from recordings import HEADER, FOOTER, request, write_recording
+
+
+def recording(tmp_path):
+    return write_recording(tmp_path / "site.dast.config", [
+        request("GET", "https://shop.example/"),
+        request("post", "https://shop.example/cart/add?id=1", status=302),
+        request("GET", "https://api.example/v1/items"),
+        request("GET", "https://api.example/v1/missing", status=404),
+        request("DELETE", "https://api.example/v1/items/7", status=204),
+    ])
+
+
+def test_iter_requests_reads_fields_and_offsets(tmp_path):
+    path = recording(tmp_path)
+    entries = list(iter_requests(path))
+    assert [(e["method"], e["host"], e["path"], e["status"]) for e in entries][:2] == [
+        ("GET", "shop.example", "/", 200), ("POST", "shop.example", "/cart/add", 302)]
+    raw = open(path, "rb").read()
+    for entry in entries:
+        element = raw[entry["offset"]:entry["offset"] + entry["length"]]
+        assert element.startswith(b"<Request") and element.endswith(b"</Request>")
+
+
+# Offsets must cover the element exactly, even when it is split across reads
+@pytest.mark.parametrize("chunkSize", [7, 1024 * 1024])
+def test_iter_requests_ends_self_closing_and_spaced_elements(tmp_path, chunkSize):
+    elements = [
+        '<Request method="GET" url="https://shop.example/a?q=>/"/>',
+        '<Request method="GET" url="https://shop.example/b"><Response status="201"/></Request >',
+        "<Request method='PUT' url='https://shop.example/c' />",
+        '<Request method="GET" url="https://shop.example/d">a/></Request\n  >',
+    ]
+    path = tmp_path / "odd.dast.config"
+    path.write_text(HEADER + "\n".join(elements) + "<Other/>\n" + FOOTER, encoding="utf-8")
+    raw = path.read_bytes()
+    entries = list(iter_requests(str(path), chunkSize=chunkSize))
+    assert [raw[e["offset"]:e["offset"] + e["length"]].decode() for e in entries] == elements
+    assert [e["path"] for e in entries] == ["/a", "/b", "/c", "/d"]
+    assert entries[1]["status"] == 201
+
+
+def test_index_filters_pages_and_reads_back(tmp_path):
+    path = recording(tmp_path)
+    with TrafficIndex(path) as index:
+        assert index.build() == 5
+        assert index.count(host="api.example") == 3
+        assert index.count(status=404) == 1
+        assert [row["path"] for row in index.query(path="/v1/items")] == ["/v1/items", "/v1/items/7"]
+        assert [row["id"] for row in index.query(limit=2, offset=2)] == [3, 4]
+        assert index.summary()["method"] == {"GET": 3, "POST": 1, "DELETE": 1}
+        row = index.query(method="delete")[0]
+        assert index.read(row["id"]).startswith(b'<Request method="DELETE"')
+
+
+def test_index_is_reused_until_the_recording_changes(tmp_path):
+    path = recording(tmp_path)
+    with TrafficIndex(path) as index:
+        index.build()
+        assert index.isCurrent()
+    time.sleep(0.01)
+    write_recording(path, [request("GET", "https://shop.example/")])
+    with TrafficIndex(path) as index:
+        assert not index.isCurrent()
+        assert index.build() == 1
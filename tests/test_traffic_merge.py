@@ -0,0 +1,41 @@
+from TrafficIndex import iter_requests
+from TrafficMerge import merge_recordings, request_digest
+from recordings import request, write_recording
+
+
+def test_digest_ignores_volatile_parts():
+    first = request("GET", "https://shop.example/", time="1", date="Mon, 01 Jan 2024 00:00:00 GMT").strip().encode()
+    second = request("GET", "https://shop.example/", time="2", date="Tue, 02 Jan 2024 10:00:00 GMT").strip().encode()
+    other = request("GET", "https://shop.example/", body="changed").strip().encode()
+    assert request_digest(first) == request_digest(second)
+    assert request_digest(first) != request_digest(other)
+
+
+def test_merge_deduplicates_across_recordings(tmp_path):
+    first = write_recording(tmp_path / "a.dast.config", [
+        request("GET", "https://shop.example/", time="1"),
+        request("GET", "https://shop.example/app.js"),
+        request("POST", "https://shop.example/login", body="user=a"),
+    ])
+    second = write_recording(tmp_path / "b.dast.config", [
+        request("GET", "https://shop.example/", time="5"),
+        request("POST", "https://shop.example/login", body="user=b"),
+    ])
+    merged = str(tmp_path / "merged.dast.config")
+    stats = merge_recordings([first, second], merged)
+    assert (stats["requests"], stats["written"], stats["duplicates"]) == (5, 4, 1)
+    assert len(list(iter_requests(merged))) == 4
+    text = open(merged, encoding="utf-8").read()
+    assert text.startswith('<?xml') and text.rstrip().endswith("</TrafficRecording>")
+
+
+def test_merge_can_drop_static_assets(tmp_path):
+    source = write_recording(tmp_path / "a.dast.config", [
+        request("GET", "https://shop.example/"),
+        request("GET", "https://shop.example/app.js"),
+        request("GET", "https://shop.example/logo.PNG"),
+    ])
+    merged = str(tmp_path / "merged.dast.config")
+    stats = merge_recordings([source], merged, dropStatic=True)
+    assert (stats["written"], stats["static"]) == (1, 2)
+    assert [entry["path"] for entry in iter_requests(merged)] == ["/"]
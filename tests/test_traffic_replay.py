@@ -0,0 +1,56 @@
+import pytest
+
+from TrafficReplay import TrafficReplay
+from recordings import request, write_recording
+
+POST = ('  <Request method="POST" url="{base}/cart/add" time="0">\n'
+        '    <Headers>Host: shop.example&#10;Content-Type: application/json</Headers>\n'
+        '    <Body>{{"id": 7}}</Body>\n'
+        '    <Response status="200"><Body>ok</Body></Response>\n'
+        '  </Request>\n')
+
+
+def recording(tmp_path, base):
+    return write_recording(tmp_path / "site.dast.config", [
+        request("GET", f"{base}/"),
+        request("GET", f"{base}/v1/items"),
+        request("GET", f"{base}/v1/missing", status=404),
+        request("DELETE", f"{base}/v1/items/7", status=500),
+        POST.format(base=base),
+    ])
+
+
+def test_replay_against_a_target(mock_server, tmp_path):
+    path = recording(tmp_path, "https://shop.example")
+    report = TrafficReplay(mock_server.url, concurrency=4).run(path)
+    assert report["requests"] == report["completed"] == 5 and report["failed"] == 0
+    assert report["statuses"] == {"200": 4, "404": 1}
+    # The DELETE was recorded as a 500
+    assert report["mismatched"] == 1
+    assert report["bytesSent"] == len(b'{"id": 7}')
+    assert mock_server.state.standIn[("POST", "/cart/add")] == 1
+    assert mock_server.state.tunnels == 0
+
+
+# https recordings replayed through a proxy tunnel with CONNECT to the
+# mock's stand-in target; http ones are sent with absolute URLs
+@pytest.mark.parametrize("base", ["http://shop.example", "https://shop.example:8443"])
+def test_replay_through_a_proxy(mock_server, tmp_path, base):
+    path = recording(tmp_path, base)
+    report = TrafficReplay(proxy=mock_server.url, concurrency=2).run(path)
+    assert report["completed"] == 5 and report["failed"] == 0 and report["mismatched"] == 1
+    assert sum(mock_server.state.standIn.values()) == 5
+    assert (mock_server.state.tunnels > 0) == base.startswith("https")
+
+
+def test_replay_filters_and_limits(mock_server, tmp_path):
+    path = recording(tmp_path, "http://shop.example")
+    report = TrafficReplay(mock_server.url).run(path, match=lambda entry: entry["method"] == "GET", limit=2)
+    assert report["requests"] == 2
+    assert set(mock_server.state.standIn) == {("GET", "/"), ("GET", "/v1/items")}
+
+
+def test_unreachable_target_is_counted_as_failed(tmp_path):
+    path = write_recording(tmp_path / "one.dast.config", [request("GET", "http://shop.example/")])
+    report = TrafficReplay("http://127.0.0.1:1", timeout=5).run(path)
+    assert report["failed"] == 1 and report["completed"] == 0 and report["errors"]